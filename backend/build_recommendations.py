@@ -0,0 +1,31 @@
+"""Rebuild frequently-bought-together recommendations from orders"""
+import asyncio
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+import os
+from dotenv import load_dotenv
+from pathlib import Path
+from utils.recommendations import build_recommendations
+from utils.invalidation import bus
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+mongo_url = os.environ['MONGO_URL']
+client = AsyncIOMotorClient(mongo_url)
+db = client[os.environ['DB_NAME']]
+
+async def main():
+    incremental = "--full" not in sys.argv
+    mode = "incremental" if incremental else "full"
+    print(f"🔁 Building recommendations ({mode})...")
+    result = await build_recommendations(db, incremental=incremental)
+    # Running API workers reload their in-memory neighbor maps
+    bus.set_db(db)
+    await bus.setup()
+    await bus.publish("recommendations:*")
+    print(f"✅ Processed {result['orders_processed']} orders, rescored {result['products_rescored']} products")
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,33 @@
+"""Periodic jobs registered with the in-process scheduler"""
+from datetime import datetime, timezone
+from utils.invalidation import bus
+from utils.recommendations import build_recommendations
+from utils.order_archive import archive_orders
+
+def register_jobs(scheduler, db):
+    async def expire_coupons():
+        now = datetime.now(timezone.utc).isoformat()
+        expired = await db.coupons.find(
+            {"is_active": True, "expiry_date": {"$lt": now}},
+            {"_id": 0, "code": 1}
+        ).to_list(1000)
+        if not expired:
+            return
+        
+        await db.coupons.update_many(
+            {"code": {"$in": [c['code'] for c in expired]}},
+            {"$set": {"is_active": False}}
+        )
+        for coupon in expired:
+            await bus.publish(f"coupon:{coupon['code']}")
+    
+    async def rebuild_recommendations():
+        await build_recommendations(db, incremental=True)
+        await bus.publish("recommendations:*")
+    
+    async def archive_old_orders():
+        await archive_orders(db)
+    
+    scheduler.add_job("expire_coupons", expire_coupons, cron="*/15 * * * *", timeout=120, jitter=10)
+    scheduler.add_job("rebuild_recommendations", rebuild_recommendations, interval=1800, timeout=900, jitter=30)
+    scheduler.add_job("archive_orders", archive_old_orders, cron="30 3 * * *", timeout=1800, jitter=60)
@@ -1,22 +1,129 @@
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException, Security, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from utils.auth import verify_token
+from utils.auth import verify_token, ACCESS_TOKEN_EXPIRE_HOURS
+from utils.cache import TTLCache
+from utils.invalidation import bus
+from utils.tracing import traced
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
+db = None
+
+def set_db(database):
+    global db
+    db = database
+
+# Verified claims keyed by token digest. Revocation is checked on every request
+# against the sets below, so this TTL only bounds memory, not revocation delay
+_verified_tokens = TTLCache(maxsize=10000, ttl=300)
+
+# Revocation state mirrored from the revoked_tokens collection
+_revoked_digests = set()
+_revoked_users = {}
+_revocations_loaded_at = 0.0
+REVOCATION_REFRESH_SECONDS = 30
+
+# Revocations made by another worker are picked up as soon as it publishes them
+# (role changes and logouts); the periodic refresh covers a missed event
+bus.subscribe("user", lambda key: refresh_revocations())
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def create_indexes():
+    await db.revoked_tokens.create_index("expires_at", expireAfterSeconds=0)
+    await refresh_revocations()
+
+async def refresh_revocations():
+    """Reload revoked token digests and per-user revocation cutoffs"""
+    global _revoked_digests, _revoked_users, _revocations_loaded_at
+    # Mark first so concurrent requests don't all trigger a reload
+    _revocations_loaded_at = time.monotonic()
+    digests = set()
+    users = {}
+    async for doc in db.revoked_tokens.find({}, {"_id": 0}):
+        if doc.get('token_digest'):
+            digests.add(doc['token_digest'])
+        if doc.get('user_id'):
+            users[doc['user_id']] = max(users.get(doc['user_id'], 0), doc['revoked_before'])
+
+    _revoked_digests = digests
+    _revoked_users = users
+
+def _is_revoked(digest: str, payload: dict) -> bool:
+    if digest in _revoked_digests:
+        return True
+    # Both are whole seconds: a token issued in the revoking second stays valid
+    cutoff = _revoked_users.get(payload.get('user_id'))
+    return cutoff is not None and payload.get('iat', 0) < cutoff
+
+async def revoke_token(token: str, user_id: str):
+    """Revoke a single token (e.g. on logout)"""
+    digest = token_digest(token)
+    _revoked_digests.add(digest)
+    _verified_tokens.pop(digest)
+    await db.revoked_tokens.insert_one({
+        "token_digest": digest,
+        "expires_at": datetime.now(timezone.utc) + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
+    })
+    await bus.publish(f"user:{user_id}")
+
+async def revoke_user_tokens(user_id: str):
+    """Revoke every token issued to a user so far (e.g. after a role change)"""
+    # jose writes iat in whole seconds
+    revoked_before = int(time.time())
+    _revoked_users[user_id] = revoked_before
+    await db.revoked_tokens.insert_one({
+        "user_id": user_id,
+        "revoked_before": revoked_before,
+        "expires_at": datetime.now(timezone.utc) + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
+    })
+
+@traced("auth.get_current_user", category="dependency")
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)):
     token = credentials.credentials
-    payload = verify_token(token)
-    
+    digest = token_digest(token)
+
+    if db is not None and time.monotonic() - _revocations_loaded_at > REVOCATION_REFRESH_SECONDS:
+        await refresh_revocations()
+
+    payload = _verified_tokens.get(digest)
+    if payload is not None and payload['exp'] <= time.time():
+        _verified_tokens.pop(digest)
+        payload = None
+
+    if payload is None:
+        payload = verify_token(token)
+        if payload is not None:
+            _verified_tokens.set(digest, payload)
+
+    if payload is not None and _is_revoked(digest, payload):
+        _verified_tokens.pop(digest)
+        payload = None
+
     if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
+
     return payload
 
+async def get_optional_user(credentials: HTTPAuthorizationCredentials = Security(optional_security)):
+    """Current user for endpoints that are public but tailor output to signed-in users"""
+    if credentials is None:
+        return None
+
+    try:
+        return await get_current_user(credentials)
+    except HTTPException:
+        return None
+
 async def require_role(required_roles: list):
     async def role_checker(current_user: dict = Security(get_current_user)):
         if current_user.get("role") not in required_roles:
@@ -25,4 +132,4 @@ async def require_role(required_roles: list):
                 detail="Insufficient permissions"
             )
         return current_user
-    return role_checker
\ No newline at end of file
+    return role_checker
@@ -0,0 +1,20 @@
+import asyncio
+from utils.loop_watchdog import watchdog
+
+class LoopWatchdogMiddleware:
+    """Register each request's task so loop stalls can be attributed to its route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        task = asyncio.current_task()
+        watchdog.track(task, scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            watchdog.untrack(task)
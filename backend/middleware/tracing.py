@@ -0,0 +1,38 @@
+import asyncio
+from starlette.datastructures import Headers, MutableHeaders
+from utils.tracing import begin_trace, end_trace, exporter, should_sample
+
+class TracingMiddleware:
+    """Root span per sampled request, exported once the response is sent
+
+    Requests are sampled at TRACE_SAMPLE_RATE; `X-Trace: 1` forces sampling.
+    Sampled responses carry the trace id in `X-Trace-Id`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not should_sample(Headers(scope=scope).get("x-trace") == "1"):
+            await self.app(scope, receive, send)
+            return
+
+        root, token = begin_trace(f"{scope['method']} {scope['path']}", method=scope["method"], path=scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set(status=message["status"])
+                MutableHeaders(scope=message)["X-Trace-Id"] = root.trace.id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            root.set(error=repr(e))
+            raise
+        finally:
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                root.name = f"{scope['method']} {route.path}"
+            end_trace(root, token)
+            await asyncio.get_running_loop().run_in_executor(None, exporter.export, root.trace)
@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+
+class CartItem(BaseModel):
+    product_id: str
+    variant_size: str
+    variant_color: str
+    quantity: int = Field(ge=1)
+
+class CartQuoteRequest(BaseModel):
+    items: List[CartItem]
+    coupon_code: Optional[str] = None
@@ -40,9 +40,11 @@ class Order(BaseModel):
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class OrderCreate(BaseModel):
+    # Totals are computed server-side (see utils.pricing), so sending them is
+    # rejected rather than ignored. Names and prices on the lines are ignored.
+    model_config = ConfigDict(extra="forbid")
+    
     products: List[OrderProduct]
-    total_amount: float
-    discount_amount: float = 0.0
     payment_method: str
     shipping_address: ShippingAddress
     coupon_code: Optional[str] = None
\ No newline at end of file
@@ -28,6 +28,8 @@ class Product(BaseModel):
     cost_price: Optional[float] = None
     images: List[str] = []
     variants: List[ProductVariant] = []
+    available_sizes: List[str] = []
+    available_colors: List[str] = []
     stock: int = 0
     ratings: float = 0.0
     total_reviews: int = 0
@@ -57,4 +59,9 @@ class ProductUpdate(BaseModel):
     images: Optional[List[str]] = None
     variants: Optional[List[ProductVariant]] = None
     stock: Optional[int] = None
-    is_featured: Optional[bool] = None
\ No newline at end of file
+    is_featured: Optional[bool] = None
+
+class ProductBatchRequest(BaseModel):
+    ids: List[str]
+    view: Optional[str] = None
+    fields: Optional[List[str]] = None
\ No newline at end of file
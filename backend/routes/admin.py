@@ -1,15 +1,33 @@
-from fastapi import APIRouter, HTTPException, Depends
-from middleware.auth import get_current_user
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import PlainTextResponse
+from middleware.auth import get_current_user, revoke_user_tokens
+from utils.invalidation import bus
+from utils.fields import USER_VIEWS, USER_PRIVATE_FIELDS, build_projection
+from utils.user_search import prefix_query
+from utils.scheduler import SchedulerBusy, scheduler
+from utils.trending import trending
+from utils.catalog_index import catalog_index
+from utils.counters import counters
+from utils.order_archive import find_order, duplicated_ids
+from utils.cursors import encode_cursor, after_cursor
+from utils import profiler
+from utils.loop_watchdog import watchdog
+import asyncio
+import os
+import threading
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
 db = None
+read_db = None
 
-def set_db(database):
-    global db
+def set_db(database, read_database=None):
+    """Writes and read-your-writes go to `database`; dashboard analytics to `read_database`"""
+    global db, read_db
     db = database
+    read_db = read_database if read_database is not None else database
 
 async def require_admin(current_user: dict = Depends(get_current_user)):
     """Middleware to check admin access"""
@@ -25,8 +43,14 @@ async def get_dashboard_stats(current_user: dict = Depends(require_admin)):
         {"$match": {"payment_status": "completed"}},
         {"$group": {"_id": None, "total": {"$sum": "$final_amount"}}}
     ]
-    revenue_result = await db.orders.aggregate(pipeline_revenue).to_list(1)
-    total_revenue = revenue_result[0]['total'] if revenue_result else 0
+    revenue_result = await read_db.orders.aggregate(pipeline_revenue).to_list(1)
+    hot_revenue = revenue_result[0]['total'] if revenue_result else 0
+    # Orders mid-archive exist in both collections; count the hot copy only
+    duplicates = await duplicated_ids(db)
+    archived_result = await read_db.orders_archive.aggregate(
+        [{"$match": {"id": {"$nin": duplicates}}}] + pipeline_revenue
+    ).to_list(1)
+    total_revenue = hot_revenue + (archived_result[0]['total'] if archived_result else 0)
     
     # Monthly sales
     thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
@@ -39,30 +63,51 @@ async def get_dashboard_stats(current_user: dict = Depends(require_admin)):
         },
         {"$group": {"_id": None, "total": {"$sum": "$final_amount"}}}
     ]
-    monthly_result = await db.orders.aggregate(pipeline_monthly).to_list(1)
+    monthly_result = await read_db.orders.aggregate(pipeline_monthly).to_list(1)
     monthly_sales = monthly_result[0]['total'] if monthly_result else 0
     
-    # Calculate profit
-    completed_orders = await db.orders.find({"payment_status": "completed"}, {"_id": 0}).to_list(10000)
+    # Profit over the same orders as total_revenue (hot and archived), summed per product
+    pipeline_items = [
+        {"$match": {"payment_status": "completed"}},
+        {"$unwind": "$products"},
+        {"$group": {
+            "_id": "$products.product_id",
+            "quantity": {"$sum": "$products.quantity"},
+            "revenue": {"$sum": {"$multiply": ["$products.price", "$products.quantity"]}}
+        }}
+    ]
+    sold = await read_db.orders.aggregate(pipeline_items).to_list(None)
+    sold += await read_db.orders_archive.aggregate(
+        [{"$match": {"id": {"$nin": duplicates}}}] + pipeline_items
+    ).to_list(None)
+    cost_prices = {
+        product['id']: product['cost_price']
+        async for product in read_db.products.find(
+            {"id": {"$in": list({line['_id'] for line in sold})}, "cost_price": {"$gt": 0}},
+            {"_id": 0, "id": 1, "cost_price": 1}
+        )
+    }
     total_profit = 0
     total_cost = 0
     
-    for order in completed_orders:
-        for item in order.get('products', []):
-            product = await db.products.find_one({"id": item['product_id']}, {"_id": 0})
-            if product and product.get('cost_price'):
-                item_cost = product['cost_price'] * item['quantity']
-                item_revenue = item['price'] * item['quantity']
-                total_cost += item_cost
-                total_profit += (item_revenue - item_cost)
+    for line in sold:
+        cost_price = cost_prices.get(line['_id'])
+        if cost_price:
+            item_cost = cost_price * line['quantity']
+            total_cost += item_cost
+            total_profit += (line['revenue'] - item_cost)
     
     profit_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
     
-    total_users = await db.users.count_documents({})
-    total_orders = await db.orders.count_documents({})
-    pending_orders = await db.orders.count_documents({"order_status": "pending"})
+    total_users = await read_db.users.count_documents({})
+    total_orders = (
+        await read_db.orders.count_documents({})
+        + await read_db.orders_archive.estimated_document_count()
+        - len(duplicates)
+    )
+    pending_orders = await read_db.orders.count_documents({"order_status": "pending"})
     
-    top_products = await db.products.find(
+    top_products = await read_db.products.find(
         {},
         {"_id": 0, "id": 1, "name": 1, "total_sold": 1, "price": 1, "cost_price": 1, "images": 1}
     ).sort("total_sold", -1).limit(5).to_list(5)
@@ -76,19 +121,78 @@ async def get_dashboard_stats(current_user: dict = Depends(require_admin)):
         "total_users": total_users,
         "total_orders": total_orders,
         "pending_orders": pending_orders,
-        "top_products": top_products
+        "top_products": top_products,
+        "trending_products": trending.top(limit=5)
+    }
+
+USER_PAGE_SIZE = 50
+MAX_USER_PAGE_SIZE = 200
+
+def _order_stats_lookup(collection: str, name: str) -> dict:
+    return {"$lookup": {
+        "from": collection,
+        "let": {"uid": "$id"},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$user_id", "$$uid"]}}},
+            {"$group": {
+                "_id": None,
+                "order_count": {"$sum": 1},
+                "total_spent": {"$sum": {"$cond": [{"$eq": ["$order_status", "cancelled"]}, 0, "$final_amount"]}},
+                "last_order_at": {"$max": "$created_at"}
+            }}
+        ],
+        "as": name
+    }}
+
+def _order_stats(user: dict) -> dict:
+    groups = user.pop('_orders', []) + user.pop('_archived_orders', [])
+    last_order_at = max((g['last_order_at'] for g in groups if g.get('last_order_at')), default=None)
+    return {
+        "order_count": sum(g['order_count'] for g in groups),
+        "total_spent": round(sum(g['total_spent'] for g in groups), 2),
+        "last_order_at": datetime.fromisoformat(last_order_at) if isinstance(last_order_at, str) else last_order_at
     }
 
 @router.get("/users")
-async def get_all_users(current_user: dict = Depends(require_admin)):
-    """Get all users"""
-    users = await db.users.find({}, {"_id": 0}).to_list(1000)
+async def get_all_users(
+    q: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(USER_PAGE_SIZE, ge=1, le=MAX_USER_PAGE_SIZE),
+    view: str = "admin",
+    fields: Optional[str] = None,
+    current_user: dict = Depends(require_admin)
+):
+    """Search users by phone/name/email prefix, newest first, with order stats"""
+    conditions = []
+    if q and q.strip():
+        conditions.append(prefix_query(q))
+    if cursor:
+        conditions.append(after_cursor(cursor))
+    
+    projection = build_projection(USER_VIEWS, view, fields, USER_PRIVATE_FIELDS)
+    # Inclusion projections must keep the cursor keys and the joined stats
+    if any(v == 1 for v in projection.values()):
+        projection = {**projection, "id": 1, "created_at": 1, "_orders": 1, "_archived_orders": 1}
     
-    for user in users:
+    # One round-trip: the page of users with their order stats joined in
+    users = await db.users.aggregate([
+        {"$match": {"$and": conditions} if conditions else {}},
+        {"$sort": {"created_at": -1, "id": -1}},
+        {"$limit": limit + 1},
+        _order_stats_lookup("orders", "_orders"),
+        _order_stats_lookup("orders_archive", "_archived_orders"),
+        {"$project": projection}
+    ]).to_list(limit + 1)
+    
+    page = users[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(users) > limit else None
+    
+    for user in page:
+        user['order_stats'] = _order_stats(user)
         if isinstance(user.get('created_at'), str):
             user['created_at'] = datetime.fromisoformat(user['created_at'])
     
-    return users
+    return {"users": page, "next_cursor": next_cursor}
 
 @router.put("/users/{user_id}/role")
 async def update_user_role(
@@ -111,12 +215,73 @@ async def update_user_role(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    # Tokens carry the role claim, so existing sessions must sign in again
+    await revoke_user_tokens(user_id)
+    await bus.publish(f"user:{user_id}")
+    
     return {"message": "User role updated successfully"}
 
+@router.get("/cache/stats")
+async def get_cache_stats(current_user: dict = Depends(require_admin)):
+    """Get this worker's cache invalidation bus, catalog index and counter metrics"""
+    return {**bus.stats(), "catalog_index": catalog_index.stats(), "counters": counters.stats()}
+
+@router.get("/loop/stats")
+async def get_loop_stats(current_user: dict = Depends(require_admin)):
+    """Get this worker's event loop lag histogram and recent blocking callbacks"""
+    return watchdog.stats()
+
+@router.get("/jobs")
+async def get_jobs(current_user: dict = Depends(require_admin)):
+    """Get scheduled jobs with their next run and last run record"""
+    return await scheduler.status()
+
+@router.post("/jobs/{job_name}/run", status_code=202)
+async def run_job(job_name: str, current_user: dict = Depends(require_admin)):
+    """Start a scheduled job now; poll /jobs for the recorded run"""
+    if job_name not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    try:
+        run = await scheduler.trigger(job_name)
+    except SchedulerBusy:
+        raise HTTPException(status_code=503, detail="Other jobs are running; try again shortly")
+    if run is None:
+        raise HTTPException(status_code=409, detail="Job is already running")
+    
+    return run
+
+@router.get("/profile")
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=profiler.MAX_SECONDS),
+    format: str = "speedscope",
+    current_user: dict = Depends(require_admin)
+):
+    """Sample this worker's event loop thread and return a flamegraph (Super Admin only)"""
+    if current_user.get('role') != 'super_admin':
+        raise HTTPException(status_code=403, detail="Super Admin access required")
+    
+    if format not in ("speedscope", "collapsed"):
+        raise HTTPException(status_code=400, detail="Format must be speedscope or collapsed")
+    
+    loop_thread = threading.get_ident()
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(None, profiler.sample, loop_thread, seconds)
+    except profiler.ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+    
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed(result), headers={
+            "X-Profile-Samples": str(result['samples']),
+            "X-Profile-Overhead": str(result['overhead'])
+        })
+    
+    return profiler.speedscope(result, name=f"worker {os.getpid()} event loop")
+
 @router.get("/invoice/{order_id}")
 async def get_invoice_data(order_id: str, current_user: dict = Depends(require_admin)):
     """Get invoice data for an order"""
-    order = await db.orders.find_one({"id": order_id}, {"_id": 0})
+    order = await find_order(db, order_id)
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -1,41 +1,73 @@
 from fastapi import APIRouter, HTTPException, Depends
 from models.user import User, UserCreate, UserUpdate, LoginRequest, VerifyOTPRequest, Address
-from utils.auth import create_access_token, generate_otp, verify_otp
-from middleware.auth import get_current_user
+from utils.auth import create_access_token
+from utils.otp import OTPStore, OTPError, MOCK_OTP
+from fastapi.security import HTTPAuthorizationCredentials
+from middleware.auth import get_current_user, revoke_token, security
+from routes.products import fetch_products_by_ids, CARD_PRODUCT_PROJECTION
+from utils.fields import ORDER_VIEWS, USER_PRIVATE_FIELDS, build_projection
+from utils import user_search
+from utils.db_routing import causal_session
+import asyncio
 import uuid
 from datetime import datetime, timezone
+from typing import Optional
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 # DB will be injected by server.py
 db = None
+otp_store = None
 
 def set_db(database):
-    global db
+    global db, otp_store
     db = database
+    otp_store = OTPStore(database)
+
+async def create_indexes():
+    await db.users.create_index("id", unique=True)
+    await db.users.create_index("phone")
+    await otp_store.create_indexes()
+    await user_search.create_indexes(db)
+
+USER_PROJECTION = {"_id": 0, **{f: 0 for f in USER_PRIVATE_FIELDS}}
+
+BOOTSTRAP_SECTIONS = {"orders", "wishlist", "addresses"}
+RECENT_ORDERS_LIMIT = 5
+
+ORDER_SUMMARY_PROJECTION = build_projection(ORDER_VIEWS, "card")
 
 @router.post("/login")
 async def login(request: LoginRequest):
-    """Send OTP to phone number (mock)"""
-    otp = generate_otp()
+    """Send OTP to phone number"""
+    try:
+        otp = await otp_store.issue(request.phone)
+        await otp_store.send(request.phone, otp)
+    except OTPError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     
-    # Mock OTP sending
-    print(f"[MOCK SMS] Sending OTP {otp} to {request.phone}")
-    
-    return {
+    response = {
         "message": "OTP sent successfully",
-        "phone": request.phone,
-        "mock_otp": otp
+        "phone": request.phone
     }
+    if MOCK_OTP:
+        response['mock_otp'] = otp
+    
+    return response
 
 @router.post("/verify-otp")
 async def verify_otp_endpoint(request: VerifyOTPRequest):
     """Verify OTP and create/login user"""
-    if not verify_otp(request.phone, request.otp):
+    try:
+        verified = await otp_store.verify(request.phone, request.otp)
+    except OTPError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    
+    if not verified:
         raise HTTPException(status_code=400, detail="Invalid OTP")
     
     # Check if user exists
-    user_doc = await db.users.find_one({"phone": request.phone}, {"_id": 0})
+    user_doc = await db.users.find_one({"phone": request.phone}, USER_PROJECTION)
     
     if not user_doc:
         # Create new user
@@ -76,10 +108,20 @@ async def verify_otp_endpoint(request: VerifyOTPRequest):
         "user": user_doc
     }
 
+@router.post("/logout")
+async def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: dict = Depends(get_current_user)
+):
+    """Revoke the current token"""
+    await revoke_token(credentials.credentials, current_user['user_id'])
+    
+    return {"message": "Logged out successfully"}
+
 @router.get("/me")
 async def get_profile(current_user: dict = Depends(get_current_user)):
     """Get current user profile"""
-    user_doc = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0})
+    user_doc = await db.users.find_one({"id": current_user['user_id']}, USER_PROJECTION)
     
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
@@ -89,6 +131,50 @@ async def get_profile(current_user: dict = Depends(get_current_user)):
     
     return user_doc
 
+@router.get("/bootstrap")
+async def get_bootstrap(include: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """Get the user profile plus requested page data (orders, wishlist, addresses) in one call"""
+    sections = {s.strip() for s in include.split(",")} if include else set()
+    unknown = sections - BOOTSTRAP_SECTIONS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(sorted(unknown))}")
+    
+    user_lookup = db.users.find_one({"id": current_user['user_id']}, USER_PROJECTION)
+    if "orders" in sections:
+        orders_lookup = db.orders.find(
+            {"user_id": current_user['user_id']},
+            ORDER_SUMMARY_PROJECTION
+        ).sort("created_at", -1).to_list(RECENT_ORDERS_LIMIT)
+        user_doc, orders = await asyncio.gather(user_lookup, orders_lookup)
+    else:
+        user_doc, orders = await user_lookup, None
+    
+    if not user_doc:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    if isinstance(user_doc.get('created_at'), str):
+        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
+    
+    response = {"user": user_doc}
+    
+    if orders is not None:
+        for order in orders:
+            if isinstance(order.get('created_at'), str):
+                order['created_at'] = datetime.fromisoformat(order['created_at'])
+        response['orders'] = orders
+    
+    if "addresses" in sections:
+        response['addresses'] = user_doc.get('addresses', [])
+    
+    if "wishlist" in sections:
+        wishlist_ids = user_doc.get('wishlist', [])
+        if wishlist_ids:
+            response['wishlist'] = await fetch_products_by_ids(wishlist_ids, CARD_PRODUCT_PROJECTION)
+        else:
+            response['wishlist'] = {"products": [], "missing": []}
+    
+    return response
+
 @router.put("/me")
 async def update_profile(update_data: UserUpdate, current_user: dict = Depends(get_current_user)):
     """Update user profile"""
@@ -96,13 +182,17 @@ async def update_profile(update_data: UserUpdate, current_user: dict = Depends(g
     
     if not update_dict:
         raise HTTPException(status_code=400, detail="No data to update")
+    update_dict.update(user_search.search_keys(update_dict))
     
-    await db.users.update_one(
-        {"id": current_user['user_id']},
-        {"$set": update_dict}
-    )
+    async with await causal_session() as session:
+        await db.users.update_one(
+            {"id": current_user['user_id']},
+            {"$set": update_dict},
+            session=session
+        )
+        
+        user_doc = await db.users.find_one({"id": current_user['user_id']}, USER_PROJECTION, session=session)
     
-    user_doc = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0})
     return user_doc
 
 @router.post("/addresses")
@@ -121,7 +211,7 @@ async def add_address(address: Address, current_user: dict = Depends(get_current
 @router.put("/addresses/{address_id}")
 async def update_address(address_id: str, address: Address, current_user: dict = Depends(get_current_user)):
     """Update address"""
-    user_doc = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0})
+    user_doc = await db.users.find_one({"id": current_user['user_id']}, USER_PROJECTION)
     
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, HTTPException
+from models.cart import CartQuoteRequest
+from utils.pricing import pricing, PricingError
+
+router = APIRouter(prefix="/cart", tags=["Cart"])
+
+@router.post("/quote")
+async def quote_cart(request: CartQuoteRequest):
+    """Price a cart server-side, with the coupon applied"""
+    try:
+        return await pricing.quote(request.items, request.coupon_code)
+    except PricingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
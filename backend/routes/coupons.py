@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
 from models.coupon import Coupon, CouponCreate, CouponValidate
 from middleware.auth import get_current_user
+from utils.invalidation import bus
 import uuid
 from datetime import datetime, timezone
 
@@ -30,6 +31,7 @@ async def create_coupon(coupon: CouponCreate):
     doc['expiry_date'] = doc['expiry_date'].isoformat()
     
     await db.coupons.insert_one(doc)
+    await bus.publish(f"coupon:{coupon.code}")
     
     return new_coupon
 
@@ -87,9 +89,11 @@ async def delete_coupon(coupon_id: str, current_user: dict = Depends(get_current
     if current_user.get('role') not in ['admin', 'supervisor', 'super_admin']:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    result = await db.coupons.delete_one({"id": coupon_id})
+    deleted = await db.coupons.find_one_and_delete({"id": coupon_id}, {"_id": 0, "code": 1})
     
-    if result.deleted_count == 0:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Coupon not found")
     
+    await bus.publish(f"coupon:{deleted['code']}")
+    
     return {"message": "Coupon deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse
+from utils.cache import TTLCache
+from utils.invalidation import bus
+from utils import images
+from typing import Optional
+
+router = APIRouter(prefix="/images", tags=["Images"])
+
+db = None
+
+def set_db(database):
+    global db
+    db = database
+
+# product_id -> image URLs, so rendition hits don't need a database read
+_image_urls = TTLCache(maxsize=4096, ttl=300)
+bus.subscribe("product", lambda key: _image_urls.pop(key))
+bus.subscribe("catalog", lambda key: _image_urls.clear())
+
+# Rendition URLs carry a version of the original URL, so they never change content
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/{product_id}/{index}")
+async def get_product_image(
+    product_id: str,
+    index: int,
+    w: Optional[int] = Query(None, ge=1),
+    fmt: str = "webp"
+):
+    """Get a resized product image rendition"""
+    urls = _image_urls.get(product_id)
+    if urls is None:
+        product = await db.products.find_one({"id": product_id}, {"_id": 0, "images": 1})
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        urls = product.get('images', [])
+        _image_urls.set(product_id, urls)
+    
+    if index < 0 or index >= len(urls):
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    try:
+        path = await images.get_rendition(urls[index], images.snap_width(w), fmt)
+    except images.ImageError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    
+    return FileResponse(
+        path,
+        media_type=images.FORMATS[fmt],
+        headers={"Cache-Control": CACHE_CONTROL}
+    )
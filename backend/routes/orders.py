@@ -2,6 +2,15 @@ from fastapi import APIRouter, HTTPException, Depends
 from models.order import Order, OrderCreate, OrderProduct, ShippingAddress
 from middleware.auth import get_current_user
 from utils.auth import initiate_razorpay_payment, verify_razorpay_payment, send_whatsapp_message
+from utils.catalog import stock_decrement_pipeline
+from utils.db_routing import causal_session
+from utils.fields import ORDER_VIEWS, build_projection
+from utils.trending import trending
+from utils.counters import counters
+from utils.loop_watchdog import run_blocking
+from utils.serviceability import serviceability
+from utils.pricing import pricing, PricingError
+from utils.order_archive import create_indexes as create_archive_indexes, find_order, find_user_orders
 import uuid
 from datetime import datetime, timezone
 from typing import Optional
@@ -14,78 +23,84 @@ def set_db(database):
     global db
     db = database
 
+async def create_indexes():
+    await db.orders.create_index("id", unique=True)
+    await db.orders.create_index([("user_id", 1), ("created_at", -1)])
+    await db.orders.create_index([("order_status", 1), ("created_at", -1)])
+    await create_archive_indexes(db)
+
 @router.post("")
 async def create_order(order_data: OrderCreate, current_user: dict = Depends(get_current_user)):
     """Create new order"""
+    address = order_data.shipping_address
+    delivery = serviceability.quote(address.pincode, address.latitude, address.longitude) if address.pincode.isdigit() else None
+    if delivery is not None and not delivery['serviceable']:
+        raise HTTPException(status_code=400, detail="We don't deliver to this pincode yet")
+    if delivery is not None and order_data.payment_method == "cod" and not delivery['cod_available']:
+        raise HTTPException(status_code=400, detail="Cash on delivery is not available for this pincode")
+    
     order_id = str(uuid.uuid4())
     
-    final_amount = order_data.total_amount - order_data.discount_amount
+    # Same quote as /api/cart/quote: server prices, one batched product read at most
+    try:
+        quote = await pricing.quote(order_data.products, order_data.coupon_code)
+        if quote['coupon_code']:
+            await pricing.redeem_coupon(quote['coupon_code'])
+    except PricingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     
-    if order_data.coupon_code:
-        coupon = await db.coupons.find_one(
-            {"code": order_data.coupon_code, "is_active": True},
-            {"_id": 0}
-        )
-        
-        if not coupon:
-            raise HTTPException(status_code=400, detail="Invalid coupon code")
+    final_amount = quote['total']
+    
+    # Until the order is stored, a failure gives the coupon use back
+    unspent_coupon = quote['coupon_code']
+    try:
+        payment_status = "pending"
+        razorpay_payment_id = None
         
-        if isinstance(coupon.get('expiry_date'), str):
-            coupon['expiry_date'] = datetime.fromisoformat(coupon['expiry_date'])
+        if order_data.payment_method == "razorpay":
+            payment_response = await run_blocking(initiate_razorpay_payment, final_amount, order_id)
+            razorpay_payment_id = payment_response['payment_id']
+            payment_status = "completed"
+        elif order_data.payment_method == "cod":
+            payment_status = "pending"
         
-        if coupon['expiry_date'] < datetime.now(timezone.utc):
-            raise HTTPException(status_code=400, detail="Coupon expired")
+        new_order = Order(
+            id=order_id,
+            user_id=current_user['user_id'],
+            products=[OrderProduct(**line) for line in quote['items']],
+            total_amount=quote['subtotal'],
+            discount_amount=quote['discount_amount'],
+            final_amount=final_amount,
+            payment_method=order_data.payment_method,
+            payment_status=payment_status,
+            order_status="pending",
+            razorpay_payment_id=razorpay_payment_id,
+            shipping_address=order_data.shipping_address
+        )
         
-        if coupon['used_count'] >= coupon['usage_limit']:
-            raise HTTPException(status_code=400, detail="Coupon usage limit reached")
+        doc = new_order.model_dump()
+        doc['created_at'] = doc['created_at'].isoformat()
+        doc['updated_at'] = doc['updated_at'].isoformat()
         
-        await db.coupons.update_one(
-            {"code": order_data.coupon_code},
-            {"$inc": {"used_count": 1}}
-        )
-    
-    payment_status = "pending"
-    razorpay_payment_id = None
-    
-    if order_data.payment_method == "razorpay":
-        payment_response = initiate_razorpay_payment(final_amount, order_id)
-        razorpay_payment_id = payment_response['payment_id']
-        payment_status = "completed"
-    elif order_data.payment_method == "cod":
-        payment_status = "pending"
-    
-    new_order = Order(
-        id=order_id,
-        user_id=current_user['user_id'],
-        products=order_data.products,
-        total_amount=order_data.total_amount,
-        discount_amount=order_data.discount_amount,
-        final_amount=final_amount,
-        payment_method=order_data.payment_method,
-        payment_status=payment_status,
-        order_status="pending",
-        razorpay_payment_id=razorpay_payment_id,
-        shipping_address=order_data.shipping_address
-    )
-    
-    doc = new_order.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    
-    await db.orders.insert_one(doc)
+        # Causal session keeps the follow-up reads consistent with these writes
+        async with await causal_session() as session:
+            await db.orders.insert_one(doc, session=session)
+            unspent_coupon = None
+            
+            for product in order_data.products:
+                await db.products.update_one(
+                    {"id": product.product_id},
+                    stock_decrement_pipeline(product.variant_size, product.variant_color, product.quantity),
+                    session=session
+                )
+                counters.incr("products", product.product_id, "total_sold", product.quantity)
+                trending.record(product.product_id, product.quantity)
+            
+            user_doc = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0}, session=session)
+    finally:
+        if unspent_coupon:
+            await pricing.release_coupon(unspent_coupon)
     
-    for product in order_data.products:
-        await db.products.update_one(
-            {"id": product.product_id},
-            {
-                "$inc": {
-                    "stock": -product.quantity,
-                    "total_sold": product.quantity
-                }
-            }
-        )
-    
-    user_doc = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0})
     customer_name = user_doc.get('name', 'Customer')
     customer_phone = user_doc.get('phone', '')
     
@@ -98,17 +113,18 @@ Total: ₹{final_amount:.2f}
 Thank you for shopping with VEXOR.
 Built for Those Who Move Different."""
     
-    send_whatsapp_message(customer_phone, whatsapp_message)
+    await run_blocking(send_whatsapp_message, customer_phone, whatsapp_message)
     
     return new_order
 
 @router.get("/my-orders")
-async def get_my_orders(current_user: dict = Depends(get_current_user)):
+async def get_my_orders(
+    view: str = "detail",
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     """Get current user's orders"""
-    orders = await db.orders.find(
-        {"user_id": current_user['user_id']},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
+    orders = await find_user_orders(db, current_user['user_id'], build_projection(ORDER_VIEWS, view, fields))
     
     for order in orders:
         if isinstance(order.get('created_at'), str):
@@ -121,7 +137,7 @@ async def get_my_orders(current_user: dict = Depends(get_current_user)):
 @router.get("/{order_id}")
 async def get_order(order_id: str, current_user: dict = Depends(get_current_user)):
     """Get single order"""
-    order = await db.orders.find_one({"id": order_id}, {"_id": 0})
+    order = await find_order(db, order_id)
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
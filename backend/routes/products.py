@@ -1,6 +1,19 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
-from models.product import Product, ProductCreate, ProductUpdate, ProductVariant
-from middleware.auth import get_current_user
+from fastapi import APIRouter, HTTPException, Query, Depends, Request
+from models.product import Product, ProductCreate, ProductUpdate, ProductVariant, ProductBatchRequest
+from middleware.auth import get_optional_user
+from utils.cache import TTLCache, make_key
+from utils.catalog import AVAILABILITY_STAGE, availability_fields, variant_filter
+from utils.recommendations import get_recommendations
+from utils.invalidation import bus
+from utils.db_routing import causal_session
+from utils.images import srcset as image_srcset
+from utils.fields import PRODUCT_VIEWS, PRODUCT_PRIVATE_FIELDS, build_projection, parse_fields
+from utils.precompressed import PrecompressedCache
+from utils.trending import trending
+from utils.catalog_index import catalog_index
+from utils import product_import
+from routes.reviews import REVIEW_PAGE_SIZE, review_page
+from routes.admin import require_admin
 import uuid
 from typing import Optional, List
 from datetime import datetime, timezone
@@ -8,21 +21,85 @@ from datetime import datetime, timezone
 router = APIRouter(prefix="/products", tags=["Products"])
 
 db = None
+read_db = None
 
-def set_db(database):
-    global db
+def set_db(database, read_database=None):
+    """Writes and read-your-writes go to `database`; stale-tolerant reads to `read_database`"""
+    global db, read_db
     db = database
+    read_db = read_database if read_database is not None else database
 
-@router.get("")
-async def get_products(
-    category: Optional[str] = None,
-    min_price: Optional[float] = None,
-    max_price: Optional[float] = None,
-    sort_by: Optional[str] = "newest",
-    page: int = Query(1, ge=1),
-    limit: int = Query(12, ge=1, le=100)
-):
-    """Get products with filtering and pagination"""
+# Faceted listings keyed by normalized filters; cleared on any product write
+catalog_cache = TTLCache(maxsize=512, ttl=60)
+# Serialized + gzip/brotli bodies for hot public responses (featured, categories, first pages)
+catalog_responses = PrecompressedCache(maxsize=256, ttl=300)
+
+def _clear_catalog_caches(key):
+    catalog_cache.clear()
+    catalog_responses.clear()
+
+bus.subscribe("catalog", _clear_catalog_caches)
+bus.subscribe("product", _clear_catalog_caches)
+
+PRICE_BUCKETS = [0, 500, 1000, 2000, 3000, 5000, 10000]
+
+SORT_OPTIONS = {
+    "newest": [("created_at", -1)],
+    "price_low": [("price", 1)],
+    "price_high": [("price", -1)],
+    "popular": [("total_sold", -1)],
+    "rating": [("ratings", -1)],
+    "trending": [("trending_score", -1)]
+}
+
+MAX_BATCH_SIZE = 100
+PRODUCT_INCLUDES = {"reviews", "rating_histogram"}
+
+# Public default: everything except private fields such as cost_price
+PUBLIC_PRODUCT_PROJECTION = build_projection(PRODUCT_VIEWS, "detail", private_fields=PRODUCT_PRIVATE_FIELDS)
+CARD_PRODUCT_PROJECTION = build_projection(PRODUCT_VIEWS, "card", private_fields=PRODUCT_PRIVATE_FIELDS)
+TRENDING_PROJECTION = {**CARD_PRODUCT_PROJECTION, "trending_score": 1}
+# Only responses identical for every caller may be shared through catalog_responses
+SHAREABLE_PROJECTIONS = [PUBLIC_PRODUCT_PROJECTION, CARD_PRODUCT_PROJECTION]
+
+def product_projection(view: Optional[str], fields: Optional[str], current_user: Optional[dict]) -> dict:
+    """Projection for a requested view/field list; private fields need an admin"""
+    is_admin = current_user is not None and current_user.get('role') in ['admin', 'supervisor', 'super_admin']
+    
+    if view == "admin" and not is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return build_projection(
+        PRODUCT_VIEWS, view or "detail", fields,
+        private_fields=PRODUCT_PRIVATE_FIELDS,
+        include_private=view == "admin" or (is_admin and bool(fields))
+    )
+
+def prepare_product(product: dict) -> dict:
+    """Normalize a product document for the API response"""
+    if isinstance(product.get('created_at'), str):
+        product['created_at'] = datetime.fromisoformat(product['created_at'])
+    if product.get('images') and product.get('id'):
+        product['image_srcset'] = image_srcset(product['id'], product['images'])
+    return product
+
+async def create_indexes():
+    """Create catalog indexes and backfill denormalized variant availability"""
+    await db.products.create_index("id", unique=True)
+    await db.products.create_index([("category", 1), ("created_at", -1)])
+    # Multikey compound indexes: at most one array field per index
+    await db.products.create_index([("available_sizes", 1), ("category", 1), ("price", 1)])
+    await db.products.create_index([("available_colors", 1), ("category", 1), ("price", 1)])
+    await db.products.create_index([("variants.size", 1), ("variants.color", 1), ("variants.stock", 1)])
+    
+    await db.products.update_many({"available_sizes": {"$exists": False}}, [AVAILABILITY_STAGE])
+    
+    await db.recommendations.create_index("product_id", unique=True)
+    await product_import.create_indexes(db)
+
+def build_product_query(category=None, min_price=None, max_price=None,
+                        size=None, color=None, in_stock=False) -> dict:
+    """Translate listing filters into a Mongo query"""
     query = {}
     
     if category:
@@ -35,23 +112,116 @@ async def get_products(
         if max_price is not None:
             query['price']['$lte'] = max_price
     
-    sort_options = {
-        "newest": [("created_at", -1)],
-        "price_low": [("price", 1)],
-        "price_high": [("price", -1)],
-        "popular": [("total_sold", -1)],
-        "rating": [("ratings", -1)]
-    }
-    sort = sort_options.get(sort_by, [("created_at", -1)])
+    query.update(variant_filter(size, color, in_stock))
+    
+    return query
+
+def _count_by(field: str) -> list:
+    """Facet stage counting distinct products per value of a variant field"""
+    return [
+        {"$unwind": "$variants"},
+        {"$group": {"_id": {"value": f"$variants.{field}", "product": "$id"}}},
+        {"$group": {"_id": "$_id.value", "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}}
+    ]
+
+async def get_faceted_products(query: dict, sort: list, page: int, limit: int, projection: dict) -> dict:
+    """Fetch a listing page and its facet counts in a single $facet aggregation"""
+    # Category counts ignore the active category so shoppers can switch between them
+    base_query = {k: v for k, v in query.items() if k != 'category'}
+    category_match = {"$match": {"category": query['category']} if 'category' in query else {}}
+    
+    pipeline = [
+        {"$match": base_query},
+        {"$facet": {
+            "products": [
+                category_match,
+                {"$sort": dict(sort)},
+                {"$skip": (page - 1) * limit},
+                {"$limit": limit},
+                {"$project": projection}
+            ],
+            "total": [category_match, {"$count": "count"}],
+            "categories": [
+                {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+                {"$sort": {"_id": 1}}
+            ],
+            "price_ranges": [
+                category_match,
+                {"$bucket": {
+                    "groupBy": "$price",
+                    "boundaries": PRICE_BUCKETS,
+                    "default": PRICE_BUCKETS[-1],
+                    "output": {"count": {"$sum": 1}}
+                }}
+            ],
+            "sizes": [category_match] + _count_by("size"),
+            "colors": [category_match] + _count_by("color")
+        }}
+    ]
+    
+    result = (await read_db.products.aggregate(pipeline).to_list(1))[0]
     
-    total = await db.products.count_documents(query)
+    products = result['products']
+    for product in products:
+        prepare_product(product)
+    
+    total = result['total'][0]['count'] if result['total'] else 0
+    
+    price_ranges = []
+    for bucket in result['price_ranges']:
+        index = PRICE_BUCKETS.index(bucket['_id'])
+        upper = PRICE_BUCKETS[index + 1] if index + 1 < len(PRICE_BUCKETS) else None
+        price_ranges.append({"min": bucket['_id'], "max": upper, "count": bucket['count']})
+    
+    return {
+        "products": products,
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "total_pages": (total + limit - 1) // limit,
+        "facets": {
+            "categories": [{"value": c['_id'], "count": c['count']} for c in result['categories']],
+            "price_ranges": price_ranges,
+            "sizes": [{"value": s['_id'], "count": s['count']} for s in result['sizes']],
+            "colors": [{"value": c['_id'], "count": c['count']} for c in result['colors']]
+        }
+    }
+
+async def list_products(query: dict, sort: list, page: int, limit: int, projection: dict) -> dict:
+    total = await read_db.products.count_documents(query)
     
     skip = (page - 1) * limit
-    products = await db.products.find(query, {"_id": 0}).sort(sort).skip(skip).limit(limit).to_list(limit)
+    products = await read_db.products.find(query, projection).sort(sort).skip(skip).limit(limit).to_list(limit)
     
     for product in products:
-        if isinstance(product.get('created_at'), str):
-            product['created_at'] = datetime.fromisoformat(product['created_at'])
+        prepare_product(product)
+    
+    return {
+        "products": products,
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "total_pages": (total + limit - 1) // limit
+    }
+
+async def list_indexed_products(ids: list, total: int, page: int, limit: int, projection: dict) -> dict:
+    """Hydrate a page of ids answered by the in-memory catalog index"""
+    drop_id = projection.get('id') != 1 and any(v == 1 for v in projection.values())
+    lookup = {**projection, "id": 1} if drop_id else projection
+    
+    docs = await read_db.products.find({"id": {"$in": ids}}, lookup).to_list(len(ids))
+    by_id = {doc['id']: doc for doc in docs}
+    
+    products = []
+    for product_id in ids:
+        product = by_id.get(product_id)
+        if product is None:
+            continue
+        prepare_product(product)
+        if drop_id:
+            product.pop('id')
+        products.append(product)
     
     return {
         "products": products,
@@ -61,83 +231,355 @@ async def get_products(
         "total_pages": (total + limit - 1) // limit
     }
 
+@router.get("")
+async def get_products(
+    request: Request,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort_by: Optional[str] = "newest",
+    page: int = Query(1, ge=1),
+    limit: int = Query(12, ge=1, le=100),
+    size: Optional[str] = None,
+    color: Optional[str] = None,
+    in_stock: bool = False,
+    facets: bool = False,
+    view: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: Optional[dict] = Depends(get_optional_user)
+):
+    """Get products with filtering and pagination, optionally with facet counts"""
+    query = build_product_query(category, min_price, max_price, size, color, in_stock)
+    projection = product_projection(view, fields, current_user)
+    
+    if sort_by not in SORT_OPTIONS:
+        sort_by = "newest"
+    sort = SORT_OPTIONS[sort_by]
+    
+    cache_key = make_key(
+        "products", facets=facets, category=category, min_price=min_price, max_price=max_price,
+        sort_by=sort_by, page=page, limit=limit, size=size, color=color, in_stock=in_stock,
+        projection=tuple(sorted(projection.items()))
+    )
+    
+    async def fetch():
+        if facets:
+            return await get_faceted_products(query, sort, page, limit, projection)
+        if not (size or color or in_stock):
+            indexed = catalog_index.query(category, min_price, max_price, sort_by, page, limit)
+            if indexed is not None:
+                return await list_indexed_products(*indexed, page, limit, projection)
+        return await list_products(query, sort, page, limit, projection)
+    
+    if page == 1 and projection in SHAREABLE_PROJECTIONS:
+        return await catalog_responses.respond(request, cache_key, fetch)
+    
+    if facets:
+        cached = catalog_cache.get(cache_key)
+        if cached is None:
+            cached = await fetch()
+            catalog_cache.set(cache_key, cached)
+        return cached
+    
+    return await fetch()
+
 @router.get("/featured")
-async def get_featured_products():
+async def get_featured_products(
+    request: Request,
+    view: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: Optional[dict] = Depends(get_optional_user)
+):
     """Get featured products"""
-    products = await db.products.find({"is_featured": True}, {"_id": 0}).limit(8).to_list(8)
+    projection = product_projection(view, fields, current_user)
     
-    for product in products:
-        if isinstance(product.get('created_at'), str):
-            product['created_at'] = datetime.fromisoformat(product['created_at'])
+    async def fetch():
+        products = await read_db.products.find({"is_featured": True}, projection).limit(8).to_list(8)
+        
+        for product in products:
+            prepare_product(product)
+        
+        return products
+    
+    if projection in SHAREABLE_PROJECTIONS:
+        key = make_key("featured", projection=tuple(sorted(projection.items())))
+        return await catalog_responses.respond(request, key, fetch)
+    
+    return await fetch()
+
+@router.get("/trending")
+async def get_trending_products(
+    category: Optional[str] = None,
+    limit: int = Query(12, ge=1, le=50)
+):
+    """Get products ranked by time-decayed sales, served from memory"""
+    return [prepare_product(product) for product in trending.top(category, limit)]
+
+@router.get("/facets")
+async def get_product_facets(
+    request: Request,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort_by: Optional[str] = "newest",
+    page: int = Query(1, ge=1),
+    limit: int = Query(12, ge=1, le=100),
+    size: Optional[str] = None,
+    color: Optional[str] = None,
+    in_stock: bool = False,
+    view: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: Optional[dict] = Depends(get_optional_user)
+):
+    """Get a product page with category, price, size and color counts"""
+    return await get_products(
+        request, category, min_price, max_price, sort_by, page, limit,
+        size=size, color=color, in_stock=in_stock, facets=True,
+        view=view, fields=fields, current_user=current_user
+    )
+
+async def fetch_products_by_ids(ids: List[str], projection: Optional[dict] = None) -> dict:
+    """Resolve many product ids or slugs with one $in query, preserving request order"""
+    ids = list(dict.fromkeys(ids))
+    
+    projection = dict(projection or PUBLIC_PRODUCT_PROJECTION)
+    if 1 in projection.values():
+        # Needed to map documents back to the requested keys
+        projection.update({"id": 1, "slug": 1})
+    
+    docs = await read_db.products.find(
+        {"$or": [{"id": {"$in": ids}}, {"slug": {"$in": ids}}]},
+        projection
+    ).to_list(len(ids) * 2)
+    
+    by_key = {}
+    for doc in docs:
+        prepare_product(doc)
+        by_key[doc['id']] = doc
+        if doc.get('slug'):
+            by_key.setdefault(doc['slug'], doc)
+    
+    return {
+        "products": [by_key[key] for key in ids if key in by_key],
+        "missing": [key for key in ids if key not in by_key]
+    }
+
+def _validate_batch(ids: List[str]):
+    if not ids:
+        raise HTTPException(status_code=400, detail="No product ids given")
+    if len(ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} ids per batch")
+
+@router.get("/batch")
+async def get_products_batch(
+    ids: str,
+    view: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: Optional[dict] = Depends(get_optional_user)
+):
+    """Get many products by comma-separated ids or slugs"""
+    id_list = [i.strip() for i in ids.split(",") if i.strip()]
+    _validate_batch(id_list)
+    
+    return await fetch_products_by_ids(id_list, product_projection(view, fields, current_user))
+
+@router.post("/batch")
+async def post_products_batch(request: ProductBatchRequest, current_user: Optional[dict] = Depends(get_optional_user)):
+    """Get many products by ids or slugs (used for wishlist and cart revalidation)"""
+    _validate_batch(request.ids)
+    
+    return await fetch_products_by_ids(request.ids, product_projection(request.view, request.fields, current_user))
+
+@router.post("/import", status_code=202)
+async def import_products(
+    request: Request,
+    format: Optional[str] = None,
+    dry_run: bool = False,
+    current_user: dict = Depends(require_admin)
+):
+    """Bulk upsert products from a CSV or NDJSON body
+
+    The upload is accepted once received and imported in the background; poll
+    `GET /import/{import_id}` with the returned id for progress and row errors.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "ndjson" in content_type or "json" in content_type else "csv"
+    if format not in product_import.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format, expected one of: {', '.join(product_import.FORMATS)}")
+    
+    job = product_import.ProductImport(db, fmt=format, dry_run=dry_run, user_id=current_user['user_id'])
+    await job.receive(request.stream())
+    
+    async def publish(summary):
+        if not dry_run and (summary['inserted'] or summary['updated']):
+            await bus.publish("catalog:*")
+    
+    job.start(on_complete=publish)
     
-    return products
+    return {"import_id": job.id, "status": "queued"}
+
+@router.get("/import/{import_id}")
+async def get_import_status(import_id: str, current_user: dict = Depends(require_admin)):
+    """Progress and row errors of a running or finished import"""
+    status = await product_import.get_import(db, import_id)
+    
+    if not status:
+        raise HTTPException(status_code=404, detail="Import not found")
+    
+    return status
 
 @router.get("/categories")
-async def get_categories():
+async def get_categories(request: Request):
     """Get all unique categories"""
-    categories = await db.products.distinct("category")
-    return categories
+    async def fetch():
+        return await read_db.products.distinct("category")
+    
+    return await catalog_responses.respond(request, ("categories",), fetch)
 
 @router.get("/{product_id}")
-async def get_product(product_id: str):
-    """Get single product by ID or slug"""
-    product = await db.products.find_one(
-        {"$or": [{"id": product_id}, {"slug": product_id}]},
-        {"_id": 0}
-    )
+async def get_product(
+    product_id: str,
+    view: Optional[str] = None,
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
+    current_user: Optional[dict] = Depends(get_optional_user)
+):
+    """Get single product by ID or slug
+
+    `include=reviews,rating_histogram` embeds the first page of reviews and the
+    rating distribution, fetched in the same aggregation as the product.
+    """
+    projection = product_projection(view, fields, current_user)
+    includes = set(parse_fields(include))
+    unknown = includes - PRODUCT_INCLUDES
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include, expected any of: {', '.join(sorted(PRODUCT_INCLUDES))}")
+    
+    match = {"$or": [{"id": product_id}, {"slug": product_id}]}
+    if includes:
+        product = await _find_product_with_includes(match, projection, includes)
+    else:
+        product = await read_db.products.find_one(match, projection)
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    if isinstance(product.get('created_at'), str):
-        product['created_at'] = datetime.fromisoformat(product['created_at'])
+    prepare_product(product)
+    
+    return product
+
+async def _find_product_with_includes(match: dict, projection: dict, includes: set):
+    pipeline = [{"$match": match}, {"$limit": 1}]
+    
+    if "reviews" in includes:
+        pipeline.append({"$lookup": {
+            "from": "reviews",
+            "let": {"pid": "$id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$product_id", "$$pid"]}}},
+                {"$sort": {"created_at": -1, "id": -1}},
+                {"$limit": REVIEW_PAGE_SIZE + 1},
+                {"$project": {"_id": 0}}
+            ],
+            "as": "reviews"
+        }})
+    if "rating_histogram" in includes:
+        pipeline.append({"$lookup": {
+            "from": "reviews",
+            "let": {"pid": "$id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$product_id", "$$pid"]}}},
+                {"$group": {"_id": "$rating", "count": {"$sum": 1}}}
+            ],
+            "as": "rating_histogram"
+        }})
+    
+    # Inclusion projections must name the embedded arrays too
+    if any(v == 1 for v in projection.values()):
+        projection = {**projection, **{name: 1 for name in includes}}
+    pipeline.append({"$project": projection})
+    
+    products = await read_db.products.aggregate(pipeline).to_list(1)
+    if not products:
+        return None
+    
+    product = products[0]
+    if "reviews" in includes:
+        product['reviews'] = review_page(product['reviews'], REVIEW_PAGE_SIZE)
+    if "rating_histogram" in includes:
+        counts = {row['_id']: row['count'] for row in product['rating_histogram']}
+        product['rating_histogram'] = {str(rating): counts.get(rating, 0) for rating in range(1, 6)}
     
     return product
 
-@router.post("", dependencies=[Depends(get_current_user)])
+@router.get("/{product_id}/recommendations")
+async def get_product_recommendations(product_id: str, hydrate: bool = False):
+    """Get frequently-bought-together products from the precomputed map"""
+    neighbors = get_recommendations(product_id)
+    
+    if hydrate and neighbors:
+        batch = await fetch_products_by_ids([n['product_id'] for n in neighbors], CARD_PRODUCT_PROJECTION)
+        return {"product_id": product_id, "recommendations": neighbors, "products": batch['products']}
+    
+    return {"product_id": product_id, "recommendations": neighbors}
+
+@router.post("", dependencies=[Depends(require_admin)])
 async def create_product(product: ProductCreate):
-    """Create new product (Admin only - will add role check)"""
+    """Create new product (Admin only)"""
     product_id = str(uuid.uuid4())
     slug = product.name.lower().replace(" ", "-") + "-" + product_id[:8]
     
     new_product = Product(
         id=product_id,
         slug=slug,
-        **product.model_dump()
+        **product.model_dump(),
+        **availability_fields(product.variants)
     )
     
     doc = new_product.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     
     await db.products.insert_one(doc)
+    await bus.publish("catalog:*")
     
     return new_product
 
-@router.put("/{product_id}", dependencies=[Depends(get_current_user)])
+@router.put("/{product_id}", dependencies=[Depends(require_admin)])
 async def update_product(product_id: str, update_data: ProductUpdate):
-    """Update product (Admin only - will add role check)"""
+    """Update product (Admin only)"""
     update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
     
     if not update_dict:
         raise HTTPException(status_code=400, detail="No data to update")
     
-    result = await db.products.update_one(
-        {"id": product_id},
-        {"$set": update_dict}
-    )
+    if 'variants' in update_dict:
+        update_dict.update(availability_fields(update_dict['variants']))
     
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Product not found")
+    async with await causal_session() as session:
+        result = await db.products.update_one(
+            {"id": product_id},
+            {"$set": update_dict},
+            session=session
+        )
+        
+        if result.matched_count == 0:
+            raise HTTPException(status_code=404, detail="Product not found")
+        
+        product = await db.products.find_one({"id": product_id}, {"_id": 0}, session=session)
+    
+    await bus.publish(f"product:{product_id}")
     
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
     return product
 
-@router.delete("/{product_id}", dependencies=[Depends(get_current_user)])
+@router.delete("/{product_id}", dependencies=[Depends(require_admin)])
 async def delete_product(product_id: str):
-    """Delete product (Admin only - will add role check)"""
+    """Delete product (Admin only)"""
     result = await db.products.delete_one({"id": product_id})
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    await bus.publish(f"product:{product_id}")
+    
     return {"message": "Product deleted successfully"}
\ No newline at end of file
@@ -1,16 +1,45 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel
 from middleware.auth import get_current_user
+from utils.invalidation import bus
+from utils.cursors import encode_cursor, after_cursor
 import uuid
 from datetime import datetime, timezone
+from typing import Optional
 
 router = APIRouter(prefix="/reviews", tags=["Reviews"])
 
 db = None
+read_db = None
 
-def set_db(database):
-    global db
+def set_db(database, read_database=None):
+    """Writes and read-your-writes go to `database`; stale-tolerant reads to `read_database`"""
+    global db, read_db
     db = database
+    read_db = read_database if read_database is not None else database
+
+REVIEW_PAGE_SIZE = 10
+REVIEW_SORT = [("created_at", -1), ("id", -1)]
+
+async def create_indexes():
+    # Keyset pagination walks this index in order
+    await db.reviews.create_index([("product_id", 1), ("created_at", -1), ("id", -1)])
+    await db.reviews.create_index([("product_id", 1), ("user_id", 1)])
+
+def review_page_query(product_id: str, cursor: Optional[str] = None) -> dict:
+    """Reviews of a product strictly after `cursor` in (created_at, id) descending order"""
+    return {"product_id": product_id, **after_cursor(cursor)}
+
+def review_page(docs: list, limit: int) -> dict:
+    """Shape `limit + 1` fetched reviews into a page with the next cursor"""
+    page = docs[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(docs) > limit else None
+    
+    for review in page:
+        if isinstance(review.get('created_at'), str):
+            review['created_at'] = datetime.fromisoformat(review['created_at'])
+    
+    return {"reviews": page, "next_cursor": next_cursor}
 
 class ReviewCreate(BaseModel):
     product_id: str
@@ -65,19 +94,22 @@ async def create_review(review: ReviewCreate, current_user: dict = Depends(get_c
             }
         }
     )
+    await bus.publish(f"product:{review.product_id}")
     
     return review_doc
 
 @router.get("/product/{product_id}")
-async def get_product_reviews(product_id: str):
-    """Get all reviews for a product"""
-    reviews = await db.reviews.find({"product_id": product_id}, {"_id": 0}).sort("created_at", -1).to_list(100)
-    
-    for review in reviews:
-        if isinstance(review.get('created_at'), str):
-            review['created_at'] = datetime.fromisoformat(review['created_at'])
-    
-    return reviews
+async def get_product_reviews(
+    product_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(REVIEW_PAGE_SIZE, ge=1, le=50)
+):
+    """Get a page of reviews for a product, newest first"""
+    docs = await read_db.reviews.find(
+        review_page_query(product_id, cursor), {"_id": 0}
+    ).sort(REVIEW_SORT).limit(limit + 1).to_list(limit + 1)
+    
+    return review_page(docs, limit)
 
 @router.delete("/{review_id}")
 async def delete_review(review_id: str, current_user: dict = Depends(get_current_user)):
@@ -110,5 +142,6 @@ async def delete_review(review_id: str, current_user: dict = Depends(get_current
             {"id": review['product_id']},
             {"$set": {"ratings": 0, "total_reviews": 0}}
         )
+    await bus.publish(f"product:{review['product_id']}")
     
     return {"message": "Review deleted successfully"}
\ No newline at end of file
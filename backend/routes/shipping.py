@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, Query
+from utils.serviceability import serviceability
+from typing import Optional
+
+router = APIRouter(prefix="/shipping", tags=["Shipping"])
+
+PINCODE_PATTERN = r"^[1-9][0-9]{5}$"
+
+@router.get("/quote")
+async def get_shipping_quote(
+    pincode: str = Query(..., pattern=PINCODE_PATTERN),
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180)
+):
+    """Get serviceability, courier and delivery ETA for a pincode"""
+    quote = serviceability.quote(pincode, latitude, longitude)
+    
+    if quote is None:
+        raise HTTPException(status_code=503, detail="Serviceability data not loaded")
+    
+    return quote
@@ -5,6 +5,7 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 import uuid
+from utils.catalog import availability_fields
 from datetime import datetime, timedelta, timezone
 
 ROOT_DIR = Path(__file__).parent
@@ -173,6 +174,9 @@ async def seed_products():
     ]
     
     await db.products.delete_many({})
+    for product in products:
+        product.update(availability_fields(product['variants']))
+    
     await db.products.insert_many(products)
     print(f"✅ Seeded {len(products)} products")
 
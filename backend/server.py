@@ -5,22 +5,68 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
+from utils.tracing import CommandTracer
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[CommandTracer()])
 db = client[os.environ['DB_NAME']]
 
-from routes import auth, products, orders, coupons, admin, reviews
+from utils.db_routing import routed_db, set_client, max_staleness, FreshAfterWrite
 
+set_client(client)
+# Stale-tolerant read handles; writes and read-your-writes stay on `db` (primary).
+# Catalog reads refill caches, so they stay on the primary for a staleness window after writes.
+catalog_db = FreshAfterWrite(db, routed_db(client, os.environ['DB_NAME'], "catalog"), max_staleness("catalog"))
+analytics_db = routed_db(client, os.environ['DB_NAME'], "analytics")
+
+from utils.invalidation import bus
+
+# Subscribed before the routes' cache-clearing handlers, so refills already read from the primary
+bus.subscribe("catalog", catalog_db.mark_written)
+bus.subscribe("product", catalog_db.mark_written)
+
+from routes import auth, products, orders, coupons, admin, reviews, images, shipping, cart
+from middleware import auth as auth_middleware
+from middleware.compression import CompressionMiddleware
+from middleware.tracing import TracingMiddleware
+from middleware.loop_watchdog import LoopWatchdogMiddleware
+from utils.recommendations import load_recommendations
+from utils import images as image_cache
+from utils import product_import
+from utils.scheduler import scheduler
+from jobs import register_jobs
+from utils.trending import trending
+from utils.catalog_index import catalog_index
+from utils.loop_watchdog import watchdog
+from utils.serviceability import serviceability
+from utils.pricing import pricing
+from utils.counters import counters
+from utils.otp import check_config as check_otp_config
+
+bus.set_db(db)
+bus.subscribe("recommendations", lambda key: load_recommendations(db))
+scheduler.set_db(db)
+trending.set_db(db)
+catalog_index.set_db(db)
+pricing.set_db(db)
+counters.set_db(db)
+bus.subscribe("product", pricing.invalidate_product)
+bus.subscribe("catalog", pricing.invalidate_product)
+bus.subscribe("coupon", pricing.invalidate_coupon)
+bus.subscribe("catalog", catalog_index.on_catalog_event)
+bus.subscribe("product", catalog_index.on_product_event)
+register_jobs(scheduler, db)
+auth_middleware.set_db(db)
 auth.set_db(db)
-products.set_db(db)
+products.set_db(db, catalog_db)
 orders.set_db(db)
 coupons.set_db(db)
-admin.set_db(db)
-reviews.set_db(db)
+admin.set_db(db, analytics_db)
+reviews.set_db(db, catalog_db)
+images.set_db(catalog_db)
 
 app = FastAPI(title="VEXOR API", version="1.0.0")
 
@@ -32,6 +78,9 @@ api_router.include_router(orders.router)
 api_router.include_router(coupons.router)
 api_router.include_router(admin.router)
 api_router.include_router(reviews.router)
+api_router.include_router(images.router)
+api_router.include_router(shipping.router)
+api_router.include_router(cart.router)
 
 @api_router.get("/")
 async def root():
@@ -43,6 +92,10 @@ async def health_check():
 
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(LoopWatchdogMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -57,6 +110,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_db_client():
+    check_otp_config()
+    await products.create_indexes()
+    await orders.create_indexes()
+    await auth_middleware.create_indexes()
+    await auth.create_indexes()
+    await reviews.create_indexes()
+    await load_recommendations(db)
+    await counters.start()
+    await bus.start()
+    image_cache.start()
+    await scheduler.start()
+    await trending.start(products.TRENDING_PROJECTION)
+    await catalog_index.start()
+    await watchdog.start()
+    await serviceability.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await scheduler.stop()
+    await trending.stop()
+    await catalog_index.stop()
+    await serviceability.stop()
+    await watchdog.stop()
+    await bus.stop()
+    await image_cache.stop()
+    await product_import.stop()
+    await counters.stop()
     client.close()
\ No newline at end of file
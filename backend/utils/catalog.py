@@ -0,0 +1,90 @@
+def _in_stock_values(field: str) -> dict:
+    """Aggregation expression: distinct values of a variant field with stock left"""
+    return {
+        "$setUnion": [{
+            "$map": {
+                "input": {
+                    "$filter": {
+                        "input": {"$ifNull": ["$variants", []]},
+                        "as": "v",
+                        "cond": {"$gt": ["$$v.stock", 0]}
+                    }
+                },
+                "as": "v",
+                "in": f"$$v.{field}"
+            }
+        }]
+    }
+
+# Pipeline stage recomputing the denormalized availability arrays from variants
+AVAILABILITY_STAGE = {
+    "$set": {
+        "available_sizes": _in_stock_values("size"),
+        "available_colors": _in_stock_values("color")
+    }
+}
+
+def availability_fields(variants) -> dict:
+    """Denormalized in-stock sizes/colors for a list of variants (dicts or models)"""
+    in_stock = [v if isinstance(v, dict) else v.model_dump() for v in variants or []]
+    in_stock = [v for v in in_stock if v.get('stock', 0) > 0]
+    return {
+        "available_sizes": sorted({v['size'] for v in in_stock}),
+        "available_colors": sorted({v['color'] for v in in_stock})
+    }
+
+def stock_decrement_pipeline(size: str, color: str, quantity: int) -> list:
+    """Update pipeline that sells `quantity` units of one variant in a single write
+
+    Decrements product and variant stock and keeps available_sizes/
+    available_colors in sync with the remaining variant stock. total_sold is
+    a write-combined counter (utils.counters), not part of this write.
+    """
+    return [
+        {
+            "$set": {
+                "stock": {"$subtract": ["$stock", quantity]},
+                "variants": {
+                    "$map": {
+                        "input": {"$ifNull": ["$variants", []]},
+                        "as": "v",
+                        "in": {
+                            "$cond": [
+                                {"$and": [
+                                    {"$eq": ["$$v.size", size]},
+                                    {"$eq": ["$$v.color", color]}
+                                ]},
+                                {"$mergeObjects": ["$$v", {"stock": {"$subtract": ["$$v.stock", quantity]}}]},
+                                "$$v"
+                            ]
+                        }
+                    }
+                }
+            }
+        },
+        AVAILABILITY_STAGE
+    ]
+
+def variant_filter(size=None, color=None, in_stock: bool = False) -> dict:
+    """Query fragment for variant-level filters
+
+    Single size or color filters on in-stock items hit the denormalized
+    available_* arrays; combined filters need $elemMatch so that size, color
+    and stock are matched on the same variant.
+    """
+    if size and color:
+        match = {"size": size, "color": color}
+        if in_stock:
+            match['stock'] = {"$gt": 0}
+        return {"variants": {"$elemMatch": match}}
+
+    if size:
+        return {"available_sizes": size} if in_stock else {"variants.size": size}
+
+    if color:
+        return {"available_colors": color} if in_stock else {"variants.color": color}
+
+    if in_stock:
+        return {"stock": {"$gt": 0}}
+
+    return {}
@@ -0,0 +1,231 @@
+"""In-memory columnar index over the catalog for listing queries
+
+Keeps one NumPy column per sortable/filterable field plus, for every
+(category, sort) pair, the row indices presorted by that sort. A listing
+query is then a lookup of the presorted rows, a price-range cut
+(`searchsorted` for price sorts, a vectorized mask otherwise) and a slice, so
+the page ids and the total count come back without touching Mongo. Only the
+page itself is hydrated from Mongo with an `$in` on the ids.
+
+Queries the index can't answer (size/color/stock filters, facets) return None
+and the caller falls back to Mongo. Single product writes update the snapshot
+incrementally through the invalidation bus: the row's values change in place
+and its position in each presorted list is found with a binary search, so no
+list is re-sorted. Deleted rows stay in the columns unreferenced until the
+periodic full reload, which also picks up counters written without an event
+(total_sold, trending_score) and compacts the snapshot.
+
+Ties in a sort are ordered by row number, both in a full build (stable argsort)
+and when a row is inserted.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("CATALOG_INDEX_ENABLED", "true").lower() == "true"
+RELOAD_INTERVAL_SECONDS = 60
+
+SNAPSHOT_PROJECTION = {
+    "_id": 0, "id": 1, "category": 1, "price": 1, "created_at": 1,
+    "total_sold": 1, "ratings": 1, "trending_score": 1
+}
+
+# sort option -> (column, descending)
+SORTS = {
+    "newest": ("created_at", True),
+    "price_low": ("price", False),
+    "price_high": ("price", True),
+    "popular": ("total_sold", True),
+    "rating": ("ratings", True),
+    "trending": ("trending_score", True)
+}
+NUMERIC_COLUMNS = ["price", "created_at", "total_sold", "ratings", "trending_score"]
+
+def _timestamp(value) -> float:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp() if isinstance(value, datetime) else 0.0
+
+def _row(doc: dict) -> dict:
+    return {
+        "id": doc['id'],
+        "category": doc.get('category') or "",
+        "price": float(doc.get('price') or 0),
+        "created_at": _timestamp(doc.get('created_at')),
+        "total_sold": float(doc.get('total_sold') or 0),
+        "ratings": float(doc.get('ratings') or 0),
+        "trending_score": float(doc.get('trending_score') or 0)
+    }
+
+class CatalogIndex:
+    def __init__(self):
+        self.db = None
+        self.ready = False
+        self._task = None
+        self._lock = asyncio.Lock()
+        self.ids = np.empty(0, dtype=object)
+        self.columns = {}
+        self.codes = np.empty(0, dtype=np.int32)
+        self.categories = {}
+        self._positions = {}
+        self._sorted = {}
+
+    def set_db(self, database):
+        self.db = database
+
+    def _build(self, rows: list):
+        """Build the columns and presorted indices from scratch"""
+        ids = np.array([r['id'] for r in rows], dtype=object)
+        columns = {name: np.array([r[name] for r in rows], dtype=np.float64) for name in NUMERIC_COLUMNS}
+
+        categories = {name: code for code, name in enumerate(sorted({r['category'] for r in rows}))}
+        codes = np.array([categories[r['category']] for r in rows], dtype=np.int32)
+
+        presorted = {}
+        for sort_by, (column, descending) in SORTS.items():
+            values = -columns[column] if descending else columns[column]
+            order = np.argsort(values, kind="stable")
+            presorted[(None, sort_by)] = order
+            order_codes = codes[order]
+            for code in categories.values():
+                presorted[(code, sort_by)] = order[order_codes == code]
+
+        positions = {r['id']: i for i, r in enumerate(rows)}
+        # Swap everything at once so queries never see a half-built snapshot
+        self.ids, self.columns, self.codes, self.categories, self._positions, self._sorted = (
+            ids, columns, codes, categories, positions, presorted
+        )
+
+    def _sort_values(self, sort_by: str):
+        column, descending = SORTS[sort_by]
+        return -self.columns[column] if descending else self.columns[column]
+
+    def _insert(self, order, position: int, values):
+        """`order` with `position` inserted at its sorted place (ties by row number)"""
+        keys = values[order]
+        low = np.searchsorted(keys, values[position], "left")
+        high = np.searchsorted(keys, values[position], "right")
+        at = low + np.searchsorted(order[low:high], position)
+        return np.insert(order, at, position)
+
+    def _apply(self, product_id: str, doc):
+        """Update, add or drop one row in place; runs without awaiting, so queries never see it half-done"""
+        position = self._positions.get(product_id)
+        if position is not None:
+            code = int(self.codes[position])
+            for sort_by in SORTS:
+                for key in ((None, sort_by), (code, sort_by)):
+                    self._sorted[key] = self._sorted[key][self._sorted[key] != position]
+        if doc is None:
+            self._positions.pop(product_id, None)
+            return
+
+        row = _row(doc)
+        if position is None:
+            position = len(self.ids)
+            self.ids = np.append(self.ids, np.array([product_id], dtype=object))
+            self.columns = {name: np.append(values, row[name]) for name, values in self.columns.items()}
+            self.codes = np.append(self.codes, np.int32(0))
+            self._positions[product_id] = position
+        else:
+            for name in NUMERIC_COLUMNS:
+                self.columns[name][position] = row[name]
+
+        code = self.categories.get(row['category'])
+        if code is None:
+            code = len(self.categories)
+            self.categories[row['category']] = code
+            for sort_by in SORTS:
+                self._sorted[(code, sort_by)] = np.empty(0, dtype=np.intp)
+        self.codes[position] = code
+
+        for sort_by in SORTS:
+            values = self._sort_values(sort_by)
+            for key in ((None, sort_by), (code, sort_by)):
+                self._sorted[key] = self._insert(self._sorted[key], position, values)
+
+    async def reload(self):
+        """Full snapshot from Mongo"""
+        # Held across the read too, so an older snapshot can't overwrite a newer refresh
+        async with self._lock:
+            rows = {}
+            async for doc in self.db.products.find({}, SNAPSHOT_PROJECTION):
+                rows[doc['id']] = _row(doc)
+            self._build(list(rows.values()))
+            self.ready = True
+
+    async def refresh_product(self, product_id: str):
+        """Re-read one product after a write (handler for `product:{id}`)"""
+        async with self._lock:
+            doc = await self.db.products.find_one({"id": product_id}, SNAPSHOT_PROJECTION)
+            self._apply(product_id, doc)
+
+    async def on_catalog_event(self, key: str):
+        if self.ready:
+            await self.reload()
+
+    async def on_product_event(self, product_id: str):
+        if self.ready:
+            await self.refresh_product(product_id)
+
+    def query(self, category=None, min_price=None, max_price=None, sort_by="newest",
+              page: int = 1, limit: int = 12):
+        """(page ids, total) for a listing query, or None if it needs Mongo"""
+        if not self.ready or sort_by not in SORTS:
+            return None
+
+        if category is not None:
+            code = self.categories.get(category)
+            if code is None:
+                return [], 0
+        else:
+            code = None
+        rows = self._sorted[(code, sort_by)]
+
+        if min_price is not None or max_price is not None:
+            prices = self.columns['price'][rows]
+            low = -np.inf if min_price is None else min_price
+            high = np.inf if max_price is None else max_price
+            if sort_by == "price_low":
+                rows = rows[np.searchsorted(prices, low, "left"):np.searchsorted(prices, high, "right")]
+            elif sort_by == "price_high":
+                # Descending: search the negated prices, which ascend
+                negated = -prices
+                rows = rows[np.searchsorted(negated, -high, "left"):np.searchsorted(negated, -low, "right")]
+            else:
+                rows = rows[(prices >= low) & (prices <= high)]
+
+        skip = (page - 1) * limit
+        return self.ids[rows[skip:skip + limit]].tolist(), int(len(rows))
+
+    def stats(self) -> dict:
+        return {"ready": self.ready, "products": len(self._positions), "categories": len(self.categories)}
+
+    async def start(self):
+        if not ENABLED:
+            return
+        await self.reload()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(RELOAD_INTERVAL_SECONDS)
+            try:
+                await self.reload()
+            except Exception:
+                logger.exception("Catalog index reload failed")
+
+catalog_index = CatalogIndex()
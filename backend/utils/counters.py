@@ -0,0 +1,231 @@
+"""Write-combining counters with a local journal
+
+Hot statistics (total_sold, trending_score) don't need to hit the
+product document on every event. `incr` adds to an in-memory total and
+appends the increment to this worker's journal file; every FLUSH_INTERVAL
+seconds the totals go out as one unordered `bulk_write` of `$inc`s, one per
+document, and the journal segment that covered them is deleted.
+
+Each worker holds an exclusive lock on its own journal. On startup, journals
+whose lock can be taken belong to workers that died before flushing; they
+are replayed and flushed. Delivery is at-least-once: a segment is deleted
+only after every increment in it was written, and a crash between the write
+and the delete replays that segment once more. A document that keeps
+failing with a write error is moved to `counter_dead_letters` after
+MAX_WRITE_ATTEMPTS flushes instead of being retried forever.
+
+Stock is not a counter here: stock decrements stay synchronous in create_order.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = Path(os.environ.get("COUNTER_JOURNAL_DIR", Path(__file__).parent.parent / ".counters"))
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("COUNTER_FLUSH_SECONDS", "2"))
+MAX_WRITE_ATTEMPTS = 5
+
+class CounterAggregator:
+    def __init__(self, journal_dir: Path = JOURNAL_DIR):
+        self.db = None
+        self.journal_dir = journal_dir
+        self.name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._journal = None
+        self._segment = 0
+        # Sealed segments whose increments are back in `_pending` after a failed flush
+        self._carried = []
+        self._attempts = defaultdict(int)
+        self._task = None
+        self._stopping = asyncio.Event()
+        self._stats = {"increments": 0, "flushes": 0, "documents_written": 0, "replayed": 0, "dead_lettered": 0}
+
+    def set_db(self, database):
+        self.db = database
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.journal_dir / f"counters-{self.name}.{segment}.journal"
+
+    def _open_segment(self):
+        self._segment += 1
+        path = self._segment_path(self._segment)
+        self._journal = open(path, "a", buffering=1)
+        fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def incr(self, collection: str, doc_id: str, field: str, amount: float = 1):
+        """Add `amount` to `field` of the document with `id == doc_id`"""
+        self._pending[(collection, doc_id)][field] += amount
+        self._stats['increments'] += 1
+        if self._journal is not None:
+            self._journal.write(json.dumps([collection, doc_id, field, amount]) + "\n")
+
+    def _seal(self) -> list:
+        """Close the current journal segment and start a new one"""
+        if self._journal is None:
+            return []
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        sealed = (Path(self._journal.name), self._journal)
+        self._open_segment()
+        # The sealed segment stays locked until its increments are in Mongo
+        return [sealed]
+
+    def _restore(self, collection: str, documents):
+        """Put unwritten increments back for the next flush"""
+        for doc_id, fields in documents:
+            for field, amount in fields.items():
+                self._pending[(collection, doc_id)][field] += amount
+
+    async def _dead_letter(self, failed: list) -> bool:
+        """Park increments that keep failing; False if even that write fails"""
+        failed_at = datetime.now(timezone.utc)
+        try:
+            await self.db.counter_dead_letters.insert_many([
+                {"collection": collection, "id": doc_id, "increments": fields, "error": error, "failed_at": failed_at}
+                for collection, doc_id, fields, error in failed
+            ])
+        except Exception:
+            logger.exception("Could not dead-letter %d counter documents; retrying them", len(failed))
+            return False
+        for collection, doc_id, _, error in failed:
+            self._attempts.pop((collection, doc_id), None)
+            logger.error("Dropped counter increments for %s %s after %d attempts: %s",
+                         collection, doc_id, MAX_WRITE_ATTEMPTS, error)
+        self._stats['dead_lettered'] += len(failed)
+        return True
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+        # Every segment holding these increments: the one sealed now and any carried over
+        segments, self._carried = self._carried + self._seal(), []
+
+        by_collection = defaultdict(dict)
+        for (collection, doc_id), fields in pending.items():
+            by_collection[collection][doc_id] = dict(fields)
+
+        collections = list(by_collection.items())
+        failed = []
+        for n, (collection, documents) in enumerate(collections):
+            documents = list(documents.items())
+            try:
+                await self.db[collection].bulk_write(
+                    [UpdateOne({"id": doc_id}, {"$inc": fields}) for doc_id, fields in documents],
+                    ordered=False
+                )
+                errors = {}
+            except BulkWriteError as e:
+                # The rest of this collection's increments were applied
+                errors = {error['index']: error.get('errmsg') for error in e.details.get("writeErrors", [])}
+            except BaseException:
+                # Unknown outcome, or cancelled mid-write: retry everything not confirmed (at-least-once)
+                self._restore(collection, documents)
+                for later, later_documents in collections[n + 1:]:
+                    self._restore(later, later_documents.items())
+                for failed_collection, doc_id, fields, _ in failed:
+                    self._restore(failed_collection, [(doc_id, fields)])
+                self._carried = segments + self._carried
+                raise
+            for index, (doc_id, fields) in enumerate(documents):
+                if index in errors:
+                    failed.append((collection, doc_id, fields, errors[index]))
+                else:
+                    self._attempts.pop((collection, doc_id), None)
+
+        self._stats['flushes'] += 1
+        self._stats['documents_written'] += len(pending) - len(failed)
+
+        retry, give_up = [], []
+        for entry in failed:
+            self._attempts[entry[:2]] += 1
+            (give_up if self._attempts[entry[:2]] >= MAX_WRITE_ATTEMPTS else retry).append(entry)
+        if give_up and not await self._dead_letter(give_up):
+            retry += give_up
+        if retry:
+            for collection, doc_id, fields, _ in retry:
+                self._restore(collection, [(doc_id, fields)])
+            # Their segments still hold the only durable copy of the retried increments
+            self._carried = segments + self._carried
+            logger.warning("%d counter documents failed to update; retrying next interval", len(retry))
+            return
+
+        for path, handle in segments:
+            handle.close()
+            path.unlink(missing_ok=True)
+
+    def _replay_orphans(self):
+        """Load journals left by dead workers into the pending totals"""
+        for path in sorted(self.journal_dir.glob("counters-*.journal")):
+            with open(path, "r+") as handle:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # a live worker's journal
+                for line in handle:
+                    try:
+                        collection, doc_id, field, amount = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from the crash
+                    # Re-journal so the increment survives until our own flush
+                    self.incr(collection, doc_id, field, amount)
+                    self._stats['replayed'] += 1
+                self._journal.flush()
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {**self._stats, "pending_documents": len(self._pending)}
+
+    async def start(self):
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self._stopping.clear()
+        self._open_segment()
+        self._replay_orphans()
+        if self._stats['replayed']:
+            logger.info("Replaying %d journaled counter increments", self._stats['replayed'])
+            await self.flush()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            # Not cancelled: a flush in flight finishes and settles its segments first
+            self._stopping.set()
+            await self._task
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Final counter flush failed; the journal is replayed on next start")
+        if self._journal is not None:
+            self._journal.close()
+            path = Path(self._journal.name)
+            if not self._pending and path.stat().st_size == 0:
+                path.unlink()
+            self._journal = None
+        # Segments still carried are replayed by the next worker to start
+        for _, handle in self._carried:
+            handle.close()
+        self._carried = []
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), FLUSH_INTERVAL_SECONDS)
+                return  # stop() does the final flush
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Counter flush failed; retrying next interval")
+
+counters = CounterAggregator()
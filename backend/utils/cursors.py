@@ -0,0 +1,24 @@
+"""Opaque keyset cursors over (created_at, id) descending"""
+import base64
+from typing import Optional
+from fastapi import HTTPException
+
+def encode_cursor(doc: dict) -> str:
+    return base64.urlsafe_b64encode(f"{doc['created_at']}|{doc['id']}".encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, doc_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, doc_id
+
+def after_cursor(cursor: Optional[str]) -> dict:
+    """Filter for documents strictly after `cursor`; empty without one"""
+    if not cursor:
+        return {}
+    created_at, doc_id = decode_cursor(cursor)
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": doc_id}}
+    ]}
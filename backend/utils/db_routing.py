@@ -0,0 +1,87 @@
+"""Replica-aware database handles
+
+Catalog, review and analytics reads can tolerate slightly stale data, so they
+get handles with a secondary-preferring read preference; everything else stays
+on the primary. On a standalone server read preferences are ignored, and against
+a replica set (e.g. MONGO_URL=mongodb://localhost:27017,localhost:27018,
+localhost:27019/?replicaSet=rs0) listing traffic moves off the primary.
+
+Reads that must observe a write made in the same request run inside a causally
+consistent session (`causal_session`) on the primary handle.
+
+Cached reads are the exception to "slightly stale is fine": a cache refilled
+from a lagging secondary right after an invalidation would keep the old data
+for its whole TTL. `FreshAfterWrite` wraps a routed handle and sends reads to
+the primary until the staleness bound has passed since the last invalidation.
+"""
+import os
+import time
+from pymongo.read_preferences import (
+    Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+)
+
+# MongoDB rejects maxStalenessSeconds below 90
+MIN_MAX_STALENESS_SECONDS = 90
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest
+}
+
+_client = None
+
+def read_preference(name: str, max_staleness: int = -1):
+    mode = READ_PREFERENCES.get(name)
+    if mode is None:
+        raise ValueError(f"Unknown read preference: {name}")
+    if mode is Primary:
+        return Primary()
+    if max_staleness != -1:
+        max_staleness = max(max_staleness, MIN_MAX_STALENESS_SECONDS)
+    return mode(max_staleness=max_staleness)
+
+def max_staleness(role: str) -> int:
+    return int(os.environ.get(f"MONGO_{role.upper()}_MAX_STALENESS_SECONDS", "120"))
+
+def routed_db(client, db_name: str, role: str):
+    """Database handle for a router role, configured by MONGO_<ROLE>_READ_PREFERENCE
+    and MONGO_<ROLE>_MAX_STALENESS_SECONDS"""
+    name = os.environ.get(f"MONGO_{role.upper()}_READ_PREFERENCE", "secondaryPreferred")
+    return client.get_database(db_name, read_preference=read_preference(name, max_staleness(role)))
+
+class FreshAfterWrite:
+    """A routed handle that reads from the primary for a while after each invalidation
+
+    Subscribe `mark_written` to the bus topics whose writes the handle serves.
+    """
+
+    def __init__(self, primary, routed, window: float):
+        self._primary = primary
+        self._routed = routed
+        # An unbounded staleness still gets the default window
+        self._window = window if window > 0 else 120
+        self._fresh_until = 0.0
+
+    def mark_written(self, key=None):
+        self._fresh_until = time.monotonic() + max(self._window, MIN_MAX_STALENESS_SECONDS)
+
+    @property
+    def current(self):
+        return self._primary if time.monotonic() < self._fresh_until else self._routed
+
+    def __getattr__(self, name):
+        return getattr(self.current, name)
+
+    def __getitem__(self, name):
+        return self.current[name]
+
+def set_client(client):
+    global _client
+    _client = client
+
+async def causal_session():
+    """Start a causally consistent session for read-your-writes sequences"""
+    return await _client.start_session(causal_consistency=True)
@@ -0,0 +1,61 @@
+from fastapi import HTTPException
+from typing import Optional
+
+# Named views map to an inclusion list; None means the whole document
+PRODUCT_VIEWS = {
+    "card": [
+        "id", "slug", "name", "category", "price", "discount_price", "images",
+        "variants", "available_sizes", "available_colors", "ratings",
+        "total_reviews", "is_featured"
+    ],
+    "detail": None,
+    "admin": None
+}
+PRODUCT_PRIVATE_FIELDS = ["cost_price"]
+
+ORDER_VIEWS = {
+    "card": [
+        "id", "final_amount", "order_status", "payment_status", "payment_method",
+        "created_at", "products"
+    ],
+    "detail": None
+}
+
+USER_VIEWS = {
+    "card": ["id", "phone", "name", "email", "role", "is_verified", "created_at"],
+    "admin": None
+}
+# Lowercase copies kept for prefix search (utils.user_search) and the
+# archived-orders flag (utils.order_archive)
+USER_PRIVATE_FIELDS = ["name_lc", "email_lc", "has_archived_orders"]
+
+def parse_fields(fields: Optional[str]) -> list:
+    return [f.strip() for f in fields.split(",") if f.strip()] if fields else []
+
+def build_projection(views: dict, view: Optional[str], fields=None,
+                     private_fields=(), include_private: bool = False) -> dict:
+    """Mongo projection for a named view or an explicit field list
+
+    Explicit fields take precedence over the view. Private fields are dropped
+    unless `include_private` is set.
+    """
+    if isinstance(fields, str):
+        fields = parse_fields(fields)
+
+    if fields:
+        selected = [f for f in fields if include_private or f not in private_fields]
+        if not selected:
+            raise HTTPException(status_code=400, detail="No selectable fields requested")
+        return {"_id": 0, **{f: 1 for f in selected}}
+
+    if view not in views:
+        raise HTTPException(status_code=400, detail=f"Unknown view, expected one of: {', '.join(views)}")
+
+    spec = views[view]
+    if spec is None:
+        projection = {"_id": 0}
+        if not include_private:
+            projection.update({f: 0 for f in private_fields})
+        return projection
+
+    return {"_id": 0, **{f: 1 for f in spec if include_private or f not in private_fields}}
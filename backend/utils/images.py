@@ -0,0 +1,214 @@
+"""Product image renditions with a content-addressed, size-bounded disk cache
+
+Originals are downloaded once and stored under `originals/` keyed by the
+SHA-256 of their URL; renditions are keyed by the original's key plus width
+and format. Resizing is CPU-bound, so it runs in a small process pool.
+
+Originals are only fetched over https from IMAGE_SOURCE_HOSTS (redirects
+included) and are capped at MAX_ORIGINAL_BYTES, so a product image URL can't
+make the server request internal addresses or buffer arbitrary downloads.
+"""
+import asyncio
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+import httpx
+from PIL import Image
+
+CACHE_DIR = Path(os.environ.get("IMAGE_CACHE_DIR", Path(__file__).parent.parent / ".image_cache"))
+CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Evict down to this fraction of the limit so eviction doesn't run on every write
+CACHE_LOW_WATER = 0.9
+
+WIDTHS = [200, 400, 600, 800, 1200]
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+QUALITY = 80
+FETCH_TIMEOUT_SECONDS = 15
+MAX_ORIGINAL_BYTES = int(os.environ.get("IMAGE_MAX_ORIGINAL_BYTES", str(20 * 1024 * 1024)))
+MAX_REDIRECTS = 3
+# Hosts originals may be fetched from; a leading dot allows subdomains
+SOURCE_HOSTS = [h.strip().lower() for h in os.environ.get("IMAGE_SOURCE_HOSTS", "images.unsplash.com").split(",") if h.strip()]
+# Public base of this API (same value as the frontend's REACT_APP_BACKEND_URL)
+BACKEND_URL = os.environ.get("BACKEND_URL", "").rstrip("/")
+
+_pool = None
+_http = None
+_inflight = {}
+_cache_bytes = None
+
+class ImageError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def url_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+def snap_width(width) -> int:
+    """Round a requested width up to a supported rendition width"""
+    if not width:
+        return WIDTHS[-1]
+    for w in WIDTHS:
+        if w >= width:
+            return w
+    return WIDTHS[-1]
+
+def srcset(product_id: str, images: list, fmt: str = "webp") -> list:
+    """Responsive srcset strings, one per product image"""
+    sets = []
+    for index, url in enumerate(images):
+        version = url_key(url)[:10]
+        sets.append(", ".join(
+            f"{BACKEND_URL}/api/images/{product_id}/{index}?w={w}&fmt={fmt}&v={version} {w}w" for w in WIDTHS
+        ))
+    return sets
+
+def _resize(src: str, dst: str, width: int, fmt: str):
+    """Runs in a worker process"""
+    from PIL import Image
+
+    with Image.open(src) as img:
+        if img.width > width:
+            img.thumbnail((width, width * img.height // img.width), Image.LANCZOS)
+        if fmt == "jpeg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        tmp = f"{dst}.{os.getpid()}.tmp"
+        img.save(tmp, format=fmt.upper(), quality=QUALITY)
+    os.replace(tmp, dst)
+
+def _path(kind: str, key: str, suffix: str = "") -> Path:
+    return CACHE_DIR / kind / key[:2] / f"{key}{suffix}"
+
+def _scan_cache_bytes() -> int:
+    return sum(f.stat().st_size for f in CACHE_DIR.rglob("*") if f.is_file())
+
+def _evict():
+    """Remove least recently used files until the cache is under the low-water mark"""
+    global _cache_bytes
+    files = sorted(
+        (f for f in CACHE_DIR.rglob("*") if f.is_file()),
+        key=lambda f: f.stat().st_mtime
+    )
+    total = sum(f.stat().st_size for f in files)
+    target = CACHE_MAX_BYTES * CACHE_LOW_WATER
+    for f in files:
+        if total <= target:
+            break
+        size = f.stat().st_size
+        f.unlink(missing_ok=True)
+        total -= size
+    _cache_bytes = total
+
+async def _account(path: Path):
+    global _cache_bytes
+    loop = asyncio.get_running_loop()
+    if _cache_bytes is None:
+        _cache_bytes = await loop.run_in_executor(None, _scan_cache_bytes)
+    else:
+        _cache_bytes += path.stat().st_size
+    if _cache_bytes > CACHE_MAX_BYTES:
+        await loop.run_in_executor(None, _evict)
+
+async def _once(key: str, factory):
+    """Coalesce concurrent requests that would produce the same file"""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await task
+
+def allowed_source(url: str) -> bool:
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    return parts.scheme == "https" and any(
+        host == allowed or (allowed.startswith(".") and host.endswith(allowed))
+        for allowed in SOURCE_HOSTS
+    )
+
+async def _download(url: str, tmp: Path):
+    """Stream `url` into `tmp`, following only allowed redirects, up to MAX_ORIGINAL_BYTES"""
+    for _ in range(MAX_REDIRECTS + 1):
+        if not allowed_source(url):
+            raise ImageError(400, "Image host is not allowed")
+        async with _http.stream("GET", url) as response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers.get("location", ""))
+                continue
+            response.raise_for_status()
+            if int(response.headers.get("content-length") or 0) > MAX_ORIGINAL_BYTES:
+                raise ImageError(502, "Original image is too large")
+            received = 0
+            with open(tmp, "wb") as f:
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if received > MAX_ORIGINAL_BYTES:
+                        raise ImageError(502, "Original image is too large")
+                    f.write(chunk)
+            return
+    raise ImageError(502, "Too many redirects fetching original image")
+
+async def _fetch_original(url: str) -> Path:
+    if not allowed_source(url):
+        raise ImageError(400, "Image host is not allowed")
+    path = _path("originals", url_key(url))
+    if path.exists():
+        return path
+
+    async def download():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        try:
+            await _download(url, tmp)
+        except httpx.HTTPError:
+            tmp.unlink(missing_ok=True)
+            raise ImageError(502, "Could not fetch original image")
+        except ImageError:
+            tmp.unlink(missing_ok=True)
+            raise
+        os.replace(tmp, path)
+        await _account(path)
+        return path
+
+    return await _once(f"original:{path.name}", download)
+
+async def get_rendition(url: str, width: int, fmt: str) -> Path:
+    """Path of the cached rendition of `url`, creating it on first request"""
+    if fmt not in FORMATS:
+        raise ImageError(400, "Unsupported image format")
+
+    key = url_key(f"{url}|{width}|{fmt}")
+    path = _path("renditions", key, f".{fmt}")
+    if path.exists():
+        # Touch so eviction treats it as recently used
+        os.utime(path)
+        return path
+
+    async def render():
+        original = await _fetch_original(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(_pool, _resize, str(original), str(path), width, fmt)
+        except (OSError, Image.DecompressionBombError):
+            raise ImageError(502, "Original is not a readable image")
+        await _account(path)
+        return path
+
+    return await _once(f"rendition:{key}", render)
+
+def start():
+    global _pool, _http
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    _pool = ProcessPoolExecutor(max_workers=max(1, min(4, (os.cpu_count() or 2) // 2)))
+    # Redirects are followed by _download so each hop is checked against SOURCE_HOSTS
+    _http = httpx.AsyncClient(timeout=FETCH_TIMEOUT_SECONDS, follow_redirects=False)
+
+async def stop():
+    if _http:
+        await _http.aclose()
+    if _pool:
+        _pool.shutdown(wait=False)
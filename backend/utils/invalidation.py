@@ -0,0 +1,207 @@
+"""Cross-worker cache invalidation over a capped Mongo collection
+
+Write routes publish topics such as `product:{id}`, `catalog:*` or
+`coupon:{code}`. Handlers registered for the topic's namespace run immediately
+in the publishing worker; every other worker tails the capped collection and
+runs its own handlers within about `MAX_AWAIT_MS` of the write.
+
+ObjectIds from different processes are not ordered, so the tail never filters
+on `_id`: it reads the capped collection in natural (insertion) order and
+skips events it has already seen. The capped collection holds at most
+CAPPED_MAX_DOCS events, which bounds the seen set as well.
+
+Publishing never fails the write that triggered it: if the event can't be
+inserted, the topic is kept and re-sent every RECONNECT_DELAY_SECONDS until
+the insert succeeds, so other workers pick it up late rather than never.
+"""
+import asyncio
+import inspect
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "cache_invalidations"
+CAPPED_SIZE_BYTES = 4 * 1024 * 1024
+CAPPED_MAX_DOCS = 20000
+MAX_AWAIT_MS = 500
+RECONNECT_DELAY_SECONDS = 1
+MAX_UNSENT_TOPICS = 1000
+
+class InvalidationBus:
+    def __init__(self):
+        self.db = None
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._handlers = defaultdict(list)
+        self._task = None
+        self._seen = OrderedDict()
+        # Topic -> publish time of events that could not be inserted yet, oldest first
+        self._unsent = OrderedDict()
+        self._resend_task = None
+        self._stats = {
+            "published": 0,
+            "publish_errors": 0,
+            "unsent_dropped": 0,
+            "received": 0,
+            "handler_errors": 0,
+            "last_lag_ms": None,
+            "max_lag_ms": 0.0,
+            "total_lag_ms": 0.0
+        }
+
+    def set_db(self, database):
+        self.db = database
+
+    def subscribe(self, namespace: str, handler):
+        """Run `handler(key)` for every topic `namespace:key`; may be sync or async"""
+        self._handlers[namespace].append(handler)
+
+    async def setup(self):
+        try:
+            await self.db.create_collection(
+                COLLECTION, capped=True, size=CAPPED_SIZE_BYTES, max=CAPPED_MAX_DOCS
+            )
+        except CollectionInvalid:
+            pass
+
+    async def publish(self, topic: str):
+        """Invalidate `topic` locally and broadcast it to the other workers"""
+        await self._dispatch(topic)
+        self._stats['published'] += 1
+        published_at = time.time()
+        try:
+            await self._insert(topic, published_at)
+        except Exception:
+            # The caller's write is already committed; deliver the event later instead
+            self._stats['publish_errors'] += 1
+            logger.exception("Could not broadcast cache invalidation %s; resending", topic)
+            self._keep_unsent(topic, published_at)
+
+    async def _insert(self, topic: str, published_at: float):
+        await self.db[COLLECTION].insert_one({
+            "topic": topic,
+            "origin": self.worker_id,
+            "published_at": published_at
+        })
+
+    def _keep_unsent(self, topic: str, published_at: float):
+        # A topic kept twice goes out once, with its first publish time for the lag stats
+        self._unsent.setdefault(topic, published_at)
+        if len(self._unsent) > MAX_UNSENT_TOPICS:
+            dropped, _ = self._unsent.popitem(last=False)
+            self._stats['unsent_dropped'] += 1
+            logger.error("Dropped unsent cache invalidation %s; other workers keep it until expiry", dropped)
+        if self._resend_task is None or self._resend_task.done():
+            self._resend_task = asyncio.create_task(self._resend())
+
+    async def _resend(self):
+        while self._unsent:
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+            await self._send_unsent()
+
+    async def _send_unsent(self):
+        """Insert the kept topics in order; stops at the first failure"""
+        while self._unsent:
+            topic, published_at = next(iter(self._unsent.items()))
+            try:
+                await self._insert(topic, published_at)
+            except Exception as e:
+                logger.warning("Cache invalidation bus still unavailable (%d unsent): %r", len(self._unsent), e)
+                return
+            self._unsent.pop(topic, None)
+
+    async def _dispatch(self, topic: str):
+        namespace, _, key = topic.partition(":")
+        for handler in self._handlers.get(namespace, []):
+            try:
+                result = handler(key)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                self._stats['handler_errors'] += 1
+                logger.exception("Cache invalidation handler failed for %s", topic)
+
+    async def start(self):
+        await self.setup()
+        # Only events published after this worker started are relevant
+        async for event in self.db[COLLECTION].find({}, {"_id": 1}):
+            self._mark_seen(event['_id'])
+        self._task = asyncio.create_task(self._tail())
+
+    async def stop(self):
+        for task in (self._task, self._resend_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._resend_task = None
+        # One last try, so a short outage doesn't lose the events at shutdown
+        await self._send_unsent()
+
+    def _mark_seen(self, event_id) -> bool:
+        """Remember an event id; False if it was already seen"""
+        if event_id in self._seen:
+            return False
+        self._seen[event_id] = None
+        # Anything older has been overwritten in the capped collection
+        if len(self._seen) > CAPPED_MAX_DOCS:
+            self._seen.popitem(last=False)
+        return True
+
+    async def _tail(self):
+        while True:
+            # Natural order from the start; a reconnect replays the collection and skips seen events
+            cursor = self.db[COLLECTION].find(
+                {},
+                cursor_type=CursorType.TAILABLE_AWAIT,
+                max_await_time_ms=MAX_AWAIT_MS
+            )
+            try:
+                while cursor.alive:
+                    async for event in cursor:
+                        if not self._mark_seen(event['_id']):
+                            continue
+                        if event.get('origin') == self.worker_id:
+                            continue
+                        self._record_lag(event.get('published_at'))
+                        await self._dispatch(event['topic'])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Cache invalidation subscriber failed, reconnecting")
+
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    def _record_lag(self, published_at):
+        self._stats['received'] += 1
+        if published_at is None:
+            return
+        lag_ms = max(0.0, (time.time() - published_at) * 1000)
+        self._stats['last_lag_ms'] = round(lag_ms, 2)
+        self._stats['max_lag_ms'] = round(max(self._stats['max_lag_ms'], lag_ms), 2)
+        self._stats['total_lag_ms'] += lag_ms
+
+    def stats(self) -> dict:
+        received = self._stats['received']
+        return {
+            "worker_id": self.worker_id,
+            "running": self._task is not None and not self._task.done(),
+            "published": self._stats['published'],
+            "publish_errors": self._stats['publish_errors'],
+            "unsent": len(self._unsent),
+            "unsent_dropped": self._stats['unsent_dropped'],
+            "received": received,
+            "handler_errors": self._stats['handler_errors'],
+            "last_lag_ms": self._stats['last_lag_ms'],
+            "max_lag_ms": self._stats['max_lag_ms'],
+            "avg_lag_ms": round(self._stats['total_lag_ms'] / received, 2) if received else None
+        }
+
+bus = InvalidationBus()
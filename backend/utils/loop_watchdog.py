@@ -0,0 +1,163 @@
+"""Event loop lag measurement, blocking-callback capture and a blocking-call pool
+
+A heartbeat coroutine sleeps HEARTBEAT_SECONDS at a time and records how late
+it wakes up; that lag goes into a histogram. A watchdog thread checks the
+heartbeat, and when the loop has not come back for BLOCK_THRESHOLD_SECONDS
+it grabs the loop thread's stack and attributes it to the route of the task
+that is running (routes are registered per task by LoopWatchdogMiddleware).
+
+`run_blocking` moves known blocking calls (mock SMS/WhatsApp prints, payment
+helpers, large JSON encodes) to a bounded thread pool with the caller's
+context, so tracing spans still nest.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 0.05
+BLOCK_THRESHOLD_SECONDS = float(os.environ.get("LOOP_BLOCK_THRESHOLD_MS", "100")) / 1000
+LAG_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+MAX_REPORTS = 50
+MAX_STACK_DEPTH = 64
+
+BLOCKING_POOL_SIZE = int(os.environ.get("BLOCKING_POOL_SIZE", "8"))
+# Calls allowed to wait for a pool thread before callers start queuing on the loop
+BLOCKING_QUEUE_LIMIT = BLOCKING_POOL_SIZE * 4
+
+_pool = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+_pool_slots = None
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call in the bounded pool and await its result"""
+    global _pool_slots
+    if _pool_slots is None:
+        _pool_slots = asyncio.Semaphore(BLOCKING_QUEUE_LIMIT)
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    async with _pool_slots:
+        return await asyncio.get_running_loop().run_in_executor(_pool, call)
+
+class LoopWatchdog:
+    def __init__(self):
+        self.loop = None
+        self.loop_thread = None
+        self.tasks = {}
+        self.buckets = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.lag_sum_ms = 0.0
+        self.lag_max_ms = 0.0
+        self.beats = 0
+        self.reports = deque(maxlen=MAX_REPORTS)
+        self._last_beat = 0.0
+        self._captured_beat = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def track(self, task, scope):
+        self.tasks[task] = scope
+
+    def untrack(self, task):
+        self.tasks.pop(task, None)
+
+    def _route(self) -> str:
+        try:
+            task = asyncio.current_task(self.loop)
+        except RuntimeError:
+            task = None
+        scope = self.tasks.get(task)
+        if scope is None:
+            return None
+        route = scope.get("route")
+        return f"{scope['method']} {getattr(route, 'path', None) or scope['path']}"
+
+    def _record_lag(self, lag_ms: float):
+        index = next((i for i, bound in enumerate(LAG_BUCKETS_MS) if lag_ms <= bound), len(LAG_BUCKETS_MS))
+        self.buckets[index] += 1
+        self.lag_sum_ms += lag_ms
+        self.lag_max_ms = max(self.lag_max_ms, lag_ms)
+        self.beats += 1
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.perf_counter() + HEARTBEAT_SECONDS
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            now = time.perf_counter()
+            lag_ms = max(0.0, now - expected) * 1000
+            if self._captured_beat is not None and self._captured_beat == self._last_beat and self.reports:
+                # The stall captured mid-way is over; record its full length
+                self.reports[-1]['blocked_ms'] = round(lag_ms, 1)
+            self._last_beat = now
+            self._record_lag(lag_ms)
+
+    def _watch(self):
+        while not self._stop.wait(BLOCK_THRESHOLD_SECONDS / 2):
+            beat = self._last_beat
+            blocked = time.perf_counter() - beat - HEARTBEAT_SECONDS
+            if blocked < BLOCK_THRESHOLD_SECONDS or self._captured_beat == beat:
+                continue
+            # One report per stall: the same heartbeat is never captured twice
+            self._captured_beat = beat
+            frame = sys._current_frames().get(self.loop_thread)
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{code.co_filename}:{frame.f_lineno} in {code.co_name}")
+                frame = frame.f_back
+            del frame
+            report = {
+                "at": time.time(),
+                "blocked_ms": round(blocked * 1000, 1),
+                "route": self._route(),
+                "stack": list(reversed(stack))
+            }
+            self.reports.append(report)
+            logger.warning(
+                "Event loop blocked for over %.0fms in %s at %s",
+                report['blocked_ms'], report['route'] or "background task", stack[0] if stack else "?"
+            )
+
+    def stats(self) -> dict:
+        histogram = [
+            {"le_ms": bound, "count": count}
+            for bound, count in zip(LAG_BUCKETS_MS + ["+Inf"], self.buckets)
+        ]
+        return {
+            "heartbeats": self.beats,
+            "lag_avg_ms": round(self.lag_sum_ms / self.beats, 3) if self.beats else 0.0,
+            "lag_max_ms": round(self.lag_max_ms, 1),
+            "lag_histogram": histogram,
+            "block_threshold_ms": BLOCK_THRESHOLD_SECONDS * 1000,
+            "slow_callbacks": list(self.reports),
+            "blocking_pool_size": BLOCKING_POOL_SIZE
+        }
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        _pool.shutdown(wait=False)
+
+watchdog = LoopWatchdog()
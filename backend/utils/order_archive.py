@@ -0,0 +1,118 @@
+"""Hot/cold order tiering
+
+Orders in a terminal status and older than ORDER_ARCHIVE_AFTER_DAYS move from
+`orders` to `orders_archive` so the hot collection and its indexes only hold
+recent and in-flight orders. Each batch is copied with upserts keyed by order
+id and then deleted from `orders` only if unchanged since the copy; copies of
+orders that stayed hot are removed again. While a batch is in flight its ids
+sit in `order_archive_pending`, so an order can only be in both collections
+when it has a pending marker, and a run cut short is cleaned up by the next.
+
+Reads that may need old orders look in `orders` first and fall through to the
+archive only when the hot collection can't answer on its own. Users are
+flagged `has_archived_orders` before any of their orders is copied, so a
+user's order list only reads the archive for users who have archived orders.
+Merged reads skip archive copies of orders that are still hot.
+"""
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pymongo import DeleteOne, ReplaceOne
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ORDER_ARCHIVE_AFTER_DAYS", "180"))
+TERMINAL_STATUSES = ["delivered", "cancelled"]
+BATCH_SIZE = 500
+MAX_BATCHES_PER_RUN = 200
+
+async def create_indexes(db):
+    await db.orders_archive.create_index("id", unique=True)
+    await db.orders_archive.create_index([("user_id", 1), ("created_at", -1)])
+    # Flag users archived before the flag existed
+    user_ids = await db.orders_archive.distinct("user_id")
+    if user_ids:
+        await db.users.update_many(
+            {"id": {"$in": user_ids}, "has_archived_orders": {"$ne": True}},
+            {"$set": {"has_archived_orders": True}}
+        )
+
+async def duplicated_ids(db) -> list:
+    """Ids of orders currently both hot and archived (only possible while pending)"""
+    pending = await db.order_archive_pending.distinct("_id")
+    if not pending:
+        return []
+    return await db.orders.distinct("id", {"id": {"$in": pending}})
+
+async def _settle(db, ids: list):
+    """Drop archive copies of `ids` that are still hot, then clear their markers"""
+    still_hot = await db.orders.distinct("id", {"id": {"$in": ids}})
+    if still_hot:
+        await db.orders_archive.delete_many({"id": {"$in": still_hot}})
+    await db.order_archive_pending.delete_many({"_id": {"$in": ids}})
+
+async def archive_orders(db, older_than_days: int = ARCHIVE_AFTER_DAYS) -> dict:
+    """Move old terminal orders to `orders_archive` in batches"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).isoformat()
+    query = {"order_status": {"$in": TERMINAL_STATUSES}, "created_at": {"$lt": cutoff}}
+    archived = 0
+
+    # Batches left half-done by an interrupted run
+    leftover = await db.order_archive_pending.distinct("_id")
+    if leftover:
+        await _settle(db, leftover)
+
+    for _ in range(MAX_BATCHES_PER_RUN):
+        batch = await db.orders.find(query).sort("created_at", 1).limit(BATCH_SIZE).to_list(BATCH_SIZE)
+        if not batch:
+            break
+
+        ids = [order['id'] for order in batch]
+        # Before the copy, so an order list never misses an archived order
+        await db.users.update_many(
+            {"id": {"$in": list({order['user_id'] for order in batch})}, "has_archived_orders": {"$ne": True}},
+            {"$set": {"has_archived_orders": True}}
+        )
+        await db.order_archive_pending.bulk_write(
+            [ReplaceOne({"_id": order_id}, {"_id": order_id}, upsert=True) for order_id in ids],
+            ordered=False
+        )
+        await db.orders_archive.bulk_write(
+            [ReplaceOne({"id": order['id']}, order, upsert=True) for order in batch],
+            ordered=False
+        )
+        # An order updated after the copy stays hot (and loses its archive copy)
+        result = await db.orders.bulk_write(
+            [DeleteOne({"_id": order['_id'], "updated_at": order.get('updated_at')}) for order in batch],
+            ordered=False
+        )
+        await _settle(db, ids)
+        archived += result.deleted_count
+        if result.deleted_count == 0:
+            break
+
+    logger.info("Archived %d orders older than %s", archived, cutoff)
+    return {"archived": archived, "cutoff": cutoff}
+
+async def find_order(db, order_id: str, projection: dict = None):
+    """An order by id from the hot collection, else from the archive"""
+    projection = projection or {"_id": 0}
+    order = await db.orders.find_one({"id": order_id}, projection)
+    if order is None:
+        order = await db.orders_archive.find_one({"id": order_id}, projection)
+    return order
+
+async def find_user_orders(db, user_id: str, projection: dict, limit: int = 100) -> list:
+    """A user's newest orders, reading the archive only if the hot page is short and the user has archived orders"""
+    orders = await db.orders.find({"user_id": user_id}, projection).sort("created_at", -1).to_list(limit)
+    if len(orders) < limit and await db.users.find_one(
+        {"id": user_id, "has_archived_orders": True}, {"_id": 1}
+    ):
+        # Every hot order of the user is on this page; skip archive copies of them
+        hot_ids = await db.orders.distinct("id", {"user_id": user_id})
+        archived = await db.orders_archive.find(
+            {"user_id": user_id, "id": {"$nin": hot_ids}}, projection
+        ).sort("created_at", -1).to_list(limit - len(orders))
+        if archived:
+            orders = sorted(orders + archived, key=lambda o: o.get('created_at') or "", reverse=True)
+    return orders
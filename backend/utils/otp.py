@@ -0,0 +1,175 @@
+"""OTP issue/verify backed by a TTL-indexed Mongo collection
+
+Codes are stored as HMAC digests in `otp_codes` (one document per phone, expired
+by a TTL index). A sharded in-memory cache in front of it tracks resend cooldowns
+and failed attempts so that abusive or locked-out phones are rejected without a
+database round-trip. Verification is a single atomic find_one_and_delete.
+
+Codes are delivered through the SMS gateway at SMS_GATEWAY_URL. MOCK_OTP=true
+(development only) fixes the code to 123456 and prints it instead. With
+neither, startup logs an error and logins fail with 503 until one is set.
+"""
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import httpx
+from utils.auth import SECRET_KEY
+from utils.loop_watchdog import run_blocking
+
+logger = logging.getLogger(__name__)
+
+OTP_LENGTH = 6
+OTP_TTL_SECONDS = 300
+RESEND_COOLDOWN_SECONDS = int(os.environ.get("OTP_RESEND_COOLDOWN_SECONDS", "30"))
+MAX_ATTEMPTS = 5
+MOCK_OTP = os.environ.get("MOCK_OTP", "false").lower() == "true"
+# Receives {"phone", "message"} as JSON, with SMS_GATEWAY_TOKEN as a bearer token
+SMS_GATEWAY_URL = os.environ.get("SMS_GATEWAY_URL")
+SMS_GATEWAY_TOKEN = os.environ.get("SMS_GATEWAY_TOKEN")
+SMS_TIMEOUT_SECONDS = 10
+
+CACHE_SHARDS = 16
+CACHE_SHARD_SIZE = 4096
+
+class OTPError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class _ShardedCache:
+    """Per-phone state split across bounded LRU shards"""
+
+    def __init__(self, shards: int = CACHE_SHARDS, shard_size: int = CACHE_SHARD_SIZE):
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._shard_size = shard_size
+
+    def _shard(self, key: str) -> OrderedDict:
+        return self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+
+    def get(self, key: str) -> dict:
+        shard = self._shard(key)
+        entry = shard.get(key)
+        if entry is not None:
+            shard.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: dict):
+        shard = self._shard(key)
+        shard[key] = entry
+        shard.move_to_end(key)
+        if len(shard) > self._shard_size:
+            shard.popitem(last=False)
+
+    def pop(self, key: str):
+        self._shard(key).pop(key, None)
+
+def hash_otp(phone: str, otp: str) -> str:
+    return hmac.new(SECRET_KEY.encode(), f"{phone}:{otp}".encode(), hashlib.sha256).hexdigest()
+
+def generate_code() -> str:
+    if MOCK_OTP:
+        return "123456"
+    return "".join(secrets.choice("0123456789") for _ in range(OTP_LENGTH))
+
+def delivery_configured() -> bool:
+    return MOCK_OTP or bool(SMS_GATEWAY_URL)
+
+def check_config() -> bool:
+    """Startup check; without an SMS provider the rest of the API still serves"""
+    if delivery_configured():
+        return True
+    logger.error("No SMS provider configured: set SMS_GATEWAY_URL (or MOCK_OTP=true in development). "
+                 "OTP logins fail with 503 until then.")
+    return False
+
+class OTPStore:
+    def __init__(self, db):
+        self.db = db
+        self.cache = _ShardedCache()
+
+    async def create_indexes(self):
+        await self.db.otp_codes.create_index("expires_at", expireAfterSeconds=0)
+
+    async def issue(self, phone: str) -> str:
+        """Create and store a new code for `phone`, enforcing the resend cooldown"""
+        if not delivery_configured():
+            raise OTPError(503, "OTP login is not available right now")
+        now = time.time()
+        entry = self.cache.get(phone)
+        if entry and now - entry['sent_at'] < RESEND_COOLDOWN_SECONDS:
+            raise OTPError(429, "Please wait before requesting another OTP")
+
+        code = generate_code()
+        sent_at = datetime.now(timezone.utc)
+        try:
+            # Matches only when the last code is outside the cooldown; otherwise the
+            # upsert collides with the existing _id and the request is rejected
+            await self.db.otp_codes.update_one(
+                {"_id": phone, "sent_at": {"$lt": sent_at - timedelta(seconds=RESEND_COOLDOWN_SECONDS)}},
+                {"$set": {
+                    "code_hash": hash_otp(phone, code),
+                    "attempts": 0,
+                    "sent_at": sent_at,
+                    "expires_at": sent_at + timedelta(seconds=OTP_TTL_SECONDS)
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            raise OTPError(429, "Please wait before requesting another OTP")
+
+        self.cache.set(phone, {"sent_at": now, "attempts": 0})
+        return code
+
+    async def send(self, phone: str, code: str):
+        """Deliver an issued code; on failure the code is dropped so the user can retry at once"""
+        if MOCK_OTP:
+            await run_blocking(print, f"[MOCK SMS] Sending OTP {code} to {phone}")
+            return
+
+        message = f"Your VEXOR verification code is {code}. It expires in {OTP_TTL_SECONDS // 60} minutes."
+        headers = {"Authorization": f"Bearer {SMS_GATEWAY_TOKEN}"} if SMS_GATEWAY_TOKEN else {}
+        try:
+            async with httpx.AsyncClient(timeout=SMS_TIMEOUT_SECONDS) as client:
+                response = await client.post(SMS_GATEWAY_URL, json={"phone": phone, "message": message}, headers=headers)
+                response.raise_for_status()
+        except httpx.HTTPError:
+            await self.db.otp_codes.delete_one({"_id": phone})
+            self.cache.pop(phone)
+            raise OTPError(502, "Could not send OTP, please try again")
+
+    async def verify(self, phone: str, otp: str) -> bool:
+        """Consume the code for `phone` if it matches; counts failed attempts"""
+        entry = self.cache.get(phone)
+        if entry and entry['attempts'] >= MAX_ATTEMPTS and time.time() - entry['sent_at'] < OTP_TTL_SECONDS:
+            raise OTPError(429, "Too many attempts, request a new OTP")
+
+        consumed = await self.db.otp_codes.find_one_and_delete({
+            "_id": phone,
+            "code_hash": hash_otp(phone, otp),
+            "attempts": {"$lt": MAX_ATTEMPTS},
+            "expires_at": {"$gt": datetime.now(timezone.utc)}
+        }, projection={"_id": 1})
+
+        if consumed:
+            self.cache.pop(phone)
+            return True
+
+        doc = await self.db.otp_codes.find_one_and_update(
+            {"_id": phone},
+            {"$inc": {"attempts": 1}},
+            projection={"attempts": 1, "sent_at": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc:
+            sent_at = doc['sent_at'].replace(tzinfo=timezone.utc).timestamp()
+            self.cache.set(phone, {"sent_at": sent_at, "attempts": doc['attempts']})
+        return False
@@ -0,0 +1,55 @@
+import hashlib
+import json
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+from middleware.compression import brotli, choose_encoding, compress
+from utils.cache import TTLCache
+from utils.loop_watchdog import run_blocking
+
+class PrecompressedCache:
+    """JSON responses encoded and compressed once, served per Accept-Encoding
+
+    Each entry keeps the identity body plus gzip/brotli variants and a weak ETag,
+    so hot catalog responses cost no serialization or compression per request.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300, max_age: int = 60):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.max_age = max_age
+
+    def clear(self):
+        self._entries.clear()
+
+    def _build(self, payload) -> dict:
+        body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode()
+        entry = {
+            "etag": f'W/"{hashlib.sha1(body).hexdigest()}"',
+            None: body,
+            "gzip": compress(body, "gzip")
+        }
+        if brotli is not None:
+            entry["br"] = compress(body, "br")
+        return entry
+
+    async def respond(self, request: Request, key, producer) -> Response:
+        entry = self._entries.get(key)
+        if entry is None:
+            # Encoding and compressing a large listing is CPU work; keep it off the loop
+            entry = await run_blocking(self._build, await producer())
+            self._entries.set(key, entry)
+
+        headers = {
+            "ETag": entry["etag"],
+            "Vary": "Accept-Encoding",
+            "Cache-Control": f"public, max-age={self.max_age}"
+        }
+
+        if request.headers.get("if-none-match") == entry["etag"]:
+            return Response(status_code=304, headers=headers)
+
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+        if encoding:
+            headers["Content-Encoding"] = encoding
+
+        return Response(entry[encoding], media_type="application/json", headers=headers)
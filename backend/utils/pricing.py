@@ -0,0 +1,150 @@
+"""Server-side cart pricing
+
+Carts are repriced from a cached price table (name, image, price,
+discount_price and the variant list per product) instead of trusting client
+totals. Products missing from the cache are fetched with one `$in` per quote,
+so pricing a cart costs at most one round-trip however many lines it has.
+Coupons are cached too. Both caches are invalidated over the bus, and the
+coupon's usage limit is enforced atomically when an order redeems it, and
+the use is given back if the order then fails before it is stored.
+"""
+import logging
+from datetime import datetime, timezone
+from pymongo.errors import PyMongoError
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+PRICE_PROJECTION = {
+    "_id": 0, "id": 1, "name": 1, "images": 1, "price": 1, "discount_price": 1,
+    "variants.size": 1, "variants.color": 1
+}
+
+class PricingError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class PricingEngine:
+    def __init__(self):
+        self.db = None
+        self._prices = TTLCache(maxsize=10000, ttl=300)
+        self._coupons = TTLCache(maxsize=1000, ttl=60)
+
+    def set_db(self, database):
+        self.db = database
+
+    def invalidate_product(self, product_id: str):
+        if product_id == "*":
+            self._prices.clear()
+        else:
+            self._prices.pop(product_id)
+
+    def invalidate_coupon(self, code: str):
+        if code == "*":
+            self._coupons.clear()
+        else:
+            self._coupons.pop(code)
+
+    async def _price_entries(self, product_ids: set) -> dict:
+        entries, missing = {}, []
+        for product_id in product_ids:
+            entry = self._prices.get(product_id)
+            if entry is None:
+                missing.append(product_id)
+            else:
+                entries[product_id] = entry
+
+        if missing:
+            async for product in self.db.products.find({"id": {"$in": missing}}, PRICE_PROJECTION):
+                entry = {
+                    "name": product['name'],
+                    "image": (product.get('images') or [""])[0],
+                    "unit_price": product.get('discount_price') or product['price'],
+                    "variants": {(v['size'], v['color']) for v in product.get('variants', [])}
+                }
+                self._prices.set(product['id'], entry)
+                entries[product['id']] = entry
+
+        return entries
+
+    async def _coupon(self, code: str) -> dict:
+        coupon = self._coupons.get(code)
+        if coupon is None:
+            coupon = await self.db.coupons.find_one({"code": code, "is_active": True}, {"_id": 0})
+            if not coupon:
+                raise PricingError(400, "Invalid coupon code")
+            if isinstance(coupon.get('expiry_date'), str):
+                coupon['expiry_date'] = datetime.fromisoformat(coupon['expiry_date'])
+            self._coupons.set(code, coupon)
+
+        if coupon['expiry_date'] < datetime.now(timezone.utc):
+            raise PricingError(400, "Coupon expired")
+        if coupon['used_count'] >= coupon['usage_limit']:
+            raise PricingError(400, "Coupon usage limit reached")
+        return coupon
+
+    async def quote(self, items: list, coupon_code: str = None) -> dict:
+        """Itemized quote for cart lines (product_id, variant_size, variant_color, quantity)"""
+        if not items:
+            raise PricingError(400, "Cart is empty")
+
+        entries = await self._price_entries({item.product_id for item in items})
+
+        lines = []
+        for item in items:
+            if item.quantity < 1:
+                raise PricingError(400, "Quantity must be at least 1")
+            entry = entries.get(item.product_id)
+            if entry is None:
+                raise PricingError(400, f"Product {item.product_id} is no longer available")
+            if (item.variant_size, item.variant_color) not in entry['variants']:
+                raise PricingError(400, f"{entry['name']} is not available in {item.variant_size} / {item.variant_color}")
+            lines.append({
+                "product_id": item.product_id,
+                "product_name": entry['name'],
+                "product_image": entry['image'],
+                "variant_size": item.variant_size,
+                "variant_color": item.variant_color,
+                "quantity": item.quantity,
+                "price": entry['unit_price'],
+                "line_total": round(entry['unit_price'] * item.quantity, 2)
+            })
+
+        subtotal = round(sum(line['line_total'] for line in lines), 2)
+        discount_amount = 0.0
+        coupon = None
+        if coupon_code:
+            coupon = await self._coupon(coupon_code)
+            discount_amount = round(subtotal * coupon['discount_percentage'] / 100, 2)
+
+        return {
+            "items": lines,
+            "subtotal": subtotal,
+            "coupon_code": coupon['code'] if coupon else None,
+            "discount_percentage": coupon['discount_percentage'] if coupon else 0,
+            "discount_amount": discount_amount,
+            "total": round(subtotal - discount_amount, 2)
+        }
+
+    async def redeem_coupon(self, code: str, session=None):
+        """Count one use of a coupon, failing if its limit was reached meanwhile"""
+        result = await self.db.coupons.update_one(
+            {"code": code, "is_active": True, "$expr": {"$lt": ["$used_count", "$usage_limit"]}},
+            {"$inc": {"used_count": 1}},
+            session=session
+        )
+        self._coupons.pop(code)
+        if result.modified_count == 0:
+            raise PricingError(400, "Coupon usage limit reached")
+
+    async def release_coupon(self, code: str):
+        """Give back a use counted by redeem_coupon for an order that was never stored"""
+        try:
+            await self.db.coupons.update_one({"code": code, "used_count": {"$gt": 0}}, {"$inc": {"used_count": -1}})
+        except PyMongoError:
+            logger.exception("Could not release a use of coupon %s", code)
+        self._coupons.pop(code)
+
+pricing = PricingEngine()
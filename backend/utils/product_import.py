@@ -0,0 +1,415 @@
+"""Background bulk product import
+
+The request body (CSV or NDJSON) is spooled to a temporary file, and the
+import runs as a background task under a server-generated id whose progress
+is kept in `product_imports`. The file is parsed as a stream, validated against
+`ProductCreate` in a process pool, and upserted with unordered `bulk_write`
+batches. Validation of the next batch overlaps the write of the previous one,
+so throughput is bounded by Mongo rather than by per-product round-trips.
+
+CSV has one row per variant; consecutive rows with the same `slug` (or `name`
+when no slug is given) form one product:
+
+    slug,name,description,category,price,discount_price,cost_price,images,is_featured,size,color,stock,sku
+
+`images` is `|`-separated. NDJSON has one product object per line with the
+`ProductCreate` fields plus an optional `slug`.
+
+Products are keyed by slug. Updates only touch the columns present in the
+file. Rows without a slug are matched to an existing product through any of
+their variant SKUs; otherwise they are inserted under a slug derived from the
+name, and a derived slug that is already taken is a row error, never an update.
+"""
+import asyncio
+import codecs
+import csv
+import json
+import logging
+import os
+import re
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pydantic import ValidationError
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from models.product import ProductCreate
+from utils.catalog import availability_fields
+from utils.loop_watchdog import run_blocking
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+CSV_LIST_SEPARATOR = "|"
+FORMATS = ("csv", "ndjson")
+SPOOL_DIR = os.environ.get("IMPORT_SPOOL_DIR") or None
+READ_CHUNK_BYTES = 256 * 1024
+
+_pool = None
+# Imports running in the background, so they aren't garbage-collected mid-run
+_running = set()
+
+def _slugify(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+def _validate(rows: list) -> list:
+    """Runs in a worker process: (row, raw) pairs -> (row, entry, error) triples
+
+    `entry` holds the full document for an insert, the columns given in the
+    row for an update, and the explicit slug if any.
+    """
+    results = []
+    for row, raw in rows:
+        try:
+            product = ProductCreate.model_validate(raw)
+        except ValidationError as e:
+            error = "; ".join(
+                f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+            results.append((row, None, error))
+            continue
+        doc = product.model_dump()
+        update = product.model_dump(exclude_unset=True)
+        doc.update(availability_fields(product.variants))
+        if "variants" in update:
+            update.update(availability_fields(product.variants))
+            if "stock" not in raw:
+                doc["stock"] = update["stock"] = sum(v.stock for v in product.variants)
+        slug = _slugify(str(raw["slug"])) if raw.get("slug") else None
+        results.append((row, {"doc": doc, "update": update, "slug": slug, "derived": False}, None))
+    return results
+
+def _csv_product(rows: list) -> dict:
+    """Merge the consecutive CSV rows of one product into a raw product dict"""
+    first = rows[0]
+    product = {
+        key: first[key] for key in (
+            "slug", "name", "description", "category", "price",
+            "discount_price", "cost_price", "is_featured"
+        ) if first.get(key) not in (None, "")
+    }
+    # Empty list columns are left out so an update keeps the stored values
+    images = [i.strip() for i in (first.get("images") or "").split(CSV_LIST_SEPARATOR) if i.strip()]
+    if images:
+        product["images"] = images
+    variants = [
+        {"size": r.get("size"), "color": r.get("color"), "stock": r.get("stock") or 0, "sku": r.get("sku")}
+        for r in rows if r.get("sku")
+    ]
+    if variants:
+        product["variants"] = variants
+    return product
+
+async def _lines(stream):
+    """Decoded lines (with line endings) from an async byte stream"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in stream:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line + "\n"
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+async def _csv_records(stream):
+    """(first row number, raw product) pairs from a CSV stream"""
+    header = None
+    group, group_key, group_row, row_no = [], None, None, 1
+    buffered = ""
+    async for line in _lines(stream):
+        # Quoted fields may span lines; wait until the quotes balance
+        buffered += line
+        if buffered.count('"') % 2:
+            continue
+        values = next(csv.reader([buffered]), [])
+        buffered = ""
+        if header is None:
+            header = [h.strip().lower() for h in values]
+            continue
+        row_no += 1
+        if not any(v.strip() for v in values):
+            continue
+        record = dict(zip(header, (v.strip() for v in values)))
+        key = record.get("slug") or record.get("name")
+        if group and key != group_key:
+            yield group_row, _csv_product(group)
+            group = []
+        if not group:
+            group_key, group_row = key, row_no
+        group.append(record)
+    if group:
+        yield group_row, _csv_product(group)
+
+async def _ndjson_records(stream):
+    row_no = 0
+    async for line in _lines(stream):
+        row_no += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            record = e
+        yield row_no, record
+
+class ProductImport:
+    """One import run; progress lives in the `product_imports` collection"""
+
+    def __init__(self, db, import_id: str = None, fmt: str = "csv", dry_run: bool = False, user_id: str = None):
+        self.db = db
+        self.id = import_id or str(uuid.uuid4())
+        self.format = fmt
+        self.dry_run = dry_run
+        self.user_id = user_id
+        self.counts = {"rows": 0, "valid": 0, "inserted": 0, "updated": 0, "failed": 0}
+        self.errors = []
+        # Slugs written by this import so far, to catch name collisions across batches
+        self._slugs = set()
+        self._spool = None
+
+    def _fail(self, row: int, error: str):
+        self.counts["failed"] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": error})
+
+    def summary(self) -> dict:
+        return {
+            "import_id": self.id,
+            "format": self.format,
+            "dry_run": self.dry_run,
+            **self.counts,
+            "errors": self.errors
+        }
+
+    async def _save(self, status: str):
+        await self.db.product_imports.update_one(
+            {"id": self.id},
+            {
+                "$set": {**self.summary(), "status": status, "updated_at": datetime.now(timezone.utc).isoformat()},
+                "$setOnInsert": {"user_id": self.user_id, "created_at": datetime.now(timezone.utc).isoformat()}
+            },
+            upsert=True
+        )
+
+    async def _resolve_slugs(self, entries: list):
+        """Key slug-less rows to the existing product holding one of their SKUs, else derive a slug"""
+        unkeyed = [entry for entry in entries if not entry["slug"]]
+        skus = [v["sku"] for entry in unkeyed for v in entry["doc"]["variants"]]
+        by_sku = {}
+        if skus:
+            async for product in self.db.products.find(
+                {"variants.sku": {"$in": skus}}, {"_id": 0, "slug": 1, "variants.sku": 1}
+            ):
+                for variant in product.get("variants", []):
+                    by_sku[variant["sku"]] = product["slug"]
+        for entry in unkeyed:
+            existing = next((by_sku[v["sku"]] for v in entry["doc"]["variants"] if v["sku"] in by_sku), None)
+            entry["slug"] = existing or _slugify(entry["doc"]["name"])
+            entry["derived"] = existing is None
+
+    async def _write(self, batch: list):
+        """Upsert one validated batch of (row, entry) pairs"""
+        await self._resolve_slugs([entry for _, entry in batch])
+
+        # Later rows for the same explicit slug win within a batch
+        updates, inserts = {}, {}
+        for row, entry in batch:
+            if not entry["derived"]:
+                updates[entry["slug"]] = (row, entry)
+            elif entry["slug"] in inserts or entry["slug"] in self._slugs:
+                self._fail(row, f"Another product in this import is also named '{entry['doc']['name']}'; give each a slug")
+            else:
+                inserts[entry["slug"]] = (row, entry)
+
+        # A derived slug must be new: taken slugs are only updated when given explicitly
+        if inserts:
+            taken = await self.db.products.distinct("slug", {"slug": {"$in": list(inserts)}})
+            for slug in taken:
+                row, _ = inserts.pop(slug)
+                self._fail(row, f"A product with slug '{slug}' already exists; set the slug column to update it")
+        self._slugs.update(updates)
+        self._slugs.update(inserts)
+
+        if self.dry_run:
+            existing = await self.db.products.distinct("slug", {"slug": {"$in": list(updates)}}) if updates else []
+            self.counts["updated"] += len(existing)
+            self.counts["inserted"] += len(updates) - len(existing) + len(inserts)
+            return
+
+        now = datetime.now(timezone.utc).isoformat()
+        new_fields = {"ratings": 0.0, "total_reviews": 0, "total_sold": 0, "created_at": now}
+        writes = [
+            (row, UpdateOne(
+                {"slug": slug},
+                {
+                    "$set": entry["update"],
+                    # Full document for new products, minus what $set already writes
+                    "$setOnInsert": {
+                        **{k: v for k, v in entry["doc"].items() if k not in entry["update"]},
+                        "id": str(uuid.uuid4()),
+                        **new_fields
+                    }
+                },
+                upsert=True
+            ))
+            for slug, (row, entry) in updates.items()
+        ] + [
+            (row, InsertOne({**entry["doc"], "slug": slug, "id": str(uuid.uuid4()), **new_fields}))
+            for slug, (row, entry) in inserts.items()
+        ]
+        if not writes:
+            return
+        try:
+            result = await self.db.products.bulk_write([op for _, op in writes], ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for error in details.get("writeErrors", []):
+                self._fail(writes[error["index"]][0], error.get("errmsg", "Write failed"))
+        self.counts["inserted"] += details.get("nUpserted", 0) + details.get("nInserted", 0)
+        self.counts["updated"] += details.get("nMatched", 0)
+
+    async def receive(self, stream):
+        """Spool the upload to a temporary file so the import can outlive the request"""
+        self._spool = await run_blocking(tempfile.TemporaryFile, dir=SPOOL_DIR)
+        try:
+            async for chunk in stream:
+                await run_blocking(self._spool.write, chunk)
+            await run_blocking(self._spool.seek, 0)
+        except BaseException:
+            self._spool.close()
+            self._spool = None
+            raise
+        await self._save("queued")
+
+    async def _spooled_chunks(self):
+        while chunk := await run_blocking(self._spool.read, READ_CHUNK_BYTES):
+            yield chunk
+
+    def start(self, on_complete=None) -> asyncio.Task:
+        """Run the received upload in the background
+
+        `on_complete(summary)` is awaited after a successful run.
+        """
+        async def run_spooled():
+            try:
+                summary = await self.run(self._spooled_chunks())
+            except Exception:
+                return  # logged and recorded as failed by run()
+            finally:
+                self._spool.close()
+            if on_complete is not None:
+                await on_complete(summary)
+
+        task = asyncio.create_task(run_spooled())
+        _running.add(task)
+        task.add_done_callback(_running.discard)
+        return task
+
+    async def run(self, stream) -> dict:
+        records = _csv_records(stream) if self.format == "csv" else _ndjson_records(stream)
+        await self._save("running")
+
+        loop = asyncio.get_running_loop()
+        write = None
+        chunk = []
+
+        async def flush(rows):
+            nonlocal write
+            results = await loop.run_in_executor(_get_pool(), _validate, rows)
+            valid = []
+            for row, entry, error in results:
+                if error:
+                    self._fail(row, error)
+                else:
+                    valid.append((row, entry))
+            self.counts["valid"] += len(valid)
+            if write is not None:
+                await write
+            write = asyncio.create_task(self._write(valid)) if valid else None
+            await self._save("running")
+
+        try:
+            async for row, record in records:
+                self.counts["rows"] += 1
+                if not isinstance(record, dict):
+                    self._fail(row, f"Invalid JSON: {record}" if isinstance(record, Exception) else "Expected an object")
+                    continue
+                chunk.append((row, record))
+                if len(chunk) >= BATCH_SIZE:
+                    await flush(chunk)
+                    chunk = []
+            if chunk:
+                await flush(chunk)
+            if write is not None:
+                await write
+        except asyncio.CancelledError:
+            if write is not None and not write.done():
+                write.cancel()
+            # Shutdown: the batches written so far stay, the rest of the file is not read
+            await self._save("interrupted")
+            raise
+        except Exception as e:
+            if write is not None and not write.done():
+                write.cancel()
+            logger.exception("Product import %s failed", self.id)
+            self.errors.append({"row": None, "error": repr(e)})
+            await self._save("failed")
+            raise
+
+        await self._save("completed")
+        return self.summary()
+
+async def get_import(db, import_id: str):
+    return await db.product_imports.find_one({"id": import_id}, {"_id": 0})
+
+async def duplicate_slugs(db, limit: int = 20) -> list:
+    """Slugs held by more than one product, most duplicated first"""
+    groups = await db.products.aggregate([
+        {"$group": {"_id": "$slug", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": limit}
+    ]).to_list(limit)
+    return [(group["_id"], group["count"]) for group in groups]
+
+async def create_indexes(db):
+    await db.product_imports.create_index("id", unique=True)
+    await db.products.create_index("variants.sku")
+    # Upserts are keyed by slug; a unique index keeps concurrent imports from duplicating one
+    indexes = await db.products.index_information()
+    if indexes.get("slug_1", {}).get("unique"):
+        return
+    # Building it over existing duplicates would fail startup; report them and keep the plain index
+    duplicates = await duplicate_slugs(db)
+    if duplicates:
+        logger.error(
+            "Not making products.slug unique: %d or more slugs are duplicated (%s). "
+            "Rename them; the unique index is built on the next start.",
+            len(duplicates), ", ".join(f"{slug!r} x{count}" for slug, count in duplicates)
+        )
+        await db.products.create_index("slug")
+        return
+    if "slug_1" in indexes:
+        await db.products.drop_index("slug_1")
+    await db.products.create_index("slug", unique=True)
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max(1, min(4, (os.cpu_count() or 2) // 2)))
+    return _pool
+
+async def stop():
+    global _pool
+    for task in list(_running):
+        task.cancel()
+    if _running:
+        await asyncio.gather(*_running, return_exceptions=True)
+    if _pool:
+        _pool.shutdown(wait=False)
+        _pool = None
@@ -0,0 +1,110 @@
+"""Statistical sampling profiler for the event loop thread
+
+A daemon thread snapshots the target thread's Python stack with
+`sys._current_frames()` at a fixed rate and counts identical stacks. Nothing
+is installed in the profiled thread, so the cost is one stack walk per sample
+under the GIL. The sampler measures its own time and widens the interval to
+keep that cost under MAX_OVERHEAD of wall time.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_SECONDS = 60
+DEFAULT_INTERVAL = 0.005
+MAX_OVERHEAD = 0.02
+MAX_DEPTH = 128
+
+_running = threading.Lock()
+
+class ProfilerBusy(Exception):
+    pass
+
+def _frame_name(code) -> str:
+    filename = code.co_filename
+    # Trim site-packages/stdlib prefixes so frames stay readable
+    for marker in ("site-packages" + os.sep, "lib" + os.sep + "python"):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+def _stack(frame) -> tuple:
+    stack = []
+    while frame is not None and len(stack) < MAX_DEPTH:
+        stack.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+def sample(thread_id: int, seconds: float, interval: float = DEFAULT_INTERVAL) -> dict:
+    """Sample `thread_id` for `seconds` (blocking; run it off the profiled thread)"""
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        seconds = min(seconds, MAX_SECONDS)
+        stacks = Counter()
+        samples = 0
+        overhead = 0.0
+        started = time.perf_counter()
+        deadline = started + seconds
+
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                break
+            stacks[_stack(frame)] += 1
+            samples += 1
+            del frame
+            cost = time.perf_counter() - t0
+            overhead += cost
+            time.sleep(max(interval, cost / MAX_OVERHEAD))
+
+        elapsed = time.perf_counter() - started
+        return {
+            "stacks": stacks,
+            "samples": samples,
+            "seconds": round(elapsed, 3),
+            "overhead": round(overhead / elapsed, 4) if elapsed else 0.0
+        }
+    finally:
+        _running.release()
+
+def collapsed(result: dict) -> str:
+    """Brendan Gregg collapsed-stack text (input for flamegraph.pl / speedscope)"""
+    return "".join(
+        f"{';'.join(stack)} {count}\n" for stack, count in result['stacks'].most_common()
+    )
+
+def speedscope(result: dict, name: str = "event loop") -> dict:
+    """Speedscope 'sampled' profile JSON"""
+    frames, index = [], {}
+    samples, weights = [], []
+    interval = result['seconds'] / result['samples'] if result['samples'] else 0
+    for stack, count in result['stacks'].items():
+        ids = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({"name": frame})
+            ids.append(index[frame])
+        samples.append(ids)
+        weights.append(count * interval)
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": result['seconds'],
+            "samples": samples,
+            "weights": weights
+        }],
+        "name": name,
+        "exporter": "vexor-profiler"
+    }
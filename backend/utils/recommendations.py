@@ -0,0 +1,152 @@
+"""Frequently-bought-together recommendations from order co-occurrence
+
+Orders are streamed in batches into a sparse item-item co-occurrence matrix
+(`co_occurrence` collection, one document per product holding its pair counts).
+Neighbors are scored by lift, P(a, b) / (P(a) * P(b)), and the top-K per product
+are written to the `recommendations` collection and kept in an in-memory map so
+the API can answer without touching Mongo.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pymongo import ReplaceOne
+from utils.order_archive import duplicated_ids
+
+TOP_K = 8
+MIN_SUPPORT = 2
+BATCH_SIZE = 500
+STATE_ID = "co_occurrence"
+
+# product_id -> [{"product_id": ..., "score": ...}], loaded at startup and after each build
+_recommendations = {}
+
+class CoOccurrenceMatrix:
+    def __init__(self):
+        self.order_count = 0
+        self.item_counts = Counter()
+        self.pair_counts = defaultdict(Counter)
+
+    def add_order(self, product_ids) -> set:
+        """Count one order; returns the distinct products it touched"""
+        items = set(product_ids)
+        self.order_count += 1
+        for a in items:
+            self.item_counts[a] += 1
+            for b in items:
+                if a != b:
+                    self.pair_counts[a][b] += 1
+        return items
+
+    def top_neighbors(self, product_id: str, k: int = TOP_K) -> list:
+        count_a = self.item_counts.get(product_id)
+        if not count_a:
+            return []
+
+        scored = []
+        for b, count_ab in self.pair_counts.get(product_id, {}).items():
+            if count_ab < MIN_SUPPORT:
+                continue
+            lift = count_ab * self.order_count / (count_a * self.item_counts[b])
+            scored.append({"product_id": b, "score": round(lift, 4), "support": count_ab})
+
+        scored.sort(key=lambda n: (-n['score'], -n['support']))
+        return scored[:k]
+
+async def _load_matrix(db):
+    matrix = CoOccurrenceMatrix()
+    state = await db.recommendation_state.find_one({"_id": STATE_ID}) or {}
+    matrix.order_count = state.get('order_count', 0)
+
+    async for doc in db.co_occurrence.find({}):
+        matrix.item_counts[doc['_id']] = doc['count']
+        matrix.pair_counts[doc['_id']] = Counter(doc.get('pairs', {}))
+
+    return matrix, state.get('last_order_at')
+
+async def build_recommendations(db, incremental: bool = True) -> dict:
+    """Fold orders into the co-occurrence matrix and refresh top-K neighbors
+
+    With `incremental` only orders newer than the last processed one are read
+    and only the products they touch are rescored; otherwise everything is
+    rebuilt from scratch.
+    """
+    if incremental:
+        matrix, last_order_at = await _load_matrix(db)
+    else:
+        matrix, last_order_at = CoOccurrenceMatrix(), None
+
+    query = {"order_status": {"$ne": "cancelled"}}
+    if last_order_at:
+        query['created_at'] = {"$gt": last_order_at}
+
+    # Archived orders are older than anything already folded in, so only a full
+    # rebuild needs them
+    collections = [db.orders] if incremental else [db.orders_archive, db.orders]
+    # Orders mid-archive are read from the hot collection only
+    duplicates = [] if incremental else await duplicated_ids(db)
+
+    touched = set()
+    orders_read = 0
+    for collection in collections:
+        scoped = {**query, "id": {"$nin": duplicates}} if collection.name == "orders_archive" and duplicates else query
+        cursor = collection.find(
+            scoped, {"_id": 0, "products.product_id": 1, "created_at": 1}
+        ).sort("created_at", 1).batch_size(BATCH_SIZE)
+        async for order in cursor:
+            touched |= matrix.add_order(p['product_id'] for p in order.get('products', []))
+            last_order_at = max(last_order_at or "", order['created_at'])
+            orders_read += 1
+
+    if not incremental:
+        touched = set(matrix.item_counts)
+        await db.co_occurrence.delete_many({})
+        await db.recommendations.delete_many({})
+
+    # Rescore the touched products and their neighbors, whose lift used their counts
+    rescore = set(touched)
+    for product_id in touched:
+        rescore.update(matrix.pair_counts.get(product_id, {}))
+
+    now = datetime.now(timezone.utc).isoformat()
+    touched = list(touched)
+    for i in range(0, len(touched), BATCH_SIZE):
+        await db.co_occurrence.bulk_write([
+            ReplaceOne(
+                {"_id": pid},
+                {"_id": pid, "count": matrix.item_counts[pid], "pairs": dict(matrix.pair_counts[pid])},
+                upsert=True
+            )
+            for pid in touched[i:i + BATCH_SIZE]
+        ], ordered=False)
+
+    rescore = list(rescore)
+    for i in range(0, len(rescore), BATCH_SIZE):
+        ops = []
+        for pid in rescore[i:i + BATCH_SIZE]:
+            neighbors = matrix.top_neighbors(pid)
+            ops.append(ReplaceOne(
+                {"product_id": pid},
+                {"product_id": pid, "neighbors": neighbors, "updated_at": now},
+                upsert=True
+            ))
+            _recommendations[pid] = neighbors
+        await db.recommendations.bulk_write(ops, ordered=False)
+
+    await db.recommendation_state.update_one(
+        {"_id": STATE_ID},
+        {"$set": {"order_count": matrix.order_count, "last_order_at": last_order_at, "updated_at": now}},
+        upsert=True
+    )
+
+    return {"orders_processed": orders_read, "products_rescored": len(rescore)}
+
+async def load_recommendations(db):
+    """Load all precomputed neighbors into the in-memory map"""
+    fresh = {}
+    async for doc in db.recommendations.find({}, {"_id": 0, "product_id": 1, "neighbors": 1}):
+        fresh[doc['product_id']] = doc['neighbors']
+
+    _recommendations.clear()
+    _recommendations.update(fresh)
+
+def get_recommendations(product_id: str) -> list:
+    return _recommendations.get(product_id, [])
@@ -0,0 +1,296 @@
+"""In-process job scheduler with Mongo lease-based leader election
+
+Every worker runs the same scheduler, but a job only runs in the worker that
+wins its lease document in `scheduler_leases`. The lease holds the job's
+`next_run_at`, so a slot that has already run cannot be claimed again by a
+slower worker. Each run is recorded in `job_runs`.
+"""
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+LEASE_MARGIN_SECONDS = 30
+RUN_HISTORY_DAYS = 30
+IDLE_POLL_SECONDS = 60
+
+class SchedulerBusy(Exception):
+    """Every run slot in this worker is taken"""
+
+def _utc(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+class CronSchedule:
+    """Five-field cron expression (minute hour day-of-month month day-of-week)"""
+
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Invalid cron expression: {expression}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(part, low, high) for part, (low, high) in zip(parts, self.RANGES)
+        )
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> set:
+        values = set()
+        for item in field.split(","):
+            spec, _, step = item.partition("/")
+            step = int(step) if step else 1
+            if spec == "*":
+                start, end = low, high
+            elif "-" in spec:
+                start, end = (int(v) for v in spec.split("-"))
+            else:
+                start = end = int(spec)
+                if step > 1:
+                    end = high
+            if start < low or end > high:
+                raise ValueError(f"Cron field out of range: {item}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def next_after(self, dt: datetime) -> datetime:
+        candidate = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif candidate.day not in self.days or (candidate.weekday() + 1) % 7 not in self.weekdays:
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression never fires: {self.expression}")
+
+class Job:
+    def __init__(self, name: str, func, interval: float = None, cron: str = None,
+                 timeout: float = 300, jitter: float = 0):
+        if (interval is None) == (cron is None):
+            raise ValueError("A job needs exactly one of interval or cron")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cron = CronSchedule(cron) if cron else None
+        self.timeout = timeout
+        self.jitter = jitter
+        self.running = False
+
+    def next_after(self, dt: datetime) -> datetime:
+        if self.cron:
+            return self.cron.next_after(dt)
+        return dt + timedelta(seconds=self.interval)
+
+class Scheduler:
+    def __init__(self, max_concurrent: int = 2):
+        self.db = None
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.jobs = {}
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._tasks = []
+        self._manual = set()
+
+    def set_db(self, database):
+        self.db = database
+
+    def add_job(self, name: str, func, **options):
+        """Register `func` (an async callable) under `name`; see Job for options"""
+        self.jobs[name] = Job(name, func, **options)
+
+    async def create_indexes(self):
+        await self.db.job_runs.create_index([("job", 1), ("started_at", -1)])
+        await self.db.job_runs.create_index("started_at", expireAfterSeconds=RUN_HISTORY_DAYS * 86400)
+
+    async def start(self):
+        await self.create_indexes()
+        self._tasks = [asyncio.create_task(self._loop(job)) for job in self.jobs.values()]
+
+    async def stop(self):
+        tasks = self._tasks + list(self._manual)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _acquire(self, job: Job, due_only: bool):
+        """Claim the job's lease; returns the lease document or None
+
+        A live lease is never re-acquired, not even by the worker holding it.
+        """
+        now = datetime.now(timezone.utc)
+        query = {"_id": job.name, "expires_at": {"$lt": now}}
+        if due_only:
+            query["next_run_at"] = {"$lte": now}
+        try:
+            return await self.db.scheduler_leases.find_one_and_update(
+                query,
+                {"$set": {
+                    "owner": self.worker_id,
+                    "expires_at": now + timedelta(seconds=job.timeout + LEASE_MARGIN_SECONDS)
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Lease held elsewhere or the slot is not due yet
+            return None
+
+    async def _release(self, job: Job, next_run_at: datetime):
+        await self.db.scheduler_leases.update_one(
+            {"_id": job.name, "owner": self.worker_id},
+            {"$set": {"expires_at": datetime.now(timezone.utc), "next_run_at": next_run_at}}
+        )
+
+    async def _next_due(self, job: Job) -> datetime:
+        # A new job's first slot is its next one, not "now": deploys don't fire every job
+        now = datetime.now(timezone.utc)
+        try:
+            lease = await self.db.scheduler_leases.find_one_and_update(
+                {"_id": job.name},
+                {"$setOnInsert": {"next_run_at": job.next_after(now), "expires_at": now}},
+                projection={"next_run_at": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another worker seeded it at the same moment
+            lease = await self.db.scheduler_leases.find_one({"_id": job.name}, {"next_run_at": 1})
+        if lease and lease.get('next_run_at'):
+            return _utc(lease['next_run_at'])
+        return datetime.now(timezone.utc)
+
+    async def _loop(self, job: Job):
+        while True:
+            try:
+                due = await self._next_due(job)
+                delay = (due - datetime.now(timezone.utc)).total_seconds()
+                # At least a second between attempts while another worker holds the lease;
+                # jitter spreads the lease race and the job's database load
+                await asyncio.sleep(min(max(delay, 1), IDLE_POLL_SECONDS) + random.uniform(0, job.jitter))
+                if due <= datetime.now(timezone.utc):
+                    await self._run(job, trigger="schedule")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Scheduler loop failed for job %s", job.name)
+                await asyncio.sleep(IDLE_POLL_SECONDS)
+
+    async def _claim(self, job: Job, due_only: bool) -> bool:
+        """Mark the job running here and take its lease; False if either is taken"""
+        # Set before awaiting the lease so a concurrent trigger in this worker backs off
+        if job.running:
+            return False
+        job.running = True
+        try:
+            lease = await self._acquire(job, due_only=due_only)
+        except BaseException:
+            job.running = False
+            raise
+        if lease is None:
+            job.running = False
+            return False
+        return True
+
+    async def _run(self, job: Job, trigger: str):
+        # Wait for a run slot before taking the lease, so the lease only has to cover
+        # the run itself and other workers can take the slot meanwhile
+        async with self._semaphore:
+            if not await self._claim(job, due_only=trigger == "schedule"):
+                return None
+            return await self._execute(job, trigger)
+
+    async def _execute_in_slot(self, job: Job, trigger: str, run_id: str):
+        try:
+            return await self._execute(job, trigger, run_id)
+        finally:
+            self._semaphore.release()
+
+    async def _execute(self, job: Job, trigger: str, run_id: str = None):
+        """Run a claimed job in a held run slot, then release its lease and record the run"""
+        run = {
+            "id": run_id or str(uuid.uuid4()),
+            "job": job.name,
+            "trigger": trigger,
+            "owner": self.worker_id,
+            "started_at": datetime.now(timezone.utc)
+        }
+        try:
+            await asyncio.wait_for(job.func(), timeout=job.timeout)
+            run['status'] = "success"
+        except asyncio.TimeoutError:
+            run['status'] = "timeout"
+        except Exception as e:
+            logger.exception("Job %s failed", job.name)
+            run['status'] = "failed"
+            run['error'] = repr(e)
+        finally:
+            job.running = False
+            finished = datetime.now(timezone.utc)
+            run['finished_at'] = finished
+            run['duration_ms'] = round((finished - run['started_at']).total_seconds() * 1000, 1)
+            await self._release(job, job.next_after(finished))
+            await self.db.job_runs.insert_one(dict(run))
+
+        return run
+
+    async def trigger(self, name: str):
+        """Start a job now in the background; None if it is already running anywhere
+
+        Raises SchedulerBusy when no run slot is free in this worker. The run is
+        recorded in `job_runs` under the returned id when it finishes.
+        """
+        job = self.jobs[name]
+        if job.running:
+            return None
+        if self._semaphore.locked():
+            raise SchedulerBusy(f"No run slot is free for {name}")
+        # A slot is free, so this returns without waiting
+        await self._semaphore.acquire()
+        try:
+            claimed = await self._claim(job, due_only=False)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        if not claimed:
+            self._semaphore.release()
+            return None
+        run_id = str(uuid.uuid4())
+        task = asyncio.create_task(self._execute_in_slot(job, "manual", run_id))
+        self._manual.add(task)
+        task.add_done_callback(self._manual.discard)
+        return {"id": run_id, "job": name, "trigger": "manual", "status": "scheduled"}
+
+    async def status(self) -> list:
+        leases = {
+            doc['_id']: doc
+            async for doc in self.db.scheduler_leases.find({"_id": {"$in": list(self.jobs)}})
+        }
+        result = []
+        for job in self.jobs.values():
+            lease = leases.get(job.name, {})
+            last_run = await self.db.job_runs.find_one(
+                {"job": job.name}, {"_id": 0}, sort=[("started_at", -1)]
+            )
+            result.append({
+                "name": job.name,
+                "schedule": job.cron.expression if job.cron else f"every {job.interval}s",
+                "timeout": job.timeout,
+                "next_run_at": lease.get('next_run_at'),
+                "lease_owner": lease.get('owner') if lease.get('expires_at') and _utc(lease['expires_at']) > datetime.now(timezone.utc) else None,
+                "last_run": last_run
+            })
+        return result
+
+scheduler = Scheduler()
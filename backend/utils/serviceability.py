@@ -0,0 +1,206 @@
+"""Pincode serviceability and delivery ETA, answered from memory
+
+The dataset is a CSV (SERVICEABILITY_FILE) with one row per pincode or per
+three-digit pincode prefix (`110*`), falling back from exact to prefix:
+
+    pincode,zone,courier,eta_days,cod,latitude,longitude
+
+Distinct (zone, courier, eta_days, cod) rules are interned once, and the
+pincodes are kept as a sorted `array` of ints alongside an `array` of rule
+indexes, so a national table takes a few bytes per pincode and a lookup is
+a binary search.
+
+Warehouses (WAREHOUSES_FILE: id,name,latitude,longitude) sit in a small
+KD-tree over unit-sphere coordinates. The nearest one to the delivery point
+is the shipping origin, and its distance can push the ETA beyond the rule's
+baseline. Both files are reloaded when their mtime changes.
+
+Without a pincode file nothing is checked and checkout accepts any pincode;
+data/*.sample.csv show the format.
+"""
+import asyncio
+import bisect
+import csv
+import logging
+import math
+import os
+from array import array
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from utils.loop_watchdog import run_blocking
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+SERVICEABILITY_FILE = Path(os.environ.get("SERVICEABILITY_FILE", DATA_DIR / "pincodes.csv"))
+WAREHOUSES_FILE = Path(os.environ.get("WAREHOUSES_FILE", DATA_DIR / "warehouses.csv"))
+RELOAD_CHECK_SECONDS = 30
+EARTH_RADIUS_KM = 6371.0
+# Road distance covered per transit day beyond the rule's baseline
+KM_PER_TRANSIT_DAY = 600
+
+def _unit_vector(latitude: float, longitude: float) -> tuple:
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+class KDTree:
+    """3-d tree over unit vectors; chord distance orders points like great-circle distance"""
+
+    def __init__(self, points: list):
+        # points: [(vector, payload)]
+        self.root = self._build(points, 0)
+
+    def _build(self, points: list, depth: int):
+        if not points:
+            return None
+        axis = depth % 3
+        points = sorted(points, key=lambda p: p[0][axis])
+        mid = len(points) // 2
+        return (points[mid], axis, self._build(points[:mid], depth + 1), self._build(points[mid + 1:], depth + 1))
+
+    def nearest(self, vector: tuple):
+        best = [None, math.inf]
+
+        def visit(node):
+            if node is None:
+                return
+            (point, payload), axis, left, right = node
+            d = sum((a - b) ** 2 for a, b in zip(point, vector))
+            if d < best[1]:
+                best[0], best[1] = payload, d
+            diff = vector[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if diff ** 2 < best[1]:
+                visit(far)
+
+        visit(self.root)
+        if best[0] is None:
+            return None, None
+        chord = math.sqrt(best[1])
+        return best[0], 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+class Serviceability:
+    def __init__(self, pincode_file: Path = SERVICEABILITY_FILE, warehouse_file: Path = WAREHOUSES_FILE):
+        self.pincode_file = pincode_file
+        self.warehouse_file = warehouse_file
+        self._tables = None
+        self._mtimes = None
+        self._task = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._tables is not None and bool(self._tables['pincodes'] or self._tables['prefixes'])
+
+    def _file_mtimes(self) -> tuple:
+        return tuple(p.stat().st_mtime if p.exists() else None for p in (self.pincode_file, self.warehouse_file))
+
+    def load(self):
+        """Read both files and swap the in-memory tables in one step (runs off the loop)"""
+        mtimes = self._file_mtimes()
+        rules, rule_index = [], {}
+        exact, prefixes, coordinates = {}, {}, {}
+
+        if self.pincode_file.exists():
+            with open(self.pincode_file, newline="") as f:
+                for row in csv.DictReader(f):
+                    rule = (row['zone'], row['courier'], int(row['eta_days']), row.get('cod', '').lower() in ("1", "true", "yes"))
+                    if rule not in rule_index:
+                        rule_index[rule] = len(rules)
+                        rules.append(rule)
+                    pincode = row['pincode'].strip()
+                    if pincode.endswith("*"):
+                        prefixes[pincode[:-1]] = rule_index[rule]
+                    else:
+                        exact[int(pincode)] = rule_index[rule]
+                        if row.get('latitude') and row.get('longitude'):
+                            coordinates[int(pincode)] = (float(row['latitude']), float(row['longitude']))
+
+        warehouses = None
+        if self.warehouse_file.exists():
+            with open(self.warehouse_file, newline="") as f:
+                points = [
+                    (_unit_vector(float(row['latitude']), float(row['longitude'])), {"id": row['id'], "name": row['name']})
+                    for row in csv.DictReader(f)
+                ]
+            warehouses = KDTree(points) if points else None
+
+        ordered = sorted(exact.items())
+        self._tables = {
+            "rules": rules,
+            "pincodes": array("I", (p for p, _ in ordered)),
+            "pincode_rules": array("I", (r for _, r in ordered)),
+            "prefixes": prefixes,
+            "coordinates": coordinates,
+            "warehouses": warehouses
+        }
+        self._mtimes = mtimes
+        logger.info("Loaded serviceability for %d pincodes, %d prefixes", len(ordered), len(prefixes))
+
+    async def reload_if_changed(self):
+        if self._file_mtimes() != self._mtimes:
+            await run_blocking(self.load)
+
+    @staticmethod
+    def _rule(tables: dict, pincode: str):
+        code, pincodes = int(pincode), tables['pincodes']
+        i = bisect.bisect_left(pincodes, code)
+        if i < len(pincodes) and pincodes[i] == code:
+            return tables['rules'][tables['pincode_rules'][i]]
+        rule = tables['prefixes'].get(pincode[:3])
+        return tables['rules'][rule] if rule is not None else None
+
+    def quote(self, pincode: str, latitude: float = None, longitude: float = None):
+        """Serviceability and ETA for a 6-digit pincode; None when no dataset is loaded"""
+        if not self.loaded:
+            return None
+        tables = self._tables
+
+        rule = self._rule(tables, pincode)
+        if rule is None:
+            return {"pincode": pincode, "serviceable": False}
+
+        zone, courier, eta_days, cod = rule
+        quote = {
+            "pincode": pincode,
+            "serviceable": True,
+            "zone": zone,
+            "courier": courier,
+            "cod_available": cod,
+            "eta_days": eta_days,
+            "ships_from": None,
+            "distance_km": None
+        }
+
+        point = (latitude, longitude) if latitude is not None and longitude is not None else tables['coordinates'].get(int(pincode))
+        if point and tables['warehouses']:
+            warehouse, distance = tables['warehouses'].nearest(_unit_vector(*point))
+            quote['ships_from'] = warehouse
+            quote['distance_km'] = round(distance, 1)
+            quote['eta_days'] = max(eta_days, 1 + math.ceil(distance / KM_PER_TRANSIT_DAY))
+
+        quote['estimated_delivery'] = (datetime.now(timezone.utc) + timedelta(days=quote['eta_days'])).date().isoformat()
+        return quote
+
+    async def start(self):
+        await run_blocking(self.load)
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(RELOAD_CHECK_SECONDS)
+            try:
+                await self.reload_if_changed()
+            except Exception:
+                logger.exception("Serviceability reload failed; keeping the previous dataset")
+
+serviceability = Serviceability()
@@ -0,0 +1,191 @@
+"""Lightweight request tracing exported in Chrome trace-event format
+
+A sampled request gets a root span (see middleware.tracing); the current span
+lives in a context variable, so it follows the request through FastAPI
+dependencies, threadpool calls and Motor's executor. Every Mongo command run
+inside a traced request becomes a child span through `CommandTracer`, and
+`traced`/`span` mark anything else worth timing (outbound helpers in
+utils/auth.py, for example).
+
+Finished traces are appended to TRACE_FILE as complete ("X") events. The file
+uses the JSON array format without the closing bracket, which chrome://tracing
+and Perfetto accept, so it can be opened directly while still being written.
+It rotates at TRACE_FILE_MAX_BYTES, keeping TRACE_FILE_BACKUPS old files.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from pymongo import monitoring
+
+SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+TRACE_FILE = Path(os.environ.get("TRACE_FILE", Path(__file__).parent.parent / "traces" / "trace.json"))
+TRACE_FILE_MAX_BYTES = int(os.environ.get("TRACE_FILE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = 5
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Trace:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.spans = []
+
+class Span:
+    def __init__(self, trace: Trace, name: str, parent=None, category: str = "app", **attrs):
+        self.trace = trace
+        self.name = name
+        self.category = category
+        self.parent_id = parent.id if parent else None
+        self.id = uuid.uuid4().hex[:16]
+        self.attrs = attrs
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        trace.spans.append(self)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        self.end_ns = time.time_ns()
+
+def current_span():
+    return _current_span.get()
+
+def should_sample(forced: bool = False) -> bool:
+    return forced or (SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE)
+
+@contextmanager
+def span(name: str, category: str = "app", **attrs):
+    """Time a block as a child of the current span; a no-op outside a traced request"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent, category, **attrs)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.set(error=repr(e))
+        raise
+    finally:
+        _current_span.reset(token)
+        child.finish()
+
+def traced(name: str = None, category: str = "app"):
+    """Decorator recording each call of a sync or async function as a span"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, category):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def begin_trace(name: str, **attrs):
+    """Start a root span and make it current; returns (root, token) for end_trace"""
+    root = Span(Trace(), name, None, "request", **attrs)
+    return root, _current_span.set(root)
+
+def end_trace(root: Span, token):
+    """Finish the root span; the caller hands root.trace to `exporter.export`"""
+    _current_span.reset(token)
+    root.finish()
+
+class CommandTracer(monitoring.CommandListener):
+    """Child span per Mongo command issued inside a traced request
+
+    Motor runs pymongo in an executor with a copy of the caller's context, so
+    the listener sees the request's current span.
+    """
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        parent = _current_span.get()
+        if parent is None:
+            return
+        collection = event.command.get(event.command_name)
+        self._pending[(event.connection_id, event.request_id)] = Span(
+            parent.trace, f"mongo.{event.command_name}", parent, "mongo",
+            database=event.database_name,
+            collection=collection if isinstance(collection, str) else None
+        )
+
+    def _finish(self, event, **attrs):
+        child = self._pending.pop((event.connection_id, event.request_id), None)
+        if child is not None:
+            child.set(**attrs)
+            child.finish()
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, error=str(event.failure))
+
+class ChromeTraceExporter:
+    def __init__(self, path: Path, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+
+    def _events(self, trace: Trace) -> list:
+        pid = os.getpid()
+        # One timeline row per trace so concurrent requests don't interleave
+        tid = int(trace.id[:6], 16)
+        events = [{
+            "name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+            "args": {"name": trace.spans[0].name if trace.spans else trace.id}
+        }]
+        for s in trace.spans:
+            end_ns = s.end_ns or time.time_ns()
+            events.append({
+                "name": s.name,
+                "cat": s.category,
+                "ph": "X",
+                "ts": s.start_ns / 1000,
+                "dur": (end_ns - s.start_ns) / 1000,
+                "pid": pid,
+                "tid": tid,
+                "args": {"trace_id": trace.id, "span_id": s.id, "parent_id": s.parent_id, **s.attrs}
+            })
+        return events
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{index}")
+            if older.exists():
+                older.replace(self.path.with_name(f"{self.path.name}.{index + 1}"))
+        self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+
+    def export(self, trace: Trace):
+        lines = "".join(json.dumps(event, default=str) + ",\n" for event in self._events(trace))
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.path.exists() and self.path.stat().st_size >= self.max_bytes:
+                self._rotate()
+            with open(self.path, "a") as f:
+                if f.tell() == 0:
+                    f.write("[\n")
+                f.write(lines)
+
+exporter = ChromeTraceExporter(TRACE_FILE, TRACE_FILE_MAX_BYTES, TRACE_FILE_BACKUPS)
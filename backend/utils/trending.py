@@ -0,0 +1,90 @@
+"""Time-decayed product popularity
+
+Scores use forward decay: a sale of `qty` units at time t adds
+qty * 2 ** ((t - EPOCH) / HALF_LIFE) to `products.trending_score`. Older sales
+are worth exponentially less relative to newer ones, the stored value never
+needs rewriting, and sorting by it (indexed) equals sorting by the decayed
+score. The decayed score at read time is stored * 2 ** (-(now - EPOCH) / HALF_LIFE).
+
+With a 3-day half-life the stored values stay well inside float range for
+several years past EPOCH; move EPOCH forward (and rescale) before then.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from utils.counters import counters
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+HALF_LIFE_SECONDS = 3 * 24 * 3600
+REFRESH_INTERVAL_SECONDS = 60
+SNAPSHOT_SIZE = 500
+TOP_PER_CATEGORY = 50
+
+def growth(ts: float = None) -> float:
+    return 2 ** (((ts or time.time()) - EPOCH) / HALF_LIFE_SECONDS)
+
+class TrendingTracker:
+    def __init__(self):
+        self.db = None
+        self._top = {}
+        self._task = None
+
+    def set_db(self, database):
+        self.db = database
+
+    async def create_indexes(self):
+        await self.db.products.create_index([("trending_score", -1)])
+        await self.db.products.create_index([("category", 1), ("trending_score", -1)])
+
+    def record(self, product_id: str, quantity: int):
+        """Count a sale; written to Mongo with the next counter flush"""
+        counters.incr("products", product_id, "trending_score", quantity * growth())
+
+    async def refresh(self, projection: dict):
+        """Reload the in-memory top lists (overall and per category)"""
+        products = await self.db.products.find(
+            {"trending_score": {"$gt": 0}}, projection
+        ).sort("trending_score", -1).limit(SNAPSHOT_SIZE).to_list(SNAPSHOT_SIZE)
+
+        top = defaultdict(list)
+        for product in products:
+            top[None].append(product)
+            if len(top[product.get('category')]) < TOP_PER_CATEGORY:
+                top[product.get('category')].append(product)
+        self._top = dict(top)
+
+    def top(self, category: str = None, limit: int = 12) -> list:
+        """Top products with their score decayed to now"""
+        factor = 1 / growth()
+        return [
+            {**product, "trending_score": round(product['trending_score'] * factor, 4)}
+            for product in self._top.get(category, [])[:limit]
+        ]
+
+    async def start(self, projection: dict):
+        await self.create_indexes()
+        await self.refresh(projection)
+        self._task = asyncio.create_task(self._run(projection))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, projection: dict):
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
+            try:
+                await self.refresh(projection)
+            except Exception:
+                logger.exception("Trending refresh failed")
+
+trending = TrendingTracker()
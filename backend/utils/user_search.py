@@ -0,0 +1,40 @@
+"""Indexed prefix search over users
+
+A case-insensitive regex can't walk an index, so users carry lowercase copies
+of name and email (`name_lc`, `email_lc`) written alongside the originals.
+A search is then an anchored, case-sensitive prefix regex per field, which
+Mongo answers as an index range scan. Phones are matched as stored.
+"""
+import re
+
+SEARCH_FIELDS = {"name": "name_lc", "email": "email_lc"}
+MAX_QUERY_LENGTH = 64
+
+async def create_indexes(db):
+    await db.users.create_index("name_lc")
+    await db.users.create_index("email_lc")
+    await db.users.create_index([("created_at", -1), ("id", -1)])
+    # Backfill users written before the search fields existed
+    for field, search_field in SEARCH_FIELDS.items():
+        await db.users.update_many(
+            {field: {"$type": "string"}, search_field: {"$exists": False}},
+            [{"$set": {search_field: {"$toLower": {"$trim": {"input": f"${field}"}}}}}]
+        )
+
+def search_keys(update: dict) -> dict:
+    """Search fields to $set alongside an update of name/email"""
+    return {
+        search_field: update[field].strip().lower()
+        for field, search_field in SEARCH_FIELDS.items()
+        if isinstance(update.get(field), str)
+    }
+
+def prefix_query(q: str) -> dict:
+    """Users whose phone, name or email starts with `q`"""
+    q = q.strip()[:MAX_QUERY_LENGTH]
+    prefix = "^" + re.escape(q.lower())
+    clauses = [{search_field: {"$regex": prefix}} for search_field in SEARCH_FIELDS.values()]
+    phone = re.sub(r"[\s-]", "", q)
+    if phone:
+        clauses.append({"phone": {"$regex": "^" + re.escape(phone)}})
+    return {"$or": clauses}
@@ -48,6 +48,9 @@ export const ProductCard = ({ product }) => {
       <div className="relative aspect-[3/4] overflow-hidden bg-gray-100">
         <motion.img
           src={product.images[0]}
+          srcSet={product.image_srcset?.[0]}
+          sizes="(min-width: 1024px) 25vw, (min-width: 768px) 33vw, 50vw"
+          loading="lazy"
           alt={product.name}
           className="w-full h-full object-cover"
           animate={{ scale: isHovered ? 1.05 : 1 }}
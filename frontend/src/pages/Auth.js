@@ -28,9 +28,11 @@ export const Auth = () => {
       const response = await api.post('/auth/login', { phone });
       setMockOtp(response.data.mock_otp);
       setOtpSent(true);
-      toast.success(`OTP sent! Use: ${response.data.mock_otp}`);
+      toast.success(
+        response.data.mock_otp ? `OTP sent! Use: ${response.data.mock_otp}` : 'OTP sent!'
+      );
     } catch (error) {
-      toast.error('Failed to send OTP');
+      toast.error(error.response?.data?.detail || 'Failed to send OTP');
     } finally {
       setLoading(false);
     }
@@ -7,7 +7,7 @@ import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
 import { Label } from '../components/ui/label';
 import { RadioGroup, RadioGroupItem } from '../components/ui/radio-group';
-import { clearCart } from '../store/slices/cartSlice';
+import { clearCart, refreshCartProducts } from '../store/slices/cartSlice';
 import api from '../utils/api';
 import { toast } from 'sonner';
 
@@ -24,6 +24,9 @@ export const Checkout = () => {
   const [couponCode, setCouponCode] = useState('');
   const [discount, setDiscount] = useState(0);
   const [loading, setLoading] = useState(false);
+  const [shippingQuote, setShippingQuote] = useState(null);
+  const [priceQuote, setPriceQuote] = useState(null);
+  const [appliedCoupon, setAppliedCoupon] = useState(null);
   
   const [newAddress, setNewAddress] = useState({
     name: '',
@@ -48,11 +51,52 @@ export const Checkout = () => {
     fetchAddresses();
   }, [isAuthenticated, items, navigate]);
 
+  useEffect(() => {
+    const revalidateCart = async () => {
+      if (items.length === 0) return;
+      try {
+        const ids = items.map((item) => item.product.id);
+        const response = await api.post('/products/batch', { ids });
+        if (response.data.missing.length > 0) {
+          toast.error('Some items in your cart are no longer available');
+        }
+        dispatch(refreshCartProducts(response.data.products));
+      } catch (error) {
+        console.error('Error revalidating cart:', error);
+      }
+    };
+    revalidateCart();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, []);
+
+  useEffect(() => {
+    const addr = addresses.find((a) => a.id === selectedAddress);
+    if (!addr) {
+      setShippingQuote(null);
+      return;
+    }
+    const fetchQuote = async () => {
+      try {
+        const response = await api.get('/shipping/quote', {
+          params: { pincode: addr.pincode, latitude: addr.latitude, longitude: addr.longitude },
+        });
+        setShippingQuote(response.data);
+        if (!response.data.cod_available) {
+          setPaymentMethod('razorpay');
+        }
+      } catch (error) {
+        // No serviceability data or invalid pincode; the order request still validates
+        setShippingQuote(null);
+      }
+    };
+    fetchQuote();
+  }, [selectedAddress, addresses]);
+
   const fetchAddresses = async () => {
     try {
-      const response = await api.get('/auth/me');
-      setAddresses(response.data.addresses || []);
-      if (response.data.addresses?.length > 0) {
+      const response = await api.get('/auth/bootstrap', { params: { include: 'addresses' } });
+      setAddresses(response.data.addresses);
+      if (response.data.addresses.length > 0) {
         setSelectedAddress(response.data.addresses[0].id);
       }
     } catch (error) {
@@ -88,15 +132,43 @@ export const Checkout = () => {
     }
   };
 
+  const cartLines = () =>
+    items.map((item) => ({
+      product_id: item.product.id,
+      variant_size: item.variant.size,
+      variant_color: item.variant.color,
+      quantity: item.quantity,
+    }));
+
+  useEffect(() => {
+    if (items.length === 0) return;
+    const fetchPriceQuote = async () => {
+      try {
+        const response = await api.post('/cart/quote', {
+          items: cartLines(),
+          coupon_code: appliedCoupon,
+        });
+        setPriceQuote(response.data);
+        setDiscount(response.data.discount_amount);
+      } catch (error) {
+        setPriceQuote(null);
+      }
+    };
+    fetchPriceQuote();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [items]);
+
   const handleApplyCoupon = async () => {
     if (!couponCode) return;
     
     try {
-      const response = await api.post('/coupons/validate', {
-        code: couponCode,
-        cart_total: subtotal,
+      const response = await api.post('/cart/quote', {
+        items: cartLines(),
+        coupon_code: couponCode,
       });
+      setPriceQuote(response.data);
       setDiscount(response.data.discount_amount);
+      setAppliedCoupon(couponCode);
       toast.success(`Coupon applied! You saved ₹${response.data.discount_amount}`);
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Invalid coupon code');
@@ -123,11 +195,9 @@ export const Checkout = () => {
           quantity: item.quantity,
           price: item.product.discount_price || item.product.price,
         })),
-        total_amount: subtotal,
-        discount_amount: discount,
         payment_method: paymentMethod,
         shipping_address: selectedAddr,
-        coupon_code: couponCode || null,
+        coupon_code: appliedCoupon,
       };
 
       const response = await api.post('/orders', orderData);
@@ -141,11 +211,14 @@ export const Checkout = () => {
     }
   };
 
-  const subtotal = items.reduce(
-    (sum, item) => sum + (item.product.discount_price || item.product.price) * item.quantity,
-    0
-  );
-  const total = subtotal - discount;
+  // Server quote when available; the order itself is always repriced server-side
+  const subtotal = priceQuote
+    ? priceQuote.subtotal
+    : items.reduce(
+        (sum, item) => sum + (item.product.discount_price || item.product.price) * item.quantity,
+        0
+      );
+  const total = priceQuote ? priceQuote.total : subtotal - discount;
 
   return (
     <div data-testid="checkout-page" className="py-24">
@@ -269,10 +342,18 @@ export const Checkout = () => {
               <RadioGroup value={paymentMethod} onValueChange={setPaymentMethod}>
                 <div className="space-y-3">
                   <div className="flex items-center gap-3 p-4 border rounded-sm">
-                    <RadioGroupItem value="cod" id="cod" />
+                    <RadioGroupItem
+                      value="cod"
+                      id="cod"
+                      disabled={shippingQuote?.serviceable && !shippingQuote.cod_available}
+                    />
                     <label htmlFor="cod" className="flex-1 cursor-pointer">
                       <div className="font-semibold">Cash on Delivery</div>
-                      <div className="text-sm text-gray-600">Pay when you receive</div>
+                      <div className="text-sm text-gray-600">
+                        {shippingQuote?.serviceable && !shippingQuote.cod_available
+                          ? 'Not available for this pincode'
+                          : 'Pay when you receive'}
+                      </div>
                     </label>
                   </div>
                   <div className="flex items-center gap-3 p-4 border rounded-sm">
@@ -342,6 +423,23 @@ export const Checkout = () => {
                   <span>Shipping</span>
                   <span className="text-green-600">FREE</span>
                 </div>
+                {shippingQuote && (
+                  <div className="flex justify-between text-sm" data-testid="delivery-eta">
+                    <span>Delivery</span>
+                    {shippingQuote.serviceable ? (
+                      <span>
+                        By{' '}
+                        {new Date(shippingQuote.estimated_delivery).toLocaleDateString('en-IN', {
+                          day: 'numeric',
+                          month: 'short',
+                        })}{' '}
+                        via {shippingQuote.courier}
+                      </span>
+                    ) : (
+                      <span className="text-red-600">Not deliverable to this pincode</span>
+                    )}
+                  </div>
+                )}
               </div>
 
               <div className="flex justify-between font-bold text-lg mt-4 mb-6">
@@ -352,7 +450,7 @@ export const Checkout = () => {
               <Button
                 data-testid="place-order-button"
                 onClick={handlePlaceOrder}
-                disabled={loading || !selectedAddress}
+                disabled={loading || !selectedAddress || shippingQuote?.serviceable === false}
                 className="w-full h-12 rounded-none uppercase tracking-widest"
               >
                 {loading ? 'Placing Order...' : 'Place Order'}
@@ -14,7 +14,7 @@ export const Home = () => {
   useEffect(() => {
     const fetchFeaturedProducts = async () => {
       try {
-        const response = await api.get('/products/featured');
+        const response = await api.get('/products/featured', { params: { view: 'card' } });
         setFeaturedProducts(response.data);
       } catch (error) {
         console.error('Error fetching featured products:', error);
@@ -22,7 +22,7 @@ export const Orders = () => {
   const fetchOrders = async () => {
     setLoading(true);
     try {
-      const response = await api.get('/orders/my-orders');
+      const response = await api.get('/orders/my-orders', { params: { view: 'card' } });
       setOrders(response.data);
     } catch (error) {
       console.error('Error fetching orders:', error);
@@ -18,6 +18,7 @@ export const ProductDetail = () => {
   const [loading, setLoading] = useState(true);
   const [mainImage, setMainImage] = useState(0);
   const [reviews, setReviews] = useState([]);
+  const [reviewsCursor, setReviewsCursor] = useState(null);
   const [showReviewForm, setShowReviewForm] = useState(false);
   const [newReview, setNewReview] = useState({ rating: 5, comment: '' });
   const dispatch = useDispatch();
@@ -28,18 +29,16 @@ export const ProductDetail = () => {
     const fetchProduct = async () => {
       setLoading(true);
       try {
-        const response = await api.get(`/products/${slug}`);
+        const response = await api.get(`/products/${slug}?include=reviews`);
         setProduct(response.data);
+        setReviews(response.data.reviews.reviews);
+        setReviewsCursor(response.data.reviews.next_cursor);
         
         // Set default selections
         if (response.data.variants.length > 0) {
           setSelectedSize(response.data.variants[0].size);
           setSelectedColor(response.data.variants[0].color);
         }
-
-        // Fetch reviews
-        const reviewsResponse = await api.get(`/reviews/product/${response.data.id}`);
-        setReviews(reviewsResponse.data);
       } catch (error) {
         console.error('Error fetching product:', error);
         toast.error('Product not found');
@@ -51,6 +50,18 @@ export const ProductDetail = () => {
     fetchProduct();
   }, [slug, navigate]);
 
+  const loadMoreReviews = async () => {
+    try {
+      const response = await api.get(`/reviews/product/${product.id}`, {
+        params: { cursor: reviewsCursor },
+      });
+      setReviews([...reviews, ...response.data.reviews]);
+      setReviewsCursor(response.data.next_cursor);
+    } catch (error) {
+      toast.error('Failed to load reviews');
+    }
+  };
+
   const handleAddToCart = () => {
     if (!selectedSize || !selectedColor) {
       toast.error('Please select size and color');
@@ -272,7 +283,7 @@ export const ProductDetail = () => {
         <div className="mt-16 border-t pt-16">
           <div className="flex items-center justify-between mb-8">
             <h2 className="font-heading text-3xl tracking-tight uppercase">
-              Customer Reviews ({reviews.length})
+              Customer Reviews ({product.total_reviews || 0})
             </h2>
             {isAuthenticated && (
               <Button onClick={() => setShowReviewForm(!showReviewForm)}>
@@ -327,10 +338,10 @@ export const ProductDetail = () => {
                         toast.success('Review submitted successfully!');
                         setShowReviewForm(false);
                         setNewReview({ rating: 5, comment: '' });
-                        const reviewsResponse = await api.get(`/reviews/product/${product.id}`);
-                        setReviews(reviewsResponse.data);
-                        const productResponse = await api.get(`/products/${slug}`);
+                        const productResponse = await api.get(`/products/${product.id}?include=reviews`);
                         setProduct(productResponse.data);
+                        setReviews(productResponse.data.reviews.reviews);
+                        setReviewsCursor(productResponse.data.reviews.next_cursor);
                       } catch (error) {
                         toast.error(error.response?.data?.detail || 'Failed to submit review');
                       }
@@ -387,6 +398,13 @@ export const ProductDetail = () => {
                   </div>
                 </div>
               ))}
+              {reviewsCursor && (
+                <div className="text-center">
+                  <Button variant="outline" onClick={loadMoreReviews}>
+                    Load More Reviews
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </div>
@@ -28,31 +28,22 @@ export const Profile = () => {
       return;
     }
     fetchProfile();
-    fetchRecentOrders();
   }, [isAuthenticated, navigate]);
 
   const fetchProfile = async () => {
     try {
-      const response = await api.get('/auth/me');
-      dispatch(updateUser(response.data));
+      const response = await api.get('/auth/bootstrap', { params: { include: 'orders' } });
+      dispatch(updateUser(response.data.user));
       setFormData({
-        name: response.data.name || '',
-        email: response.data.email || '',
+        name: response.data.user.name || '',
+        email: response.data.user.email || '',
       });
+      setRecentOrders(response.data.orders);
     } catch (error) {
       console.error('Error fetching profile:', error);
     }
   };
 
-  const fetchRecentOrders = async () => {
-    try {
-      const response = await api.get('/orders/my-orders');
-      setRecentOrders(response.data.slice(0, 5));
-    } catch (error) {
-      console.error('Error fetching orders:', error);
-    }
-  };
-
   const handleUpdateProfile = async () => {
     try {
       const response = await api.put('/auth/me', formData);
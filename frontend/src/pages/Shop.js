@@ -24,18 +24,6 @@ export const Shop = () => {
   const currentSort = searchParams.get('sort') || 'newest';
   const currentPage = parseInt(searchParams.get('page') || '1');
 
-  useEffect(() => {
-    const fetchCategories = async () => {
-      try {
-        const response = await api.get('/products/categories');
-        setCategories(response.data);
-      } catch (error) {
-        console.error('Error fetching categories:', error);
-      }
-    };
-    fetchCategories();
-  }, []);
-
   useEffect(() => {
     const fetchProducts = async () => {
       setLoading(true);
@@ -44,6 +32,8 @@ export const Shop = () => {
           page: currentPage,
           limit: 12,
           sort_by: currentSort,
+          facets: true,
+          view: 'card',
         };
         if (currentCategory && currentCategory !== 'all') {
           params.category = currentCategory;
@@ -51,6 +41,7 @@ export const Shop = () => {
 
         const response = await api.get('/products', { params });
         setProducts(response.data.products);
+        setCategories(response.data.facets.categories.map((c) => c.value));
         setPagination({
           page: response.data.page,
           total_pages: response.data.total_pages,
@@ -132,6 +123,7 @@ export const Shop = () => {
               <SelectItem value="price_low">Price: Low to High</SelectItem>
               <SelectItem value="price_high">Price: High to Low</SelectItem>
               <SelectItem value="popular">Most Popular</SelectItem>
+              <SelectItem value="trending">Trending Now</SelectItem>
               <SelectItem value="rating">Top Rated</SelectItem>
             </SelectContent>
           </Select>
@@ -24,14 +24,8 @@ export const Wishlist = () => {
   const fetchWishlist = async () => {
     setLoading(true);
     try {
-      const userResponse = await api.get('/auth/me');
-      const wishlistIds = userResponse.data.wishlist || [];
-
-      if (wishlistIds.length > 0) {
-        const productsPromises = wishlistIds.map((id) => api.get(`/products/${id}`));
-        const productsResponses = await Promise.all(productsPromises);
-        setWishlistProducts(productsResponses.map((r) => r.data));
-      }
+      const response = await api.get('/auth/bootstrap', { params: { include: 'wishlist' } });
+      setWishlistProducts(response.data.wishlist.products);
     } catch (error) {
       console.error('Error fetching wishlist:', error);
     } finally {
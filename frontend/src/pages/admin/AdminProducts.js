@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { useSelector } from 'react-redux';
 import { useNavigate } from 'react-router-dom';
-import { Plus, Edit, Trash2, Save, X } from 'lucide-react';
+import { Plus, Edit, Trash2, Save, X, Upload } from 'lucide-react';
 import { Button } from '../../components/ui/button';
 import { Input } from '../../components/ui/input';
 import { Label } from '../../components/ui/label';
@@ -16,6 +16,7 @@ export const AdminProducts = () => {
   const [loading, setLoading] = useState(true);
   const [showForm, setShowForm] = useState(false);
   const [editingProduct, setEditingProduct] = useState(null);
+  const [importProgress, setImportProgress] = useState(null);
   const [formData, setFormData] = useState({
     name: '',
     description: '',
@@ -40,7 +41,7 @@ export const AdminProducts = () => {
   const fetchProducts = async () => {
     setLoading(true);
     try {
-      const response = await api.get('/products', { params: { limit: 100 } });
+      const response = await api.get('/products', { params: { limit: 100, view: 'admin' } });
       setProducts(response.data.products);
     } catch (error) {
       console.error('Error fetching products:', error);
@@ -49,6 +50,41 @@ export const AdminProducts = () => {
     }
   };
 
+  const handleImport = async (e) => {
+    const file = e.target.files[0];
+    e.target.value = '';
+    if (!file) return;
+
+    const format = file.name.endsWith('.csv') ? 'csv' : 'ndjson';
+    setImportProgress({ rows: 0 });
+
+    try {
+      const { data } = await api.post('/products/import', file, {
+        params: { format },
+        headers: { 'Content-Type': format === 'csv' ? 'text/csv' : 'application/x-ndjson' },
+      });
+      // The import runs in the background; poll until it settles
+      let status = data;
+      while (['queued', 'running'].includes(status.status)) {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        status = (await api.get(`/products/import/${data.import_id}`)).data;
+        setImportProgress(status);
+      }
+      if (status.status !== 'completed') {
+        toast.error(`Import ${status.status}`);
+      } else {
+        const { inserted, updated, failed } = status;
+        toast.success(`Imported: ${inserted} new, ${updated} updated, ${failed} failed`);
+      }
+      status.errors.slice(0, 5).forEach((err) => toast.error(err.row ? `Row ${err.row}: ${err.error}` : err.error));
+      fetchProducts();
+    } catch (error) {
+      toast.error(error.response?.data?.detail || 'Import failed');
+    } finally {
+      setImportProgress(null);
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     try {
@@ -138,15 +174,32 @@ export const AdminProducts = () => {
       <div className="max-w-7xl mx-auto px-4 md:px-8">
         <div className="flex items-center justify-between mb-8">
           <h1 className="font-heading text-4xl tracking-tight uppercase">Manage Products</h1>
-          <Button
-            onClick={() => {
-              resetForm();
-              setEditingProduct(null);
-              setShowForm(true);
-            }}
-          >
-            <Plus className="w-4 h-4 mr-2" /> Add Product
-          </Button>
+          <div className="flex items-center gap-2">
+            {importProgress && (
+              <span className="text-sm text-gray-500">Importing... {importProgress.rows} rows</span>
+            )}
+            <Button variant="outline" asChild disabled={!!importProgress}>
+              <label className="cursor-pointer">
+                <Upload className="w-4 h-4 mr-2" /> Import CSV/NDJSON
+                <input
+                  type="file"
+                  accept=".csv,.ndjson,.jsonl"
+                  className="hidden"
+                  onChange={handleImport}
+                  disabled={!!importProgress}
+                />
+              </label>
+            </Button>
+            <Button
+              onClick={() => {
+                resetForm();
+                setEditingProduct(null);
+                setShowForm(true);
+              }}
+            >
+              <Plus className="w-4 h-4 mr-2" /> Add Product
+            </Button>
+          </div>
         </div>
 
         {showForm && (
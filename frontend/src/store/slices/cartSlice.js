@@ -55,6 +55,16 @@ const cartSlice = createSlice({
         saveCart(state.items);
       }
     },
+    refreshCartProducts: (state, action) => {
+      const freshProducts = {};
+      action.payload.forEach((product) => {
+        freshProducts[product.id] = product;
+      });
+      state.items = state.items
+        .filter((item) => freshProducts[item.product.id])
+        .map((item) => ({ ...item, product: freshProducts[item.product.id] }));
+      saveCart(state.items);
+    },
     clearCart: (state) => {
       state.items = [];
       saveCart([]);
@@ -75,6 +85,7 @@ export const {
   addToCart, 
   removeFromCart, 
   updateQuantity, 
+  refreshCartProducts,
   clearCart, 
   toggleCart,
   openCart,
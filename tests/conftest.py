@@ -0,0 +1,599 @@
+import copy
+import operator
+import re
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+import pytest
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# Backend modules import each other as top-level packages (utils, models, ...)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def db():
+    return FakeDatabase()
+
+# In-memory stand-in for the slice of the Motor API the backend uses. Documents are
+# stored the way Mongo returns them (datetimes as naive UTC), filters support the
+# operators the backend queries with, and each collection counts its calls so tests
+# can assert on round-trips. Aggregation covers $match, $group (with $sum), $sort
+# and $limit. `errors[method]` makes a method raise; writes to ids in
+# `failing_ids` come back as per-document writeErrors from bulk_write.
+
+_MISSING = object()
+_COMPARISONS = {"$lt": operator.lt, "$lte": operator.le, "$gt": operator.gt, "$gte": operator.ge}
+
+def _normalize(value):
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+def _get(doc, path):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return _MISSING
+    return value
+
+def _values(doc, path):
+    """Values at a dotted path, descending into arrays the way Mongo does"""
+    values = [doc]
+    for part in path.split("."):
+        found = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                found.append(value[part])
+            elif isinstance(value, list):
+                found.extend(item[part] for item in value if isinstance(item, dict) and part in item)
+        values = found
+    return values
+
+def _comparable(a, b):
+    if isinstance(a, bool) or isinstance(b, bool):
+        return False
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return True
+    return type(a) is type(b)
+
+def _match_operator(values, op, arg):
+    arg = _normalize(arg)
+    candidates = values + [item for value in values if isinstance(value, list) for item in value]
+    if op == "$eq":
+        return (arg is None and not values) or any(value == arg for value in candidates)
+    if op == "$ne":
+        return not _match_operator(values, "$eq", arg)
+    if op == "$in":
+        return any(_match_operator(values, "$eq", item) for item in arg)
+    if op == "$nin":
+        return not _match_operator(values, "$in", arg)
+    if op == "$exists":
+        return bool(values) == bool(arg)
+    if op == "$regex":
+        return any(isinstance(value, str) and re.search(arg, value) for value in candidates)
+    if op in _COMPARISONS:
+        return any(_comparable(value, arg) and _COMPARISONS[op](value, arg) for value in candidates)
+    if op == "$elemMatch":
+        return any(isinstance(value, list) and any(matches(item, arg) for item in value) for value in values)
+    raise NotImplementedError(op)
+
+def _expression(doc, expression):
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = _get(doc, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, dict):
+        (op, args), = expression.items()
+        left, right = (_expression(doc, arg) for arg in args)
+        if op in _COMPARISONS:
+            return _comparable(left, right) and _COMPARISONS[op](left, right)
+        if op in ("$eq", "$ne"):
+            return (left == right) == (op == "$eq")
+        raise NotImplementedError(op)
+    return expression
+
+def matches(doc, query) -> bool:
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$expr":
+            if not _expression(doc, condition):
+                return False
+        elif isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            values = _values(doc, key)
+            if not all(_match_operator(values, op, arg) for op, arg in condition.items() if op != "$options"):
+                return False
+        elif not _match_operator(_values(doc, key), "$eq", condition):
+            return False
+    return True
+
+def _set(doc, path, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+def _unset(doc, path):
+    def walk(value, parts):
+        if isinstance(value, list):
+            for item in value:
+                walk(item, parts)
+        elif isinstance(value, dict):
+            if len(parts) == 1:
+                value.pop(parts[0], None)
+            elif parts[0] in value:
+                walk(value[parts[0]], parts[1:])
+    walk(doc, path.split("."))
+
+def _apply_update(doc, update, inserting=False):
+    if isinstance(update, list):
+        raise NotImplementedError("pipeline updates")
+    for op, fields in update.items():
+        for path, value in _normalize(fields).items():
+            current = _get(doc, path)
+            if op == "$set" or (op == "$setOnInsert" and inserting):
+                _set(doc, path, copy.deepcopy(value))
+            elif op == "$inc":
+                _set(doc, path, (0 if current is _MISSING else current) + value)
+            elif op == "$unset":
+                _unset(doc, path)
+            elif op == "$push":
+                _set(doc, path, (current if current is not _MISSING else []) + [value])
+            elif op == "$addToSet":
+                items = current if current is not _MISSING else []
+                _set(doc, path, items if value in items else items + [value])
+            elif op in ("$max", "$min"):
+                better = operator.gt if op == "$max" else operator.lt
+                if current is _MISSING or better(value, current):
+                    _set(doc, path, value)
+            elif op != "$setOnInsert":
+                raise NotImplementedError(op)
+
+def _pick(value, parts):
+    """`value` cut down to a dotted path, projecting through arrays"""
+    if not parts:
+        return copy.deepcopy(value)
+    if isinstance(value, list):
+        return [_pick(item, parts) for item in value if isinstance(item, dict)]
+    if isinstance(value, dict):
+        if parts[0] not in value:
+            return {}
+        picked = _pick(value[parts[0]], parts[1:])
+        return {} if picked is _MISSING else {parts[0]: picked}
+    return _MISSING
+
+def _merge(into, value):
+    if isinstance(into, dict) and isinstance(value, dict):
+        for key, item in value.items():
+            into[key] = _merge(into[key], item) if key in into else item
+        return into
+    if isinstance(into, list) and isinstance(value, list):
+        return [_merge(a, b) for a, b in zip(into, value)]
+    return value
+
+def _project(doc, projection):
+    if doc is None:
+        return None
+    if not projection:
+        return copy.deepcopy(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    included = [field for field, flag in projection.items() if flag and field != "_id"]
+    if included:
+        result = {}
+        for field in included:
+            _merge(result, _pick(doc, field.split(".")))
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    result = copy.deepcopy(doc)
+    for field, flag in projection.items():
+        if not flag:
+            _unset(result, field)
+    return result
+
+def _sort_key(value):
+    if value is _MISSING or value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (5, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (6, value)
+    return (3, str(value))
+
+def _sort(docs, keys):
+    for field, direction in reversed(keys):
+        docs.sort(key=lambda doc: _sort_key(_get(doc, field)), reverse=direction < 0)
+    return docs
+
+def _sort_spec(key, direction=None):
+    if key is None:
+        return []
+    return [(key, direction or 1)] if isinstance(key, str) else list(key)
+
+def _seed(query):
+    """Equality parts of a filter, which an upsert copies into the new document"""
+    doc = {}
+    for key, condition in (query or {}).items():
+        if key.startswith("$"):
+            continue
+        if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+            if "$eq" in condition:
+                _set(doc, key, condition["$eq"])
+            continue
+        _set(doc, key, copy.deepcopy(_normalize(condition)))
+    return doc
+
+class FakeCursor:
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+        self._results = None
+
+    def sort(self, key, direction=None):
+        self._sort = _sort_spec(key, direction)
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int):
+        return self
+
+    @property
+    def alive(self) -> bool:
+        # Tailable cursors stay open in Mongo; this one closes once read, like a dropped tail
+        return self._results is None
+
+    def _evaluate(self):
+        if self._results is None:
+            docs = _sort(self._collection._matching(self._query), self._sort)[self._skip:]
+            if self._limit:
+                docs = docs[:self._limit]
+            self._results = iter([_project(doc, self._projection) for doc in docs])
+        return self._results
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._evaluate())
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        results = list(self._evaluate())
+        return results[:length] if length else results
+
+def _aggregate_value(doc, expression):
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = _get(doc, expression[1:])
+        return None if value is _MISSING else value
+    return expression
+
+def _group(docs, spec):
+    groups = {}
+    for doc in docs:
+        key = _aggregate_value(doc, spec["_id"])
+        group = groups.setdefault(repr(key), {"_id": key})
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (op, expression), = accumulator.items()
+            if op != "$sum":
+                raise NotImplementedError(f"FakeCollection.aggregate does not support {op}")
+            value = _aggregate_value(doc, expression)
+            group[field] = group.get(field, 0) + (value if isinstance(value, (int, float)) else 0)
+    return list(groups.values())
+
+class FakeAggregateCursor(FakeCursor):
+    def __init__(self, results):
+        super().__init__(None, None, None)
+        self._results = iter(results)
+
+class FakeCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self.docs = []
+        self.indexes = {"_id_": {"key": [("_id", 1)], "unique": True}}
+        self.options = {}
+        self.calls = Counter()
+        self.errors = {}
+        self.failing_ids = set()
+
+    def load(self, documents):
+        """Insert fixture documents directly (no call is counted)"""
+        for document in documents:
+            self._insert(document)
+        return self
+
+    def _called(self, method: str):
+        self.calls[method] += 1
+        error = self.errors.get(method)
+        if error is not None:
+            raise error
+
+    def _matching(self, query):
+        return [doc for doc in self.docs if matches(doc, query)]
+
+    def _first(self, query, sort=None):
+        docs = _sort(self._matching(query), _sort_spec(sort))
+        return docs[0] if docs else None
+
+    def _unique_keys(self):
+        return [[field for field, _ in index["key"]] for index in self.indexes.values() if index.get("unique")]
+
+    def _check_unique(self, doc, ignore=None):
+        for fields in self._unique_keys():
+            key = [_get(doc, field) for field in fields]
+            for other in self.docs:
+                if other is not ignore and other is not doc and [_get(other, field) for field in fields] == key:
+                    raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {fields}", 11000)
+
+    def _insert(self, doc):
+        doc = _normalize(copy.deepcopy(doc))
+        doc.setdefault("_id", ObjectId())
+        self._check_unique(doc)
+        self.docs.append(doc)
+        return doc["_id"]
+
+    def _update(self, doc, update):
+        updated = copy.deepcopy(doc)
+        _apply_update(updated, update)
+        self._check_unique(updated, ignore=doc)
+        self.docs[self.docs.index(doc)] = updated
+        return updated
+
+    def _upsert(self, query, update, replacement=False):
+        doc = {} if replacement else _seed(query)
+        if replacement:
+            doc.update(_normalize(copy.deepcopy(update)))
+        else:
+            _apply_update(doc, update, inserting=True)
+        return self._insert(doc)
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0, session=None, **kwargs):
+        self._called("find")
+        cursor = FakeCursor(self, filter, projection).skip(skip).limit(limit)
+        return cursor.sort(sort) if sort else cursor
+
+    async def find_one(self, filter=None, projection=None, sort=None, session=None, **kwargs):
+        self._called("find_one")
+        return _project(self._first(filter, sort), projection)
+
+    async def insert_one(self, document, session=None, **kwargs):
+        self._called("insert_one")
+        inserted_id = self._insert(document)
+        document.setdefault("_id", inserted_id)
+        return SimpleNamespace(inserted_id=inserted_id, acknowledged=True)
+
+    async def insert_many(self, documents, ordered=True, session=None, **kwargs):
+        self._called("insert_many")
+        result = await self._bulk([InsertOne(document) for document in documents], ordered)
+        return SimpleNamespace(inserted_ids=[document.get("_id") for document in documents], **vars(result))
+
+    async def update_one(self, filter, update, upsert=False, session=None, **kwargs):
+        self._called("update_one")
+        return self._update_matching(filter, update, upsert, many=False)
+
+    async def update_many(self, filter, update, upsert=False, session=None, **kwargs):
+        self._called("update_many")
+        return self._update_matching(filter, update, upsert, many=True)
+
+    async def replace_one(self, filter, replacement, upsert=False, session=None, **kwargs):
+        self._called("replace_one")
+        doc = self._first(filter)
+        if doc is None:
+            upserted_id = self._upsert(filter, replacement, replacement=True) if upsert else None
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=upserted_id)
+        replaced = {"_id": doc["_id"], **_normalize(copy.deepcopy(replacement))}
+        self._check_unique(replaced, ignore=doc)
+        self.docs[self.docs.index(doc)] = replaced
+        return SimpleNamespace(matched_count=1, modified_count=int(replaced != doc), upserted_id=None)
+
+    def _update_matching(self, filter, update, upsert, many):
+        docs = self._matching(filter)
+        if not many:
+            docs = docs[:1]
+        if not docs:
+            upserted_id = self._upsert(filter, update) if upsert else None
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=upserted_id)
+        modified = sum(self._update(doc, update) != doc for doc in docs)
+        return SimpleNamespace(matched_count=len(docs), modified_count=modified, upserted_id=None)
+
+    async def delete_one(self, filter, session=None, **kwargs):
+        self._called("delete_one")
+        doc = self._first(filter)
+        if doc is not None:
+            self.docs.remove(doc)
+        return SimpleNamespace(deleted_count=int(doc is not None))
+
+    async def delete_many(self, filter, session=None, **kwargs):
+        self._called("delete_many")
+        docs = self._matching(filter)
+        for doc in docs:
+            self.docs.remove(doc)
+        return SimpleNamespace(deleted_count=len(docs))
+
+    async def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                                  return_document=ReturnDocument.BEFORE, session=None, **kwargs):
+        self._called("find_one_and_update")
+        doc = self._first(filter, sort)
+        if doc is None:
+            if not upsert:
+                return None
+            inserted_id = self._upsert(filter, update)
+            after = next(d for d in self.docs if d["_id"] == inserted_id)
+            return _project(after, projection) if return_document == ReturnDocument.AFTER else None
+        after = self._update(doc, update)
+        return _project(after if return_document == ReturnDocument.AFTER else doc, projection)
+
+    async def find_one_and_delete(self, filter, projection=None, sort=None, session=None, **kwargs):
+        self._called("find_one_and_delete")
+        doc = self._first(filter, sort)
+        if doc is not None:
+            self.docs.remove(doc)
+        return _project(doc, projection)
+
+    async def count_documents(self, filter, session=None, **kwargs):
+        self._called("count_documents")
+        return len(self._matching(filter))
+
+    async def estimated_document_count(self, **kwargs):
+        self._called("estimated_document_count")
+        return len(self.docs)
+
+    async def distinct(self, key, filter=None, session=None, **kwargs):
+        self._called("distinct")
+        values = []
+        for doc in self._matching(filter):
+            for value in _values(doc, key):
+                for item in (value if isinstance(value, list) else [value]):
+                    if item not in values:
+                        values.append(item)
+        return values
+
+    async def bulk_write(self, requests, ordered=True, session=None, **kwargs):
+        self._called("bulk_write")
+        return await self._bulk(requests, ordered)
+
+    async def _bulk(self, requests, ordered):
+        counts = Counter()
+        upserted, errors = [], []
+        for index, request in enumerate(requests):
+            target = getattr(request, "_filter", None) or getattr(request, "_doc", {})
+            try:
+                if isinstance(target, dict) and target.get("id") in self.failing_ids:
+                    raise DuplicateKeyError("injected write error", 11000)
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    counts["nInserted"] += 1
+                elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                    if isinstance(request, ReplaceOne):
+                        result = await self.replace_one(request._filter, request._doc, upsert=request._upsert)
+                    else:
+                        result = self._update_matching(request._filter, request._doc, request._upsert,
+                                                       many=isinstance(request, UpdateMany))
+                    counts["nMatched"] += result.matched_count
+                    counts["nModified"] += result.modified_count
+                    if result.upserted_id is not None:
+                        counts["nUpserted"] += 1
+                        upserted.append({"index": index, "_id": result.upserted_id})
+                elif isinstance(request, (DeleteOne, DeleteMany)):
+                    docs = self._matching(request._filter)
+                    docs = docs if isinstance(request, DeleteMany) else docs[:1]
+                    for doc in docs:
+                        self.docs.remove(doc)
+                    counts["nRemoved"] += len(docs)
+                else:
+                    raise NotImplementedError(type(request).__name__)
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": target})
+                if ordered:
+                    break
+        details = {
+            "writeErrors": errors, "upserted": upserted,
+            **{key: counts[key] for key in ("nInserted", "nUpserted", "nMatched", "nModified", "nRemoved")}
+        }
+        if errors:
+            raise BulkWriteError(details)
+        return SimpleNamespace(
+            inserted_count=counts["nInserted"], upserted_count=counts["nUpserted"],
+            matched_count=counts["nMatched"], modified_count=counts["nModified"],
+            deleted_count=counts["nRemoved"], upserted_ids={u["index"]: u["_id"] for u in upserted},
+            bulk_api_result=details
+        )
+
+    def aggregate(self, pipeline, session=None, **kwargs):
+        self._called("aggregate")
+        docs = [copy.deepcopy(doc) for doc in self.docs]
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == "$match":
+                docs = [doc for doc in docs if matches(doc, spec)]
+            elif name == "$group":
+                docs = _group(docs, spec)
+            elif name == "$sort":
+                docs = _sort(docs, list(spec.items()))
+            elif name == "$limit":
+                docs = docs[:spec]
+            else:
+                raise NotImplementedError(f"FakeCollection.aggregate does not support {name}")
+        return FakeAggregateCursor(docs)
+
+    async def create_index(self, keys, unique=False, name=None, **kwargs):
+        self._called("create_index")
+        keys = _sort_spec(keys)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        if unique:
+            seen = set()
+            for doc in self.docs:
+                key = repr([_get(doc, field) for field, _ in keys])
+                if key in seen:
+                    raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {name}", 11000)
+                seen.add(key)
+        self.indexes[name] = {"key": keys, "unique": unique, **kwargs}
+        return name
+
+    async def drop_index(self, name):
+        self._called("drop_index")
+        del self.indexes[name]
+
+    async def index_information(self):
+        return copy.deepcopy(self.indexes)
+
+class FakeDatabase:
+    def __init__(self):
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def create_collection(self, name: str, **options):
+        collection = self[name]
+        collection.options = options
+        return collection
+
+    async def list_collection_names(self):
+        return list(self._collections)
@@ -0,0 +1,135 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from utils.catalog_index import CatalogIndex, SORTS, _row
+
+CATEGORIES = ["Electronics", "Fashion", "Home", "Sports"]
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+def make_product(rng, product_id):
+    # Coarse values so ties are common and tie order is exercised too
+    return {
+        "id": product_id,
+        "category": rng.choice(CATEGORIES),
+        "price": float(rng.randint(1, 40) * 25),
+        "created_at": (START + timedelta(days=rng.randint(0, 30))).isoformat(),
+        "total_sold": rng.randint(0, 10),
+        "ratings": rng.choice([0, 3.5, 4.0, 4.5, 5.0]),
+        "trending_score": rng.randint(0, 5) / 2
+    }
+
+def naive_query(rows, category=None, min_price=None, max_price=None, sort_by="newest", page=1, limit=12):
+    """Filter and sort the plain rows; equal keys keep row order"""
+    column, descending = SORTS[sort_by]
+    matches = [
+        (position, row) for position, row in enumerate(rows)
+        if (category is None or row['category'] == category)
+        and (min_price is None or row['price'] >= min_price)
+        and (max_price is None or row['price'] <= max_price)
+    ]
+    matches.sort(key=lambda item: (-item[1][column] if descending else item[1][column], item[0]))
+    skip = (page - 1) * limit
+    return [row['id'] for _, row in matches[skip:skip + limit]], len(matches)
+
+def built_index(rows):
+    index = CatalogIndex()
+    index._build(rows)
+    index.ready = True
+    return index
+
+def random_queries(rng, count):
+    for _ in range(count):
+        low = rng.choice([None, float(rng.randint(0, 1000))])
+        high = rng.choice([None, float(rng.randint(0, 1000))])
+        yield {
+            "category": rng.choice([None, None] + CATEGORIES),
+            "min_price": low,
+            "max_price": high,
+            "sort_by": rng.choice(list(SORTS)),
+            "page": rng.randint(1, 4),
+            "limit": rng.choice([5, 12, 50])
+        }
+
+def test_query_matches_naive_baseline():
+    rng = random.Random(7)
+    rows = [_row(make_product(rng, f"p{i}")) for i in range(300)]
+    index = built_index(rows)
+
+    for params in random_queries(rng, 500):
+        assert index.query(**params) == naive_query(rows, **params), params
+
+def test_price_bounds_are_inclusive():
+    rows = [_row({"id": f"p{price}", "category": "Home", "price": price}) for price in (10, 20, 30, 40)]
+    index = built_index(rows)
+
+    for sort_by in SORTS:
+        ids, total = index.query(min_price=20, max_price=30, sort_by=sort_by)
+        assert total == 2 and sorted(ids) == ["p20", "p30"], sort_by
+
+def test_ties_keep_row_order():
+    rows = [_row({"id": f"p{i}", "category": "Home", "price": 50, "total_sold": 3}) for i in range(6)]
+    index = built_index(rows)
+
+    for sort_by in SORTS:
+        assert index.query(sort_by=sort_by, limit=10) == ([f"p{i}" for i in range(6)], 6)
+
+def test_unknown_category_and_sort():
+    index = built_index([_row({"id": "p1", "category": "Home", "price": 5})])
+
+    assert index.query(category="Garden") == ([], 0)
+    assert index.query(sort_by="alphabetical") is None
+    assert CatalogIndex().query() is None
+
+def test_incremental_updates_match_a_rebuild():
+    rng = random.Random(11)
+    docs = {f"p{i}": make_product(rng, f"p{i}") for i in range(120)}
+    index = built_index([_row(doc) for doc in docs.values()])
+    # Row order of a live index: surviving original rows, then appended ones
+    order = list(docs)
+    next_id = len(docs)
+
+    for step in range(300):
+        action = rng.random()
+        if action < 0.5 and docs:
+            product_id = rng.choice(order)
+            doc = make_product(rng, product_id)
+            if rng.random() < 0.1:
+                doc['category'] = f"New {step}"
+            docs[product_id] = doc
+        elif action < 0.75:
+            product_id = f"p{next_id}"
+            next_id += 1
+            doc = docs[product_id] = make_product(rng, product_id)
+            order.append(product_id)
+        else:
+            product_id = rng.choice(order)
+            doc = None
+            del docs[product_id]
+            order.remove(product_id)
+        index._apply(product_id, doc)
+
+        rows = [_row(docs[product_id]) for product_id in order]
+        for params in random_queries(rng, 5):
+            # New categories may be queried too
+            if rng.random() < 0.2:
+                params['category'] = rows[rng.randrange(len(rows))]['category']
+            assert index.query(**params) == naive_query(rows, **params), (step, params)
+
+    assert index.stats()['products'] == len(docs)
+
+@pytest.mark.parametrize("sort_by", list(SORTS))
+def test_update_moves_row_in_every_sort(sort_by):
+    rows = [_row({"id": f"p{i}", "category": "Home", "price": 10 * (i + 1), "total_sold": i,
+                  "ratings": i / 2, "trending_score": i, "created_at": START + timedelta(days=i)})
+            for i in range(5)]
+    index = built_index(rows)
+
+    index._apply("p0", {"id": "p0", "category": "Fashion", "price": 1000, "total_sold": 100,
+                        "ratings": 9, "trending_score": 100, "created_at": START + timedelta(days=100)})
+
+    ids, total = index.query(sort_by=sort_by, limit=10)
+    assert total == 5
+    assert ids[-1 if sort_by == "price_low" else 0] == "p0"
+    assert index.query(category="Home", sort_by=sort_by)[1] == 4
+    assert index.query(category="Fashion", sort_by=sort_by) == (["p0"], 1)
@@ -0,0 +1,89 @@
+import gzip
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from middleware.compression import CompressionMiddleware, brotli, choose_encoding
+
+LARGE = {"items": [{"id": i, "name": f"Product {i}"} for i in range(200)]}
+
+async def large(request):
+    return JSONResponse(LARGE)
+
+async def small(request):
+    return JSONResponse({"ok": True})
+
+async def streamed(request):
+    async def chunks():
+        for i in range(50):
+            yield f"line {i}\n".encode() * 20
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+async def precompressed(request):
+    return Response(gzip.compress(b"x" * 4096), media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+async def image(request):
+    return Response(b"\x89PNG" + b"\0" * 4096, media_type="image/png")
+
+@pytest.fixture
+def client():
+    app = Starlette(routes=[
+        Route("/large", large), Route("/small", small), Route("/streamed", streamed),
+        Route("/precompressed", precompressed), Route("/image", image)
+    ])
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0, deflate", None),
+    ("identity", None),
+    ("", None),
+    ("GZIP;q=0.5", "gzip"),
+    ("br;q=1.0, gzip;q=0.8", "br" if brotli else "gzip"),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header) == expected
+
+def test_large_json_is_gzipped(client):
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert response.json() == LARGE
+
+@pytest.mark.skipif(brotli is None, reason="brotli is not installed")
+def test_brotli_is_preferred(client):
+    response = client.get("/large", headers={"Accept-Encoding": "gzip, br"})
+
+    assert response.headers["content-encoding"] == "br"
+    assert response.json() == LARGE
+
+def test_small_body_is_sent_as_is(client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"ok": True}
+
+def test_client_without_gzip_gets_identity(client):
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in response.headers
+    assert response.json() == LARGE
+
+def test_streaming_body_is_compressed_chunk_by_chunk(client):
+    response = client.get("/streamed", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == "".join(f"line {i}\n" * 20 for i in range(50))
+
+@pytest.mark.parametrize("path", ["/precompressed", "/image"])
+def test_encoded_and_binary_bodies_pass_through(client, path):
+    direct = client.get(path, headers={"Accept-Encoding": "identity"})
+    response = client.get(path, headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers.get("content-encoding") == direct.headers.get("content-encoding")
+    assert response.content == direct.content
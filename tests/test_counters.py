@@ -0,0 +1,225 @@
+import asyncio
+import fcntl
+import json
+import pytest
+from pymongo.errors import AutoReconnect
+from utils import counters
+from utils.counters import MAX_WRITE_ATTEMPTS, CounterAggregator
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def products(db):
+    return db.products.load([{"id": f"p{i}", "total_sold": 0} for i in range(1, 4)])
+
+def totals(products, field="total_sold"):
+    return {doc["id"]: doc[field] for doc in products.docs if doc.get(field)}
+
+async def start(journal_dir, db):
+    aggregator = CounterAggregator(journal_dir)
+    aggregator.set_db(db)
+    await aggregator.start()
+    return aggregator
+
+def crash(aggregator):
+    """Drop the worker without flushing: stop its loop and close its journals, releasing the locks"""
+    aggregator._task.cancel()
+    aggregator._journal.close()
+    for _, handle in aggregator._carried:
+        handle.close()
+
+async def test_increments_are_combined_per_document(tmp_path, db, products):
+    aggregator = await start(tmp_path, db)
+    for _ in range(3):
+        aggregator.incr("products", "p1", "total_sold", 2)
+    aggregator.incr("products", "p1", "trending_score", 0.5)
+    aggregator.incr("products", "p2", "total_sold", 1)
+
+    await aggregator.flush()
+
+    assert totals(products) == {"p1": 6, "p2": 1}
+    assert totals(products, "trending_score") == {"p1": 0.5}
+    assert isinstance(products.docs[0]["total_sold"], int)
+    assert products.calls["bulk_write"] == 1
+    assert aggregator.stats()["documents_written"] == 2
+    await aggregator.stop()
+    assert list(tmp_path.iterdir()) == []
+
+async def test_unflushed_journal_is_replayed_once_by_the_next_worker(tmp_path, db, products):
+    crashed = await start(tmp_path, db)
+    crashed.incr("products", "p1", "total_sold", 2)
+    crashed.incr("products", "p2", "total_sold", 1)
+    crash(crashed)
+    assert totals(products) == {}
+
+    survivor = await start(tmp_path, db)
+
+    assert totals(products) == {"p1": 2, "p2": 1}
+    assert survivor.stats()["replayed"] == 2
+    await survivor.stop()
+
+    # Nothing is left to replay a second time
+    again = await start(tmp_path, db)
+    assert again.stats()["replayed"] == 0
+    assert totals(products) == {"p1": 2, "p2": 1}
+    await again.stop()
+
+async def test_torn_last_line_is_skipped(tmp_path, db, products):
+    journal = tmp_path / "counters-dead-0000.1.journal"
+    journal.write_text(json.dumps(["products", "p1", "total_sold", 3]) + "\n" + '["products", "p1", "tot')
+
+    aggregator = await start(tmp_path, db)
+
+    assert totals(products) == {"p1": 3}
+    assert not journal.exists()
+    await aggregator.stop()
+
+async def test_live_workers_journal_is_left_alone(tmp_path, db, products):
+    journal = tmp_path / "counters-live-0000.1.journal"
+    journal.write_text(json.dumps(["products", "p1", "total_sold", 3]) + "\n")
+    with open(journal) as held:
+        fcntl.flock(held, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        aggregator = await start(tmp_path, db)
+
+        assert totals(products) == {}
+        assert journal.exists()
+        await aggregator.stop()
+
+async def test_partial_bulk_failure_retries_only_failed_documents(tmp_path, db, products):
+    products.failing_ids = {"p2"}
+    aggregator = await start(tmp_path, db)
+    for doc_id in ("p1", "p2", "p3"):
+        aggregator.incr("products", doc_id, "total_sold", 1)
+
+    await aggregator.flush()
+    assert totals(products) == {"p1": 1, "p3": 1}
+    assert aggregator.stats()["pending_documents"] == 1
+
+    products.failing_ids = set()
+    await aggregator.flush()
+    assert totals(products) == {"p1": 1, "p2": 1, "p3": 1}
+    await aggregator.stop()
+
+async def test_failed_flush_keeps_journal_for_replay(tmp_path, db, products):
+    products.failing_ids = {"p1"}
+    crashed = await start(tmp_path, db)
+    crashed.incr("products", "p1", "total_sold", 4)
+    await crashed.flush()
+    crash(crashed)
+
+    products.failing_ids = set()
+    survivor = await start(tmp_path, db)
+
+    assert totals(products) == {"p1": 4}
+    await survivor.stop()
+
+def journals(tmp_path):
+    return sorted(path.name for path in tmp_path.glob("*.journal") if path.stat().st_size)
+
+def held_writes(products):
+    """Make bulk_write wait for the returned event; `started` is set once it is waiting"""
+    write = products.bulk_write
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def held(*args, **kwargs):
+        started.set()
+        await release.wait()
+        return await write(*args, **kwargs)
+
+    products.bulk_write = held
+    return started, release
+
+async def test_persistent_write_error_is_dead_lettered(tmp_path, db, products):
+    products.failing_ids = {"p2"}
+    aggregator = await start(tmp_path, db)
+    aggregator.incr("products", "p2", "total_sold", 1)
+
+    for attempt in range(MAX_WRITE_ATTEMPTS):
+        assert not db.counter_dead_letters.docs
+        aggregator.incr("products", "p1", "total_sold", 1)
+        await aggregator.flush()
+
+    assert totals(products) == {"p1": MAX_WRITE_ATTEMPTS}
+    dead, = db.counter_dead_letters.docs
+    assert (dead["collection"], dead["id"], dead["increments"]) == ("products", "p2", {"total_sold": 1})
+    assert aggregator.stats()["pending_documents"] == 0
+    assert journals(tmp_path) == []
+    await aggregator.stop()
+
+async def test_failed_dead_letter_keeps_retrying(tmp_path, db, products):
+    products.failing_ids = {"p2"}
+    db.counter_dead_letters.errors["insert_many"] = AutoReconnect("down")
+    aggregator = await start(tmp_path, db)
+    aggregator.incr("products", "p2", "total_sold", 1)
+
+    for attempt in range(MAX_WRITE_ATTEMPTS + 1):
+        await aggregator.flush()
+
+    assert aggregator.stats()["pending_documents"] == 1
+    assert journals(tmp_path)
+    products.failing_ids = set()
+    await aggregator.flush()
+    assert totals(products) == {"p2": 1}
+    await aggregator.stop()
+
+async def test_stop_lets_a_flush_in_flight_finish(tmp_path, db, products, monkeypatch):
+    monkeypatch.setattr(counters, "FLUSH_INTERVAL_SECONDS", 0.01)
+    started, release = held_writes(products)
+    aggregator = await start(tmp_path, db)
+    aggregator.incr("products", "p1", "total_sold", 2)
+    await started.wait()
+
+    stopping = asyncio.create_task(aggregator.stop())
+    await asyncio.sleep(0.05)
+    assert not stopping.done()
+    aggregator.incr("products", "p2", "total_sold", 1)
+    release.set()
+    await stopping
+
+    assert totals(products) == {"p1": 2, "p2": 1}
+    assert list(tmp_path.iterdir()) == []
+
+async def test_cancelled_flush_keeps_its_increments(tmp_path, db, products):
+    aggregator = await start(tmp_path, db)
+    started, release = held_writes(products)
+    aggregator.incr("products", "p1", "total_sold", 2)
+    flushing = asyncio.create_task(aggregator.flush())
+    await started.wait()
+
+    flushing.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await flushing
+    assert journals(tmp_path)
+
+    release.set()
+    await aggregator.flush()
+    assert totals(products) == {"p1": 2}
+    assert journals(tmp_path) == []
+    await aggregator.stop()
+
+async def test_segment_outlives_a_later_successful_flush(tmp_path, db, products):
+    aggregator = await start(tmp_path, db)
+    write = products.bulk_write
+    started, release = held_writes(products)
+    aggregator.incr("products", "p1", "total_sold", 2)
+    slow = asyncio.create_task(aggregator.flush())
+    await started.wait()
+
+    # A second flush succeeds while the first is still waiting on Mongo
+    products.bulk_write = write
+    aggregator.incr("products", "p2", "total_sold", 1)
+    await aggregator.flush()
+    assert totals(products) == {"p2": 1}
+
+    # The first one then fails; its segment must still be there to replay
+    products.errors["bulk_write"] = AutoReconnect("primary stepped down")
+    release.set()
+    with pytest.raises(AutoReconnect):
+        await slow
+    crash(aggregator)
+
+    del products.errors["bulk_write"]
+    survivor = await start(tmp_path, db)
+    assert totals(products) == {"p1": 2, "p2": 1}
+    await survivor.stop()
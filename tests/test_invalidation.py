@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from pymongo.errors import AutoReconnect
+from utils import invalidation
+from utils.invalidation import COLLECTION, InvalidationBus
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(invalidation, "RECONNECT_DELAY_SECONDS", 0.01)
+
+def listening_bus(db, namespace="product"):
+    bus = InvalidationBus()
+    bus.set_db(db)
+    received = []
+    bus.subscribe(namespace, received.append)
+    return bus, received
+
+def topics(db):
+    return [event["topic"] for event in db[COLLECTION].docs]
+
+async def test_publish_invalidates_locally_and_broadcasts(db):
+    bus, received = listening_bus(db)
+
+    await bus.publish("product:p1")
+
+    assert received == ["p1"]
+    assert topics(db) == ["product:p1"]
+    assert db[COLLECTION].docs[0]["origin"] == bus.worker_id
+
+async def test_failed_broadcast_does_not_fail_the_write(db):
+    bus, received = listening_bus(db)
+    db[COLLECTION].errors["insert_one"] = AutoReconnect("primary stepped down")
+
+    await bus.publish("product:p1")
+    await bus.publish("product:p2")
+    await bus.publish("product:p1")
+
+    assert received == ["p1", "p2", "p1"]
+    assert bus.stats()["publish_errors"] == 3
+    assert bus.stats()["unsent"] == 2
+
+    # Resent once the collection is writable again, each topic once
+    del db[COLLECTION].errors["insert_one"]
+    await asyncio.wait_for(bus._resend_task, 1)
+    assert topics(db) == ["product:p1", "product:p2"]
+    assert bus.stats()["unsent"] == 0
+
+async def test_unsent_topics_are_tried_again_at_stop(db):
+    bus, _ = listening_bus(db)
+    db[COLLECTION].errors["insert_one"] = AutoReconnect("primary stepped down")
+    await bus.publish("catalog:*")
+    del db[COLLECTION].errors["insert_one"]
+
+    await bus.stop()
+
+    assert topics(db) == ["catalog:*"]
+
+async def test_unsent_topics_are_bounded(db, monkeypatch):
+    monkeypatch.setattr(invalidation, "MAX_UNSENT_TOPICS", 2)
+    bus, _ = listening_bus(db)
+    db[COLLECTION].errors["insert_one"] = AutoReconnect("primary stepped down")
+
+    for product_id in ("p1", "p2", "p3"):
+        await bus.publish(f"product:{product_id}")
+
+    assert list(bus._unsent) == ["product:p2", "product:p3"]
+    assert bus.stats()["unsent_dropped"] == 1
+    await bus.stop()
+
+async def test_other_workers_handle_each_event_once(db):
+    publisher, published_here = listening_bus(db)
+    subscriber, received = listening_bus(db)
+    await db[COLLECTION].insert_one({"topic": "product:old", "origin": "gone", "published_at": 0})
+    await publisher.start()
+    await subscriber.start()
+
+    await publisher.publish("product:p1")
+    await publisher.publish("product:p2")
+    # The fake tail ends after each read, so this spans several reconnects and replays
+    await asyncio.sleep(0.1)
+
+    assert received == ["p1", "p2"]
+    assert published_here == ["p1", "p2"]
+    assert subscriber.stats()["received"] == 2
+    await publisher.stop()
+    await subscriber.stop()
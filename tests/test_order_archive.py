@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from utils.order_archive import archive_orders, create_indexes, find_order, find_user_orders
+
+pytestmark = pytest.mark.anyio
+
+NOW = datetime.now(timezone.utc)
+PROJECTION = {"_id": 0}
+
+def make_order(order_id, user_id, days_ago, status="delivered"):
+    created_at = (NOW - timedelta(days=days_ago)).isoformat()
+    return {
+        "id": order_id, "user_id": user_id, "order_status": status, "final_amount": 100.0,
+        "created_at": created_at, "updated_at": created_at
+    }
+
+@pytest.fixture
+def shop(db):
+    db.users.load([{"id": "old-timer"}, {"id": "newcomer"}])
+    db.orders.load([
+        make_order("o1", "old-timer", 400),
+        make_order("o2", "old-timer", 300, status="cancelled"),
+        make_order("o3", "old-timer", 250, status="shipped"),  # not terminal: stays hot
+        make_order("o4", "old-timer", 5),
+        make_order("n1", "newcomer", 2)
+    ])
+    return db
+
+def ids(orders):
+    return [order["id"] for order in orders]
+
+async def test_archive_moves_old_terminal_orders_and_flags_users(shop):
+    result = await archive_orders(shop, older_than_days=180)
+
+    assert result["archived"] == 2
+    assert sorted(ids(shop.orders_archive.docs)) == ["o1", "o2"]
+    assert sorted(ids(shop.orders.docs)) == ["n1", "o3", "o4"]
+    assert shop.order_archive_pending.docs == []
+    flags = {user["id"]: user.get("has_archived_orders") for user in shop.users.docs}
+    assert flags == {"old-timer": True, "newcomer": None}
+
+async def test_order_list_merges_the_archive_newest_first(shop):
+    await archive_orders(shop, older_than_days=180)
+
+    orders = await find_user_orders(shop, "old-timer", PROJECTION)
+
+    assert ids(orders) == ["o4", "o3", "o2", "o1"]
+
+async def test_users_without_archived_orders_never_read_the_archive(shop):
+    await archive_orders(shop, older_than_days=180)
+    shop.orders_archive.calls.clear()
+    shop.orders.calls.clear()
+
+    assert ids(await find_user_orders(shop, "newcomer", PROJECTION)) == ["n1"]
+
+    assert sum(shop.orders_archive.calls.values()) == 0
+    assert shop.orders.calls["distinct"] == 0
+
+async def test_full_hot_page_skips_the_archive(shop):
+    await archive_orders(shop, older_than_days=180)
+    shop.orders_archive.calls.clear()
+
+    assert ids(await find_user_orders(shop, "old-timer", PROJECTION, limit=2)) == ["o4", "o3"]
+    assert sum(shop.orders_archive.calls.values()) == 0
+
+async def test_order_mid_archive_is_listed_once(shop):
+    await archive_orders(shop, older_than_days=180)
+    # A run cut short after the copy: the order is in both, with its pending marker
+    shop.orders_archive.load([dict(shop.orders.docs[-1], _id="copy")])
+    shop.order_archive_pending.load([{"_id": "n1"}])
+    shop.users.docs[1]["has_archived_orders"] = True
+
+    assert ids(await find_user_orders(shop, "newcomer", PROJECTION)) == ["n1"]
+
+    # The next run settles it: the order stayed hot, so its copy goes
+    await archive_orders(shop, older_than_days=180)
+    assert "n1" not in ids(shop.orders_archive.docs)
+    assert shop.order_archive_pending.docs == []
+
+async def test_single_order_falls_through_to_the_archive(shop):
+    await archive_orders(shop, older_than_days=180)
+
+    assert (await find_order(shop, "o1"))["user_id"] == "old-timer"
+    assert (await find_order(shop, "o4"))["user_id"] == "old-timer"
+    assert await find_order(shop, "missing") is None
+
+async def test_users_archived_before_the_flag_are_backfilled(db):
+    db.users.load([{"id": "u1"}, {"id": "u2"}])
+    db.orders_archive.load([make_order("o1", "u1", 400)])
+
+    await create_indexes(db)
+
+    assert [user.get("has_archived_orders") for user in db.users.docs] == [True, None]
+    assert ids(await find_user_orders(db, "u1", PROJECTION)) == ["o1"]
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+from pymongo.errors import AutoReconnect
+from models.order import OrderCreate
+from routes import orders
+from utils.counters import CounterAggregator
+from utils.pricing import PricingEngine
+
+pytestmark = pytest.mark.anyio
+
+USER = {"user_id": "u1", "role": "user"}
+ADDRESS = {
+    "name": "Asha", "phone": "9876543210", "address_line1": "12 MG Road",
+    "city": "Bengaluru", "state": "Karnataka", "pincode": "n/a"
+}
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+async def fake_session():
+    return FakeSession()
+
+def payment_down(amount, order_id):
+    raise ConnectionError("payment gateway unreachable")
+
+@pytest.fixture
+def coupons(db, monkeypatch, tmp_path):
+    db.products.load([{
+        "id": "tee", "name": "Tee", "images": ["tee.jpg"], "price": 1000.0, "discount_price": None,
+        "stock": 10, "variants": [{"size": "M", "color": "Black", "stock": 10}]
+    }])
+    db.users.load([{"id": "u1", "name": "Asha", "phone": "9876543210"}])
+    db.coupons.load([{
+        "code": "SAVE10", "is_active": True, "discount_percentage": 10, "used_count": 0, "usage_limit": 1,
+        "expiry_date": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    }])
+    engine = PricingEngine()
+    engine.set_db(db)
+    monkeypatch.setattr(orders, "db", db)
+    monkeypatch.setattr(orders, "pricing", engine)
+    monkeypatch.setattr(orders, "causal_session", fake_session)
+    monkeypatch.setattr(orders, "counters", CounterAggregator(tmp_path))
+    monkeypatch.setattr(orders.trending, "record", lambda product_id, quantity: None)
+    monkeypatch.setattr(orders, "stock_decrement_pipeline", lambda size, color, quantity: {"$inc": {"stock": -quantity}})
+    return db.coupons
+
+def order(payment_method="cod", **extra):
+    return OrderCreate(
+        products=[{
+            "product_id": "tee", "product_name": "Tee", "product_image": "tee.jpg",
+            "variant_size": "M", "variant_color": "Black", "quantity": 2, "price": 1.0
+        }],
+        payment_method=payment_method, shipping_address=ADDRESS, coupon_code="SAVE10", **extra
+    )
+
+def used(coupons):
+    return coupons.docs[0]["used_count"]
+
+async def test_order_spends_the_coupon_and_is_priced_server_side(coupons, db):
+    created = await orders.create_order(order(), USER)
+
+    assert (created.total_amount, created.discount_amount, created.final_amount) == (2000.0, 200.0, 1800.0)
+    assert used(coupons) == 1
+    assert db.products.docs[0]["stock"] == 8
+
+async def test_failed_payment_gives_the_coupon_back(coupons, db, monkeypatch):
+    monkeypatch.setattr(orders, "initiate_razorpay_payment", payment_down)
+
+    with pytest.raises(ConnectionError):
+        await orders.create_order(order("razorpay"), USER)
+
+    assert used(coupons) == 0
+    assert db.orders.docs == []
+    # The single use is still there for the retry
+    await orders.create_order(order(), USER)
+    assert used(coupons) == 1
+
+async def test_failed_insert_gives_the_coupon_back(coupons, db):
+    db.orders.errors["insert_one"] = AutoReconnect("primary stepped down")
+
+    with pytest.raises(AutoReconnect):
+        await orders.create_order(order(), USER)
+
+    assert used(coupons) == 0
+
+async def test_coupon_stays_spent_once_the_order_is_stored(coupons, db):
+    db.products.errors["update_one"] = AutoReconnect("primary stepped down")
+
+    with pytest.raises(AutoReconnect):
+        await orders.create_order(order(), USER)
+
+    assert len(db.orders.docs) == 1
+    assert used(coupons) == 1
+
+async def test_exhausted_coupon_is_rejected_before_payment(coupons, monkeypatch):
+    coupons.docs[0]["used_count"] = 1
+    monkeypatch.setattr(orders, "initiate_razorpay_payment", payment_down)
+
+    with pytest.raises(HTTPException) as error:
+        await orders.create_order(order("razorpay"), USER)
+
+    assert error.value.status_code == 400
+    assert used(coupons) == 1
+
+@pytest.mark.parametrize("field", ["total_amount", "discount_amount"])
+def test_client_totals_are_rejected(field):
+    with pytest.raises(ValidationError):
+        order(**{field: 1.0})
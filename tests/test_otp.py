@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+from utils import otp
+from utils.otp import MAX_ATTEMPTS, OTPError, OTPStore
+
+pytestmark = pytest.mark.anyio
+
+PHONE = "+919876543210"
+
+@pytest.fixture(autouse=True)
+def gateway(monkeypatch):
+    monkeypatch.setattr(otp, "MOCK_OTP", False)
+    monkeypatch.setattr(otp, "SMS_GATEWAY_URL", "https://sms.example.test/send")
+
+@pytest.fixture
+def store(db):
+    return OTPStore(db)
+
+def wrong(code: str) -> str:
+    return "000000" if code != "000000" else "111111"
+
+async def test_code_verifies_once(store, db):
+    code = await store.issue(PHONE)
+
+    assert len(code) == otp.OTP_LENGTH
+    assert await store.verify(PHONE, code)
+    # A match is one atomic consume and nothing else
+    assert db.otp_codes.calls["find_one_and_delete"] == 1
+    assert db.otp_codes.calls["find_one_and_update"] == 0
+    assert not await store.verify(PHONE, code)
+
+async def test_code_is_stored_hashed(store, db):
+    code = await store.issue(PHONE)
+
+    stored = db.otp_codes.docs[0]
+    assert stored["_id"] == PHONE
+    assert code not in stored.values()
+    assert stored["code_hash"] == otp.hash_otp(PHONE, code)
+
+async def test_resend_inside_cooldown_is_rejected_across_workers(store, db):
+    await store.issue(PHONE)
+    calls = db.otp_codes.calls["update_one"]
+
+    with pytest.raises(OTPError) as error:
+        await store.issue(PHONE)
+    assert error.value.status_code == 429
+    # Answered from this worker's cache
+    assert db.otp_codes.calls["update_one"] == calls
+
+    # Another worker has no cache entry; the conditional upsert still refuses
+    with pytest.raises(OTPError) as error:
+        await OTPStore(db).issue(PHONE)
+    assert error.value.status_code == 429
+
+async def test_resend_after_cooldown_replaces_the_code(store, db):
+    await store.issue(PHONE)
+    db.otp_codes.docs[0]["sent_at"] -= timedelta(seconds=otp.RESEND_COOLDOWN_SECONDS + 1)
+    store.cache.pop(PHONE)
+
+    code = await store.issue(PHONE)
+
+    assert len(db.otp_codes.docs) == 1
+    assert db.otp_codes.docs[0]["code_hash"] == otp.hash_otp(PHONE, code)
+    assert await store.verify(PHONE, code)
+
+async def test_failed_attempts_lock_the_phone(store, db):
+    code = await store.issue(PHONE)
+    for _ in range(MAX_ATTEMPTS):
+        assert not await store.verify(PHONE, wrong(code))
+    assert db.otp_codes.docs[0]["attempts"] == MAX_ATTEMPTS
+
+    calls = sum(db.otp_codes.calls.values())
+    with pytest.raises(OTPError) as error:
+        await store.verify(PHONE, code)
+    assert error.value.status_code == 429
+    # Locked-out phones are turned away without a database round-trip
+    assert sum(db.otp_codes.calls.values()) == calls
+
+async def test_lockout_holds_in_a_worker_without_cache(store, db):
+    code = await store.issue(PHONE)
+    for _ in range(MAX_ATTEMPTS):
+        await store.verify(PHONE, wrong(code))
+
+    assert not await OTPStore(db).verify(PHONE, code)
+
+async def test_expired_code_is_rejected(store, db):
+    code = await store.issue(PHONE)
+    db.otp_codes.docs[0]["expires_at"] = datetime.utcnow() - timedelta(seconds=1)
+
+    assert not await store.verify(PHONE, code)
+
+async def test_mock_mode_uses_the_fixed_code(store, monkeypatch):
+    monkeypatch.setattr(otp, "MOCK_OTP", True)
+    monkeypatch.setattr(otp, "SMS_GATEWAY_URL", None)
+
+    code = await store.issue(PHONE)
+    await store.send(PHONE, code)
+
+    assert code == "123456"
+    assert await store.verify(PHONE, "123456")
+
+async def test_missing_provider_is_reported_not_fatal(db, monkeypatch, caplog):
+    monkeypatch.setattr(otp, "SMS_GATEWAY_URL", None)
+
+    store = OTPStore(db)
+    with caplog.at_level(logging.ERROR, logger="utils.otp"):
+        assert otp.check_config() is False
+    assert "SMS_GATEWAY_URL" in caplog.text
+
+    with pytest.raises(OTPError) as error:
+        await store.issue(PHONE)
+    assert error.value.status_code == 503
+    assert db.otp_codes.docs == []
+
+async def test_failed_delivery_drops_the_code(store, db, monkeypatch):
+    # Nothing listens on the discard port, so the gateway call fails at once
+    monkeypatch.setattr(otp, "SMS_GATEWAY_URL", "http://127.0.0.1:9/send")
+    code = await store.issue(PHONE)
+
+    with pytest.raises(OTPError) as error:
+        await store.send(PHONE, code)
+    assert error.value.status_code == 502
+    assert db.otp_codes.docs == []
+    # The user can ask again straight away
+    await store.issue(PHONE)
+
+@pytest.fixture
+async def mongo():
+    url = os.environ.get("MONGO_URL")
+    if not url:
+        pytest.skip("MONGO_URL is not set")
+    client = AsyncIOMotorClient(url, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("MongoDB is not reachable")
+    name = f"otp_benchmark_{uuid.uuid4().hex[:8]}"
+    yield client[name]
+    await client.drop_database(name)
+    client.close()
+
+async def test_verification_throughput_against_mongo(mongo):
+    """Login-storm target: thousands of verifications per second against a local Mongo"""
+    store = OTPStore(mongo)
+    await store.create_indexes()
+    phones = [f"+91900{i:07d}" for i in range(5000)]
+    codes = await asyncio.gather(*(store.issue(phone) for phone in phones))
+
+    started = time.perf_counter()
+    verified = await asyncio.gather(*(store.verify(phone, code) for phone, code in zip(phones, codes)))
+    rate = len(phones) / (time.perf_counter() - started)
+
+    assert all(verified)
+    assert rate > 2000, f"{rate:.0f} verifications/s"
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from models.cart import CartItem
+from utils.pricing import PricingEngine, PricingError
+
+pytestmark = pytest.mark.anyio
+
+def product(product_id, price, discount_price=None):
+    return {
+        "id": product_id, "name": product_id.title(), "images": [f"{product_id}.jpg"],
+        "price": price, "discount_price": discount_price,
+        "variants": [{"size": "M", "color": "Black"}, {"size": "L", "color": "Black"}]
+    }
+
+def coupon(code, percentage, used=0, limit=10, expires_in_days=7):
+    return {
+        "code": code, "is_active": True, "discount_percentage": percentage,
+        "used_count": used, "usage_limit": limit,
+        "expiry_date": (datetime.now(timezone.utc) + timedelta(days=expires_in_days)).isoformat()
+    }
+
+def item(product_id, quantity=1, size="M"):
+    return CartItem(product_id=product_id, variant_size=size, variant_color="Black", quantity=quantity)
+
+@pytest.fixture
+def engine(db):
+    db.products.load([product("tee", 999.0, 799.0), product("hoodie", 2499.0), product("cap", 499.99)])
+    db.coupons.load([coupon("SAVE10", 10), coupon("OLD", 20, expires_in_days=-1), coupon("FULL", 15, used=5, limit=5)])
+    engine = PricingEngine()
+    engine.set_db(db)
+    return engine
+
+async def test_quote_prices_lines_from_the_sale_price(engine):
+    quote = await engine.quote([item("tee", 2), item("hoodie"), item("cap", 3)])
+
+    assert [line["price"] for line in quote["items"]] == [799.0, 2499.0, 499.99]
+    assert [line["line_total"] for line in quote["items"]] == [1598.0, 2499.0, 1499.97]
+    assert quote["subtotal"] == 5596.97
+    assert quote["discount_amount"] == 0.0
+    assert quote["total"] == quote["subtotal"]
+
+async def test_coupon_stacks_on_top_of_sale_prices(engine):
+    quote = await engine.quote([item("tee", 2), item("hoodie")], coupon_code="SAVE10")
+
+    # 10% off the already discounted subtotal (2 x 799 + 2499), not the list prices
+    assert quote["subtotal"] == 4097.0
+    assert quote["coupon_code"] == "SAVE10"
+    assert quote["discount_amount"] == 409.7
+    assert quote["total"] == 3687.3
+
+async def test_cart_is_priced_with_one_product_read(engine):
+    await engine.quote([item("tee"), item("hoodie"), item("cap"), item("tee", size="L")])
+    await engine.quote([item("tee"), item("cap")])
+
+    assert engine.db.products.calls["find"] == 1
+
+async def test_invalidated_product_is_repriced(engine):
+    await engine.quote([item("hoodie")])
+    engine.db.products.docs[1]["discount_price"] = 1999.0
+
+    assert (await engine.quote([item("hoodie")]))["total"] == 2499.0
+    engine.invalidate_product("hoodie")
+    assert (await engine.quote([item("hoodie")]))["total"] == 1999.0
+
+@pytest.mark.parametrize("items, message", [
+    ([], "Cart is empty"),
+    ([item("ghost")], "no longer available"),
+    ([item("tee", size="XXL")], "not available in XXL / Black"),
+])
+async def test_invalid_carts_are_rejected(engine, items, message):
+    with pytest.raises(PricingError) as error:
+        await engine.quote(items)
+    assert error.value.status_code == 400
+    assert message in error.value.detail
+
+@pytest.mark.parametrize("code, message", [
+    ("NOPE", "Invalid coupon code"),
+    ("OLD", "Coupon expired"),
+    ("FULL", "Coupon usage limit reached"),
+])
+async def test_unusable_coupons_are_rejected(engine, code, message):
+    with pytest.raises(PricingError) as error:
+        await engine.quote([item("tee")], coupon_code=code)
+    assert error.value.detail == message
+
+async def test_redeem_stops_at_the_usage_limit(engine):
+    engine.db.coupons.docs[0]["usage_limit"] = 2
+
+    await engine.redeem_coupon("SAVE10")
+    await engine.redeem_coupon("SAVE10")
+    with pytest.raises(PricingError):
+        await engine.redeem_coupon("SAVE10")
+    assert engine.db.coupons.docs[0]["used_count"] == 2
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import pytest
+from routes import products
+from utils import product_import
+
+pytestmark = pytest.mark.anyio
+
+ADMIN = {"user_id": "admin-1", "role": "admin"}
+CSV = (
+    "slug,name,description,category,price,size,color,stock,sku\n"
+    "tee,Tee,Cotton tee,Fashion,499,M,Black,5,TEE-M\n"
+    "tee,Tee,Cotton tee,Fashion,499,L,Black,3,TEE-L\n"
+    "mug,Mug,Stoneware mug,Home,299,One,White,10,MUG-1\n"
+    "bad,Bad,No price,Home,,One,White,1,BAD-1\n"
+)
+
+class UploadRequest:
+    def __init__(self, body: bytes, content_type: str = "text/csv"):
+        self.headers = {"content-type": content_type}
+        self._body = body
+
+    async def stream(self):
+        # Arrive in small pieces, the way a large upload does
+        for start in range(0, len(self._body), 16):
+            yield self._body[start:start + 16]
+
+@pytest.fixture
+def shop(db, monkeypatch):
+    published = []
+
+    async def publish(topic):
+        published.append(topic)
+
+    monkeypatch.setattr(products, "db", db)
+    monkeypatch.setattr(products.bus, "publish", publish)
+    return published
+
+@pytest.fixture(autouse=True)
+async def pool():
+    yield
+    await product_import.stop()
+
+async def settle():
+    await asyncio.gather(*product_import._running)
+
+async def test_import_returns_a_server_id_and_runs_in_the_background(shop, db):
+    response = await products.import_products(UploadRequest(CSV.encode()), current_user=ADMIN)
+
+    assert response["status"] == "queued"
+    queued = await product_import.get_import(db, response["import_id"])
+    assert (queued["status"], queued["user_id"]) == ("queued", "admin-1")
+
+    await settle()
+
+    status = await product_import.get_import(db, response["import_id"])
+    assert status["status"] == "completed"
+    assert (status["rows"], status["inserted"], status["failed"]) == (3, 2, 1)
+    assert status["errors"][0]["row"] == 5
+    tee = next(doc for doc in db.products.docs if doc["slug"] == "tee")
+    assert [v["sku"] for v in tee["variants"]] == ["TEE-M", "TEE-L"]
+    assert shop == ["catalog:*"]
+
+async def test_dry_run_writes_and_publishes_nothing(shop, db):
+    response = await products.import_products(UploadRequest(CSV.encode()), dry_run=True, current_user=ADMIN)
+    await settle()
+
+    status = await product_import.get_import(db, response["import_id"])
+    assert (status["status"], status["inserted"]) == ("completed", 2)
+    assert db.products.docs == []
+    assert shop == []
+
+async def test_failed_import_is_recorded_without_publishing(shop, db):
+    db.products.errors["bulk_write"] = ConnectionError("primary unreachable")
+
+    response = await products.import_products(UploadRequest(CSV.encode()), current_user=ADMIN)
+    await settle()
+
+    status = await product_import.get_import(db, response["import_id"])
+    assert status["status"] == "failed"
+    assert "primary unreachable" in status["errors"][-1]["error"]
+    assert shop == []
+
+async def test_stop_interrupts_a_running_import(db):
+    job = product_import.ProductImport(db)
+    await job.receive(UploadRequest(CSV.encode()).stream())
+    started = asyncio.Event()
+    write = job._write
+
+    async def slow_write(batch):
+        started.set()
+        await asyncio.sleep(60)
+        await write(batch)
+
+    job._write = slow_write
+    job.start()
+    await started.wait()
+
+    await product_import.stop()
+
+    assert (await product_import.get_import(db, job.id))["status"] == "interrupted"
+    assert not product_import._running
+
+async def test_duplicate_slugs_are_reported_instead_of_failing_startup(db, caplog):
+    db.products.load([{"id": "1", "slug": "tee"}, {"id": "2", "slug": "tee"}, {"id": "3", "slug": "mug"}])
+    await db.products.create_index("slug")
+
+    with caplog.at_level(logging.ERROR, logger="utils.product_import"):
+        await product_import.create_indexes(db)
+
+    assert "'tee' x2" in caplog.text
+    assert not db.products.indexes["slug_1"]["unique"]
+
+    # Once the duplicate is renamed, the next start makes the index unique
+    db.products.docs[1]["slug"] = "tee-2"
+    await product_import.create_indexes(db)
+    assert db.products.indexes["slug_1"]["unique"]
+
+async def test_unique_slug_index_is_left_alone_once_built(db):
+    await product_import.create_indexes(db)
+    db.products.calls.clear()
+
+    await product_import.create_indexes(db)
+
+    assert db.products.calls["aggregate"] == 0
+    assert db.products.calls["drop_index"] == 0
@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from utils.scheduler import LEASE_MARGIN_SECONDS, Scheduler, SchedulerBusy
+
+pytestmark = pytest.mark.anyio
+
+def blocking_job():
+    """A job function that runs until released; `started` is set once it runs"""
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def func():
+        started.set()
+        await release.wait()
+
+    return func, started, release
+
+@pytest.fixture
+def scheduler(db):
+    scheduler = Scheduler(max_concurrent=1)
+    scheduler.set_db(db)
+    past = datetime.utcnow() - timedelta(minutes=1)
+    for name in ("first", "second"):
+        db.scheduler_leases.load([{"_id": name, "next_run_at": past, "expires_at": past}])
+    return scheduler
+
+def lease(db, name):
+    return next(doc for doc in db.scheduler_leases.docs if doc["_id"] == name)
+
+async def test_job_waiting_for_a_slot_holds_no_lease(scheduler, db):
+    first, first_started, release_first = blocking_job()
+    second, second_started, release_second = blocking_job()
+    scheduler.add_job("first", first, interval=60, timeout=5)
+    scheduler.add_job("second", second, interval=60, timeout=5)
+
+    running = asyncio.create_task(scheduler._run(scheduler.jobs["first"], trigger="schedule"))
+    await first_started.wait()
+    waiting = asyncio.create_task(scheduler._run(scheduler.jobs["second"], trigger="schedule"))
+    await asyncio.sleep(0.01)
+
+    # Another worker could still take "second" while this one waits
+    assert "owner" not in lease(db, "second")
+    release_first.set()
+    await second_started.wait()
+    claimed_at = datetime.utcnow()
+    assert lease(db, "second")["owner"] == scheduler.worker_id
+    # The lease runs from the claim, not from when the wait began
+    assert lease(db, "second")["expires_at"] >= claimed_at + timedelta(seconds=5 + LEASE_MARGIN_SECONDS - 1)
+
+    release_second.set()
+    assert (await running)["status"] == "success"
+    assert (await waiting)["status"] == "success"
+    assert [run["job"] for run in db.job_runs.docs] == ["first", "second"]
+
+async def test_manual_trigger_without_a_free_slot_is_refused(scheduler, db):
+    first, first_started, release_first = blocking_job()
+    second, _, _ = blocking_job()
+    scheduler.add_job("first", first, interval=60, timeout=5)
+    scheduler.add_job("second", second, interval=60, timeout=5)
+    running = asyncio.create_task(scheduler._run(scheduler.jobs["first"], trigger="schedule"))
+    await first_started.wait()
+
+    with pytest.raises(SchedulerBusy):
+        await scheduler.trigger("second")
+
+    assert "owner" not in lease(db, "second")
+    assert not scheduler.jobs["second"].running
+    release_first.set()
+    await running
+
+async def test_manual_trigger_gives_its_slot_back(scheduler, db):
+    func, started, release = blocking_job()
+    scheduler.add_job("first", func, interval=60, timeout=5)
+    scheduler.add_job("second", func, interval=60, timeout=5)
+    lease(db, "second").update(owner="other-worker", expires_at=datetime.utcnow() + timedelta(minutes=5))
+
+    # Leased by another worker: refused without keeping the slot
+    assert await scheduler.trigger("second") is None
+    assert not scheduler._semaphore.locked()
+
+    run = await scheduler.trigger("first")
+    await started.wait()
+    assert await scheduler.trigger("first") is None
+    release.set()
+    await asyncio.gather(*scheduler._manual)
+
+    assert db.job_runs.docs[0]["id"] == run["id"]
+    assert db.job_runs.docs[0]["status"] == "success"
+    assert not scheduler._semaphore.locked()
@@ -0,0 +1,67 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from utils.scheduler import CronSchedule, Job
+
+def naive_next(expression: str, dt: datetime, within: timedelta):
+    """Walk minute by minute and check every field; None if nothing fires `within`"""
+    minute, hour, day, month, weekday = (CronSchedule._parse(p, lo, hi) for p, (lo, hi)
+                                         in zip(expression.split(), CronSchedule.RANGES))
+    candidate = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    while candidate <= dt + within:
+        if (candidate.minute in minute and candidate.hour in hour and candidate.day in day
+                and candidate.month in month and (candidate.weekday() + 1) % 7 in weekday):
+            return candidate
+        candidate += timedelta(minutes=1)
+    return None
+
+@pytest.mark.parametrize("expression, after, expected", [
+    ("30 3 * * *", datetime(2024, 1, 1, 4, 0), datetime(2024, 1, 2, 3, 30)),
+    ("30 3 * * *", datetime(2024, 1, 1, 3, 29, 59), datetime(2024, 1, 1, 3, 30)),
+    # Strictly after: a time exactly on a slot gets the next one
+    ("30 3 * * *", datetime(2024, 1, 1, 3, 30), datetime(2024, 1, 2, 3, 30)),
+    ("*/15 * * * *", datetime(2024, 1, 1, 10, 7), datetime(2024, 1, 1, 10, 15)),
+    ("*/15 * * * *", datetime(2024, 1, 1, 23, 50), datetime(2024, 1, 2, 0, 0)),
+    ("5/20 * * * *", datetime(2024, 1, 1, 10, 26), datetime(2024, 1, 1, 10, 45)),
+    ("0 9 * * 1", datetime(2024, 1, 7, 12, 0), datetime(2024, 1, 8, 9, 0)),
+    ("0 0 * * 0", datetime(2024, 1, 8, 0, 0), datetime(2024, 1, 14, 0, 0)),
+    ("0 0 1 * *", datetime(2024, 1, 31, 12, 0), datetime(2024, 2, 1, 0, 0)),
+    ("0 12 31 * *", datetime(2024, 4, 1, 0, 0), datetime(2024, 5, 31, 12, 0)),
+    ("0 0 1 1 *", datetime(2024, 6, 1, 0, 0), datetime(2025, 1, 1, 0, 0)),
+    ("15 8-10/2 * * 1-5", datetime(2024, 1, 5, 10, 15), datetime(2024, 1, 8, 8, 15)),
+    ("0,30 * * 2 *", datetime(2024, 2, 29, 23, 45), datetime(2025, 2, 1, 0, 0)),
+])
+def test_next_after(expression, after, expected):
+    assert CronSchedule(expression).next_after(after) == expected
+
+def test_next_after_matches_minute_by_minute_walk():
+    rng = random.Random(7)
+    fields = [
+        ["*", "0", "*/5", "10-20", "1,31,59", "7/15"],
+        ["*", "3", "*/6", "9-17", "0,12"],
+        ["*", "*", "1", "15", "*/10", "28-31"],
+        ["*", "*", "*", "2", "1-6", "*/3", "12"],
+        ["*", "0", "1-5", "6", "*/2"],
+    ]
+    checked = 0
+    for _ in range(300):
+        expression = " ".join(rng.choice(options) for options in fields)
+        after = datetime(2024, 1, 1) + timedelta(minutes=rng.randrange(0, 366 * 24 * 60))
+        expected = naive_next(expression, after, within=timedelta(days=7))
+        if expected is None:
+            continue
+        assert CronSchedule(expression).next_after(after) == expected, (expression, after)
+        checked += 1
+    assert checked > 50
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "* * * 13 *", "* * * * 7"])
+def test_invalid_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+def test_job_needs_exactly_one_schedule():
+    with pytest.raises(ValueError):
+        Job("both", None, interval=60, cron="* * * * *")
+    with pytest.raises(ValueError):
+        Job("neither", None)
+    assert Job("every", None, interval=90).next_after(datetime(2024, 1, 1)) == datetime(2024, 1, 1, 0, 1, 30)